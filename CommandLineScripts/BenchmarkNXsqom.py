@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Jakob Lass
+
+Benchmark of the storage options of converted (NXsqom) files. For each option the write time, the time to read all
+data fields, the time to read a few scan steps and the resulting file size are reported.
+"""
+
+
+import argparse
+import numpy as np
+import os
+import sys
+import time
+import tempfile
+import shutil
+import h5py as hdf
+
+sys.path.append('/home/lass/Dropbox/PhD/Software/MJOLNIR/')
+
+from MJOLNIR.Data import DataFile
+
+import warnings
+
+
+options = [('contiguous',{'chunks':None}),
+           ('step chunks',{}),
+           ('step chunks, linked raw',{'link':True}),
+           ('lzf',{'compression':'lzf'}),
+           ('lzf+shuffle',{'compression':'lzf','shuffle':True}),
+           ('gzip 1+shuffle',{'compression':'gzip','compressionLevel':1,'shuffle':True}),
+           ('gzip 4+shuffle',{'compression':'gzip','compressionLevel':4,'shuffle':True}),
+           ('gzip 4+shuffle, 8 steps',{'chunks':8,'compression':'gzip','compressionLevel':4,'shuffle':True}),
+           ('lzf+shuffle, float16 Q',{'compression':'lzf','shuffle':True,'precision':dict([(key,'float16') for key in ['qx','qy','h','k','l']])})]
+
+
+parser = argparse.ArgumentParser(description="Benchmark of storage options for converted nxs files.")
+parser.add_argument("DataFile", nargs ='?', default='Data/camea2018n000136.hdf', type=str,help="Raw data file to convert. Default 'Data/camea2018n000136.hdf'")
+parser.add_argument("-b", "--binning", type=int, default= '8',help="Binning performed. Default '8'")
+parser.add_argument("-r", "--repetitions", type=int, default= '3',help="Number of timings of which the fastest is reported. Default '3'")
+
+args = parser.parse_args()
+
+converted = DataFile.DataFile(args.DataFile).convert(binning=args.binning)
+converted.materialize()
+steps = converted.I.shape[0]
+fieldNames = [name for name,_,_ in DataFile.NXsqomFields.values()]
+rawSize = os.path.getsize(args.DataFile)
+
+def readAll(fileName):
+    with hdf.File(fileName,'r') as f:
+        for name in fieldNames:
+            f['entry/data/'+name][()]
+
+def readSteps(fileName):
+    with hdf.File(fileName,'r') as f:
+        for name in fieldNames:
+            f['entry/data/'+name][steps//2:steps//2+3]
+
+def fastest(function,*arguments):
+    timings = []
+    for _ in range(args.repetitions):
+        start = time.time()
+        function(*arguments)
+        timings.append(time.time()-start)
+    return np.min(timings)
+
+folder = tempfile.mkdtemp()
+try:
+    print('Raw file {} ({:.1f} MB) converted with binning {}'.format(args.DataFile,rawSize/1e6,args.binning))
+    print('{:<28s}{:>10s}{:>10s}{:>12s}{:>10s}{:>8s}'.format('Option','Write [s]','Read [s]','3 steps [s]','Size [MB]','Ratio'))
+    for name,kwargs in options:
+        fileName = os.path.join(folder,'benchmark.nxs')
+        def write():
+            if os.path.exists(fileName):
+                os.remove(fileName)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                converted.saveNXsqom(fileName,**kwargs)
+        writeTime = fastest(write)
+        readTime = fastest(readAll,fileName)
+        stepTime = fastest(readSteps,fileName)
+        size = os.path.getsize(fileName)
+        print('{:<28s}{:>10.3f}{:>10.3f}{:>12.4f}{:>10.1f}{:>8.2f}'.format(name,writeTime,readTime,stepTime,size/1e6,size/rawSize))
+finally:
+    shutil.rmtree(folder)
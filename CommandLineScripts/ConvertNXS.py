@@ -26,48 +26,64 @@ import warnings
 
 
 
-parser = argparse.ArgumentParser(description="Conversion tool for converting output h5 files to nxs files.")
-parser.add_argument("DataFile", nargs ='?', default=argparse.SUPPRESS, type=str,help="Data file to convert. If none provided file dialog will appear.")
-parser.add_argument("-s", "--save", type=str, default= '',help="Location to which the generated file will be saved.")
-parser.add_argument("-b", "--binning", type=int, default= '8',help="Binning performed. Default '8'")
+def main():
+    parser = argparse.ArgumentParser(description="Conversion tool for converting output h5 files to nxs files.")
+    parser.add_argument("DataFile", nargs ='*', default=argparse.SUPPRESS, type=str,help="Data file(s) to convert. If none provided file dialog will appear.")
+    parser.add_argument("-s", "--save", type=str, default= '',help="Location to which the generated file will be saved.")
+    parser.add_argument("-b", "--binning", type=int, default= '8',help="Binning performed. Default '8'")
+    parser.add_argument("-j", "--jobs", type=int, default= '1',help="Number of files converted in parallel. Default '1'")
+    parser.add_argument("-c", "--compression", type=str, default= 'none', choices=['none','gzip','lzf'],help="Compression of converted data. Default 'none'")
+    parser.add_argument("-l", "--link", action='store_true',help="Reference raw data through external links instead of copying it into the converted files.")
 
-args = parser.parse_args()
+    args = parser.parse_args()
 
 
-if not 'DataFile' in args:
-    startingPath = _tools.loadSetting(settingsName)
+    if not 'DataFile' in args or len(args.DataFile)==0:
+        startingPath = _tools.loadSetting(settingsName)
 
+        try:
+            import tkinter as tk
+            from tkinter import filedialog
+        except:
+            import Tkinter as tk
+            import tkFileDialog as filedialog
+
+        root = tk.Tk()
+        root.withdraw()
+
+
+        files = filedialog.askopenfilenames(initialdir=startingPath, title = 'Select file(s) for conversion',filetypes=(('CAMEA Data files',('*.h5')),('All Files','*')))
+
+        if len(files)==0: # No file chosen
+            sys.exit()
+
+
+        directory = os.path.split(files[0])[0]
+        _tools.updateSetting(settingsName,directory)
+
+
+    else:
+        files = args.DataFile
+    binning = args.binning
+
+    if args.save != '':
+        saveLocation = args.save
+    else:
+        saveLocation = None # Save next to each raw file
+
+
+    saveOptions = {'link':args.link}
+    if args.compression != 'none':
+        saveOptions['compression'] = args.compression
+        saveOptions['shuffle'] = True
+
+    dataSet = DataSet.DataSet(dataFiles = list(files))
     try:
-        import tkinter as tk
-        from tkinter import filedialog
-    except:
-        import Tkinter as tk
-        import tkFileDialog as filedialog
-    
-    root = tk.Tk()
-    root.withdraw()
-    
-    
-    files = filedialog.askopenfilenames(initialdir=startingPath, title = 'Select file(s) for conversion',filetypes=(('CAMEA Data files',('*.h5')),('All Files','*')))
-    
-    if len(files)==0: # No file chosen
-        sys.exit()
-    
-    
-    directory = os.path.split(files[0])[0]
-    _tools.updateSetting(settingsName,directory)
-
-
-else:
-    files = args.DataFile
-binning = args.binning
-
-if not args.save is '':
-    saveLocation = args.save
-else:
-    saveLocation = directory
-    
- 
-for file in files:
-    dataSet = DataSet.DataSet(dataFiles = file)
-    dataSet.convertDataFile(binning=binning,saveLocation=saveLocation)
\ No newline at end of file
+        dataSet.convertDataFile(binning=binning,saveLocation=saveLocation,workers=args.jobs,saveOptions=saveOptions)
+    except AttributeError as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == '__main__': # Workers of the conversion pool import this module on platforms spawning processes
+    main()
@@ -92,11 +92,11 @@ returnText = ''
 #returnText +='Files, replacing {} with ^:\n'.format(string)
 for file in completePaths:
     try:
-        f = DataFile.DataFile(file)
+        f = DataFile.readMetaData(file) # Only header information is needed
     except:
         returnText+=file.split('/')[-1]+' not correct format\n'
     else:
-        returnText+=f.name+': '+f.scanCommand[0].decode()+'\t'+f.title[0].decode()+'\n'
+        returnText+=f['name']+': '+f['scanCommand']+'\t'+f['title']+'\n'
 
 saveFile = args.save
 
@@ -0,0 +1,283 @@
+import sys, os
+sys.path.append('.')
+sys.path.append('..')
+sys.path.append('../..')
+import sqlite3
+import numpy as np
+from MJOLNIR import _tools
+from MJOLNIR.Data import DataFile
+
+
+class Catalog(object):
+    """Persistent catalog of the meta data of all raw (hdf) and converted (nxs) data files in a folder. The catalog is
+    kept in an SQLite database next to the data and is refreshed incrementally, i.e. only new or changed files are read. 
+    Files that cannot be read are recorded as well, so they are only read again once changed."""
+
+    _columns = [('location','TEXT PRIMARY KEY'),('name','TEXT'),('type','TEXT'),('instrument','TEXT'),('title','TEXT'),
+                ('scanCommand','TEXT'),('sampleName','TEXT'),('Ei','REAL'),('A3Min','REAL'),('A3Max','REAL'),
+                ('A4Min','REAL'),('A4Max','REAL'),('temperature','REAL'),('magneticField','REAL'),('electricField','REAL'),
+                ('binning','INTEGER'),('possibleBinnings','TEXT'),('mtime','REAL'),('size','INTEGER')]
+
+    @_tools.KwargChecker()
+    def __init__(self,folder,databaseName='MJOLNIR_catalog.sqlite',refresh=True):
+        """Open (or create) the catalog of a data folder.
+
+        Args:
+
+            - folder (string): Folder holding the data files.
+
+        Kwargs:
+
+            - databaseName (string): Name of the database file created in the folder (default 'MJOLNIR_catalog.sqlite').
+
+            - refresh (bool): If true, the catalog is refreshed when opened (default True).
+
+        Raises:
+
+            - AttributeError
+
+        """
+        if not os.path.isdir(folder):
+            raise AttributeError('Folder does not exist({}).'.format(folder))
+        self.folder = os.path.abspath(folder)
+        self.databaseLocation = os.path.join(self.folder,databaseName)
+        self._connection = sqlite3.connect(self.databaseLocation)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS files ({})'.format(', '.join([' '.join(x) for x in self._columns])))
+        self._connection.execute('CREATE TABLE IF NOT EXISTS failures (location TEXT PRIMARY KEY, mtime REAL, size INTEGER)')
+        self._connection.commit()
+        if refresh:
+            self.refresh()
+
+    def close(self):
+        """Close the connection to the database."""
+        if not self._connection is None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def refresh(self):
+        """Bring the catalog up to date with the folder. Only files that are new or whose modification time or size
+        changed are read. Files no longer present, or no longer readable, are removed from the catalog. Files that cannot 
+        be read are recorded with their modification time and size and not read again until these change, see failed.
+
+        Returns:
+
+            - updated (list): Locations of the files (re-)read.
+
+            - removed (list): Locations of the files removed from the catalog.
+
+        """
+        extensions = ['.hdf','.nxs']
+        present = {}
+        for fileName in sorted(os.listdir(self.folder)):
+            location = os.path.join(self.folder,fileName)
+            if os.path.splitext(fileName)[-1] in extensions and os.path.isfile(location):
+                stat = os.stat(location)
+                present[location] = (stat.st_mtime,stat.st_size)
+
+        known = dict([(x[0],(x[1],x[2])) for x in self._connection.execute('SELECT location, mtime, size FROM files')])
+        failures = dict([(x[0],(x[1],x[2])) for x in self._connection.execute('SELECT location, mtime, size FROM failures')])
+
+        removed = [location for location in known if not location in present]
+        updated = []
+        for location in sorted(present.keys()):
+            if known.get(location) == present[location] or failures.get(location) == present[location]:
+                continue
+            try:
+                metaData = DataFile.readMetaData(location)
+            except Exception: # Not a valid data file, recorded until changed and removed from the catalog if indexed before
+                self._connection.execute('INSERT OR REPLACE INTO failures (location, mtime, size) VALUES (?, ?, ?)',(location,)+present[location])
+                if location in known:
+                    removed.append(location)
+                continue
+            row = self._createRow(metaData,*present[location])
+            self._connection.execute('INSERT OR REPLACE INTO files ({}) VALUES ({})'.format(', '.join([x[0] for x in self._columns]),
+                ', '.join(['?']*len(self._columns))),row)
+            updated.append(location)
+
+        removed = sorted(removed)
+        self._connection.executemany('DELETE FROM files WHERE location = ?',[(x,) for x in removed])
+        resolved = [location for location in failures if not location in present or location in updated] # Removed or read since
+        self._connection.executemany('DELETE FROM failures WHERE location = ?',[(x,) for x in resolved])
+        self._connection.commit()
+        return updated,removed
+
+    def failed(self):
+        """Locations of the files in the folder that could not be read at the last refresh.
+
+        Returns:
+
+            - files (list): Sorted list of file locations.
+
+        """
+        return [x[0] for x in self._connection.execute('SELECT location FROM failures ORDER BY location')]
+
+    def _createRow(self,metaData,mtime,size):
+        def mean(value):
+            if value is None:
+                return None
+            value = np.asarray(value,dtype=float)
+            if value.size == 0 or np.all(np.isnan(value)):
+                return None
+            return float(np.nanmean(value))
+
+        A3 = np.asarray(metaData['A3'],dtype=float)
+        A4 = np.asarray(metaData['A4'],dtype=float)
+        binning = metaData['binning']
+        return (metaData['fileLocation'],metaData['name'],metaData['type'],metaData['instrument'],metaData['title'],
+                metaData['scanCommand'],metaData['sampleName'],mean(metaData['Ei']),float(np.min(A3)),float(np.max(A3)),
+                float(np.min(A4)),float(np.max(A4)),mean(metaData['temperature']),mean(metaData['magneticField']),
+                mean(metaData['electricField']),None if binning is None else int(binning),
+                ','.join([str(x) for x in metaData['possibleBinnings']]),mtime,size)
+
+    @_tools.KwargChecker()
+    def query(self,type=None,instrument=None,sampleName=None,title=None,binning=None,Ei=None,temperature=None,
+              magneticField=None,electricField=None,A3=None,A4=None,tolerance=0.01):
+        """Find files in the catalog matching all given criteria.
+
+        Kwargs:
+
+            - type (string): File type, 'hdf' or 'nxs' (default None).
+
+            - instrument (string): Name of instrument (default None).
+
+            - sampleName (string): Name of sample (default None).
+
+            - title (string): Part of the scan title (default None).
+
+            - binning (int): Binning of converted files (default None).
+
+            - Ei (float or [min,max]): Incoming energy, either a value matched within tolerance or a range (default None).
+
+            - temperature (float or [min,max]): Mean temperature of scan (default None).
+
+            - magneticField (float or [min,max]): Mean magnetic field of scan (default None).
+
+            - electricField (float or [min,max]): Mean electric field of scan (default None).
+
+            - A3 (float or [min,max]): A3 value or range which has to overlap with the A3 range of the scan (default None).
+
+            - A4 (float or [min,max]): A4 value or range which has to overlap with the A4 range of the scan (default None).
+
+            - tolerance (float): Tolerance used when single values are given (default 0.01).
+
+        Returns:
+
+            - files (list): Sorted list of file locations, usable as dataFiles of a DataSet.
+
+        """
+        conditions = []
+        parameters = []
+        for column,value in zip(['type','instrument','sampleName','binning'],[type,instrument,sampleName,binning]):
+            if not value is None:
+                conditions.append('{} = ?'.format(column))
+                parameters.append(value)
+
+        if not title is None:
+            conditions.append('title LIKE ?')
+            parameters.append('%'+title+'%')
+
+        for column,value in zip(['Ei','temperature','magneticField','electricField'],[Ei,temperature,magneticField,electricField]):
+            if not value is None:
+                conditions.append('{} BETWEEN ? AND ?'.format(column))
+                parameters+=valueRange(value,tolerance)
+
+        for column,value in zip(['A3','A4'],[A3,A4]):
+            if not value is None:
+                conditions.append('{0}Max >= ? AND {0}Min <= ?'.format(column))
+                parameters+=valueRange(value,tolerance)
+
+        command = 'SELECT location FROM files'
+        if len(conditions)>0:
+            command+=' WHERE '+' AND '.join(conditions)
+        command+=' ORDER BY location'
+        return [x[0] for x in self._connection.execute(command,parameters)]
+
+
+def valueRange(value,tolerance):
+    """Convert a single value or a [min,max] pair into a [min,max] pair."""
+    if np.asarray(value).size == 2:
+        return [float(np.min(value)),float(np.max(value))]
+    return [float(value)-tolerance,float(value)+tolerance]
+
+
+# --------------------------- TESTS -------------------------
+
+def test_Catalog():
+    import tempfile, shutil
+    folder = tempfile.mkdtemp()
+    try:
+        shutil.copy('Data/camea2018n000136.hdf',folder)
+        shutil.copy('Data/camea2018n000137.hdf',folder)
+        catalog = Catalog(folder,refresh=False)
+        assert(len(catalog)==0)
+        updated,removed = catalog.refresh()
+        assert(len(updated)==2 and len(removed)==0)
+
+        updated,removed = catalog.refresh() # Nothing changed
+        assert(len(updated)==0 and len(removed)==0)
+
+        file136 = os.path.join(folder,'camea2018n000136.hdf')
+        file137 = os.path.join(folder,'camea2018n000137.hdf')
+        stat = os.stat(file137)
+        os.utime(file137,(stat.st_atime,stat.st_mtime+10))
+        updated,removed = catalog.refresh()
+        assert(updated == [file137])
+
+        Ei = DataFile.readMetaData(file136)['Ei'][0]
+        assert(catalog.query(Ei=Ei) == [file136,file137])
+        assert(catalog.query(Ei=[Ei+1,Ei+2]) == [])
+        assert(catalog.query(type='nxs') == [])
+        assert(catalog.query(title='2T= -20') == [file136])
+        assert(catalog.query(instrument='CAMEA',A4=[-45,-44]) == [file136])
+        assert(catalog.query(temperature=10.04,tolerance=0.1) == [file136,file137])
+        catalog.close()
+
+        os.remove(file136)
+        with Catalog(folder,refresh=False) as catalog: # Reopen existing database
+            assert(len(catalog)==2)
+            updated,removed = catalog.refresh()
+            assert(removed == [file136])
+            assert(catalog.query() == [file137])
+
+        invalid = os.path.join(folder,'camea2018n000138.hdf')
+        with open(invalid,'w') as f:
+            f.write('Not a data file')
+        reads = []
+        readMetaData = DataFile.readMetaData
+        def countingReadMetaData(location,*args,**kwargs):
+            reads.append(location)
+            return readMetaData(location,*args,**kwargs)
+        DataFile.readMetaData = countingReadMetaData
+        try:
+            with Catalog(folder) as catalog: # Unreadable files are recorded and not read again until changed
+                assert(reads == [invalid] and catalog.failed() == [invalid])
+                assert(catalog.refresh() == ([],[]) and reads == [invalid])
+
+                with open(file137,'w') as f: # Indexed file becoming unreadable is removed from the catalog
+                    f.write('Not a data file either')
+                updated,removed = catalog.refresh()
+                assert(updated == [] and removed == [file137])
+                assert(catalog.query() == [] and catalog.failed() == [file137,invalid])
+
+                os.remove(invalid)
+                catalog.refresh()
+                assert(catalog.failed() == [file137])
+        finally:
+            DataFile.readMetaData = readMetaData
+
+        try:
+            Catalog(os.path.join(folder,'nope'))
+            assert False
+        except AttributeError:
+            assert True
+    finally:
+        shutil.rmtree(folder)
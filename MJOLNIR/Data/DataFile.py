@@ -7,102 +7,333 @@ import matplotlib.pyplot as plt
 import numpy as np
 import h5py as hdf
 import warnings
+import MJOLNIR
 from MJOLNIR import _tools
 import datetime
 import math
+import time
+import hashlib
 import shapely
 from shapely.geometry import Polygon as PolygonS, Point as PointS
 from . import TasUBlib
+from . import Mask
 
 class DataFile(object):
     """Object to load and keep track of HdF files and their conversions"""
-    def __init__(self,fileLocation):
+    def __init__(self,fileLocation,lazy=False,fields=None,steps=None,detectors=None,precision=None):
+        """Load a raw (hdf) or converted (nxs) data file.
+
+        Args:
+
+            - fileLocation (string or DataFile): Location of the data file or data file to be copied.
+
+        Kwargs:
+
+            - lazy (bool): If true, data fields are read from the open file when first accessed (default False).
+
+            - fields (list of strings): Data fields to be read, e.g. ['I','qx','qy','energy'], where names of datasets in entry/data 
+              like 'en' are accepted as well. Fields not selected are set to None (default None, i.e. all fields).
+
+            - steps (slice, int or list of ints): Scan steps to be read, e.g. slice(0,91). Values changing during the scan are 
+              restricted to the same steps (default None, i.e. all steps).
+
+            - detectors (slice, int or list of ints): Detectors to be read, e.g. range(39,78) for wedges 3 to 5 of CAMEA (default None, i.e. all detectors).
+
+            - precision (string): Floating point type of coordinates and normalization read from file or calculated in conversion, 
+              'float32' or 'float64' (default None, i.e. the global compute precision, see _tools.setComputePrecision).
+
+        Steps and detectors are read as hyperslabs spanning the selected indices, so only the selected part of each dataset is 
+        read from disk. Data files restricted to a subset of steps or detectors can be converted but not saved as nxs-files.
+
+        Raises:
+
+            - AttributeError
+
+        """
         # Check if file exists
         if isinstance(fileLocation,DataFile): # Copy everything in provided file
+            fileLocation.materialize()
             self.updateProperty(fileLocation.__dict__)
+            self._file = None
+            self._lazyFields = {}
         else:
             if not os.path.isfile(fileLocation):
                 raise AttributeError('File location does not exist({}).'.format(fileLocation))
             if fileLocation.split('.')[-1]=='nxs':
                 self.type='nxs'
-                with hdf.File(fileLocation) as f:
-                    sample=f.get('/entry/sample')
-                    self.sample = Sample(sample=f.get('/entry/sample'))
-                    self.I=np.array(f.get('entry/data/intensity'))
-                    self.qx=np.array(f.get('entry/data/qx'))
-                    self.qy=np.array(f.get('entry/data/qy'))
-                    self.h=np.array(f.get('entry/data/h'))
-                    self.k=np.array(f.get('entry/data/k'))
-                    self.l=np.array(f.get('entry/data/l'))
-                    self.energy=np.array(f.get('entry/data/en'))
-                    self.Norm=np.array(f.get('entry/data/normalization'))
-                    self.Monitor=np.array(f.get('entry/data/monitor'))
-                    instr = getInstrument(f)
-                    self.instrument = instr.name.split('/')[-1]
-                    self.possibleBinnings = np.array([int(x[-1]) for x in np.array(instr) if x[:5]=='calib'])
-                    self.Ei = np.array(instr.get('monochromator/energy'))
-                    self.A3 = np.array(f.get('entry/sample/rotation_angle')).reshape(-1)
-                    self.A4 = np.array(instr.get('analyzer/polar_angle')).reshape(-1)
-                    self.A3Off = self.sample.A3Off#np.array(f.get('entry/sample/rotation_angle_zero'))
-                    self.A4Off = np.array(instr.get('analyzer/polar_angle_offset'))
-                    self.binning = np.array(f.get('entry/reduction/MJOLNIR_algorithm_convert/binning'))[0]
-                    Ef = np.array(instr.get('calib{}/final_energy'.format(str(self.binning))))
-                    width = np.array(instr.get('calib{}/width'.format(str(self.binning))))
-                    bg = np.array(instr.get('calib{}/background'.format(str(self.binning))))
-                    amp = np.array(instr.get('calib{}/amplitude'.format(str(self.binning))))
-                    self.instrumentCalibrationEf = np.array([amp,Ef,width,bg]).T
-                    self.instrumentCalibrationA4 = np.array(instr.get('calib{}/a4offset'.format(str(self.binning))))
-                    self.instrumentCalibrationEdges = np.array(instr.get('calib{}/boundaries'.format(str(self.binning))))
-                    self.temperature = np.array(sample.get('temperature'))
-                    self.magneticField = np.array(sample.get('magnetic_field'))
-                    self.electricField = np.array(sample.get('electric_field'))
-                    self.scanParameters,self.scanValues,self.scanUnits = getScanParameter(f)
-                    self.scanCommand = np.array(f.get('entry/scancommand'))
-                    self.original_file = np.array(f.get('entry/reduction/MJOLNIR_algorithm_convert/rawdata'))[0].decode()
-                    self.title = np.array(f.get('entry/title'))
+                f = hdf.File(fileLocation,'r')
+                sample = _tools.getNXGroup(f,'NXsample')
+                self.sample = Sample(sample=sample)
+                instr = _tools.getInstrument(f)
+                self.instrument = instr.name.split('/')[-1]
+                self.possibleBinnings = np.array([int(x[-1]) for x in np.array(instr) if x[:5]=='calib'])
+                self.Ei = np.array(instr.get('monochromator/energy'))
+                self.A3 = np.array(f.get('entry/sample/rotation_angle')).reshape(-1)
+                self.A4 = np.array(instr.get('analyzer/polar_angle')).reshape(-1)
+                self.A3Off = self.sample.A3Off#np.array(f.get('entry/sample/rotation_angle_zero'))
+                self.A4Off = np.array(instr.get('analyzer/polar_angle_offset'))
+                self.binning = np.array(f.get('entry/reduction/MJOLNIR_algorithm_convert/binning'))[0]
+                self.temperature = np.array(sample.get('temperature'))
+                self.magneticField = np.array(sample.get('magnetic_field'))
+                self.electricField = np.array(sample.get('electric_field'))
+                self.scanParameters,self.scanValues,self.scanUnits = getScanParameter(f)
+                self.scanCommand = np.array(f.get('entry/scancommand'))
+                self.original_file = np.array(f.get('entry/reduction/MJOLNIR_algorithm_convert/rawdata'))[0].decode()
+                self.title = np.array(f.get('entry/title'))
+                self.fingerprint = readConversionFingerprint(f)
+                self._coordinates = None
+                lazyFields = {'I':'entry/data/intensity','qx':'entry/data/qx','qy':'entry/data/qy','h':'entry/data/h',
+                              'k':'entry/data/k','l':'entry/data/l','energy':'entry/data/en',
+                              'Norm':'entry/data/normalization','Monitor':'entry/data/monitor'}
+                if f['entry/data'].attrs.get('MJOLNIR_format_version',1)>=2: # Compact monitor and normalization are stored as well
+                    for key,name in NXsqomCompactFields.items():
+                        lazyFields[key] = 'entry/data/'+name
 
             elif fileLocation.split('.')[-1]=='hdf':
                 self.type='hdf'
-                with hdf.File(fileLocation) as f:
-                    sample=f.get('/entry/sample')
-                    self.sample = Sample(sample=f.get('/entry/sample'))
-                    self.Monitor=np.array(f.get('entry/control/data'))
-                    instr = getInstrument(f)
-                    self.instrument = instr.name.split('/')[-1]
-                    self.possibleBinnings = np.array([int(x[-1]) for x in np.array(instr) if x[:5]=='calib'])
-                    self.Ei = np.array(instr.get('monochromator/energy'))
-                    self.I = np.array(instr.get('detector/counts')).swapaxes(1,2)
-                    self.A3 = np.array(f.get('entry/sample/rotation_angle'))
-                    self.A4 = np.array(instr.get('analyzer/polar_angle')).reshape(-1)
-                    self.A3Off = self.sample.A3Off#np.array(f.get('entry/sample/rotation_angle_zero'))
-                    self.A4Off = np.array(instr.get('analyzer/polar_angle_offset'))
-                    self.binning=1 # Choose standard binning 1
-                    Ef = np.array(instr.get('calib{}/final_energy'.format(str(self.binning))))
-                    width = np.array(instr.get('calib{}/width'.format(str(self.binning))))
-                    bg = np.array(instr.get('calib{}/background'.format(str(self.binning))))
-                    amp = np.array(instr.get('calib{}/amplitude'.format(str(self.binning))))
-                    self.instrumentCalibrationEf = np.array([amp,Ef,width,bg]).T
-                    self.instrumentCalibrationA4 = np.array(instr.get('calib{}/a4offset'.format(str(self.binning))))
-                    self.instrumentCalibrationEdges = np.array(instr.get('calib{}/boundaries'.format(str(self.binning))))
-                    self.temperature = np.array(sample.get('temperature'))
-                    self.magneticField = np.array(sample.get('magnetic_field'))
-                    self.electricField = np.array(sample.get('electric_field'))
-                    self.scanParameters,self.scanValues,self.scanUnits = getScanParameter(f)
-                    self.scanCommand = np.array(f.get('entry/scancommand'))
-                    self.title = np.array(f.get('entry/title'))
-                    ###################
-                    self.I[:,:,:200]=0#
-                    ###################
+                f = hdf.File(fileLocation,'r')
+                sample = _tools.getNXGroup(f,'NXsample')
+                self.sample = Sample(sample=sample)
+                instr = _tools.getInstrument(f)
+                self.instrument = instr.name.split('/')[-1]
+                self.possibleBinnings = np.array([int(x[-1]) for x in np.array(instr) if x[:5]=='calib'])
+                self.A3Off = self.sample.A3Off#np.array(f.get('entry/sample/rotation_angle_zero'))
+                self.A4Off = np.array(instr.get('analyzer/polar_angle_offset'))
+                self.binning=1 # Choose standard binning 1
+                self._readScanFields(f,instr)
+                self.scanCommand = np.array(f.get('entry/scancommand'))
+                self.title = np.array(f.get('entry/title'))
+                lazyFields = {'I':instr.name+'/detector/counts','Monitor':'entry/control/data'}
             else:
                 raise AttributeError('File is not of type nxs or hdf.')
+            for key in ['instrumentCalibrationEf','instrumentCalibrationA4','instrumentCalibrationEdges']:
+                lazyFields[key] = None # Loaded together from the calib group of current binning
+            self._instrumentPath = instr.name
+            self._calibrationKeys = {} # Binning to key in calibration registry
+            self.masks = defaultMasks(self)
+            self._file = f
+            self._lazyFields = lazyFields
+            self.precision = None if precision is None else _tools.computeDtype(precision).name
+            self._selectSubset(f,fields,steps,detectors)
             self.name = fileLocation.split('/')[-1]
             self.fileLocation = os.path.abspath(fileLocation)
             self.sample.calculateProjections()
             for key in ['magneticField','temperature','electricField']:
-                if self.__dict__[key].dtype ==object: # Is np nan object
+                if not self.__dict__[key] is None and self.__dict__[key].dtype ==object: # Is np nan object
+                    self.__dict__[key] = None
+            if not lazy:
+                self.materialize()
+                self.close()
+
+    def __getattr__(self,key):
+        # Only called when normal attribute lookup fails, i.e. for fields not yet read from disk
+        lazyFields = self.__dict__.get('_lazyFields')
+        if lazyFields is None or not key in lazyFields:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__,key))
+        return self._loadField(key)
+
+    def _loadField(self,key):
+        """Read a lazy field from the open HDF5 file and cache it on the object."""
+        if self._lazyFields[key] == 'coordinates': # Factorized coordinates of converted file
+            for field,value in self._coordinates.calculate().items():
+                self.__dict__[field] = value
+                self._lazyFields.pop(field,None)
+            return self.__dict__[key]
+        f = self.__dict__.get('_file')
+        if f is None:
+            raise AttributeError('Field {} of data file {} has not been loaded and the file has been closed.'.format(key,self.name))
+        if self._lazyFields[key] is None: # Calibration table
+            self._registerCalibrations(f.get(self._instrumentPath))
+            self._setCalibration(self.binning)
+            return self.__dict__[key]
+
+        dataset = f.get(self._lazyFields[key])
+        if self.__dict__.get('_subsetShape') is None:
+            value = np.array(dataset)
+        else:
+            detectorAxis = 2 if self.type == 'hdf' and key == 'I' else 1 # Raw counts are stored as (steps, pixels, detectors)
+            value = readSubset(dataset,{0:(self.stepSubset,self._subsetShape[0]),detectorAxis:(self.detectorSubset,self._subsetShape[1])})
+        if self.type == 'hdf' and key == 'I':
+            value = prepareRawCounts(value)
+        value = _tools.castPrecision(value,self.__dict__.get('precision'))
+        self.__dict__[key] = value
+        del self._lazyFields[key]
+        return value
+
+    def _selectSubset(self,f,fields,steps,detectors):
+        """Restrict the data fields to be read to the given fields, scan steps and detectors and select the steps of values changing during the scan."""
+        dataFields = [key for key,path in self._lazyFields.items() if not path is None]
+        countsPath = self._lazyFields['I']
+        if not fields is None:
+            names = dict([(name,key) for key,(name,_,_) in NXsqomFields.items()]) # Names of datasets in entry/data
+            fields = [names.get(field,field) for field in fields]
+            unknown = [field for field in fields if not field in dataFields]
+            if len(unknown)>0:
+                raise AttributeError('Field(s) {} cannot be selected. Possible fields are: {}.'.format(', '.join(unknown),', '.join(sorted(dataFields))))
+            for key in dataFields:
+                if not key in fields:
                     self.__dict__[key] = None
+                    del self._lazyFields[key]
+
+        self.stepSubset = self.detectorSubset = self._subsetShape = None
+        if steps is None and detectors is None:
+            return
+        shape = f.get(countsPath).shape
+        if self.type == 'hdf': # Raw counts are stored as (steps, pixels, detectors)
+            shape = (shape[0],shape[2])
+        self._subsetShape = (shape[0],shape[1])
+        self.stepSubset = subsetIndices(steps,shape[0])
+        self.detectorSubset = subsetIndices(detectors,shape[1])
+        if self.stepSubset is None:
+            return
+        for key in ['Ei','_A3','_A4','temperature','magneticField','electricField']:
+            value = self.__dict__.get(key)
+            if not value is None and np.ndim(value)>0 and np.shape(value)[0]==shape[0]:
+                self.__dict__[key] = np.asarray(value)[self.stepSubset]
+        if np.ndim(self.scanValues)>1 and np.shape(self.scanValues)[1]==shape[0]:
+            self.scanValues = np.asarray(self.scanValues)[:,self.stepSubset]
+
+    def _readScanFields(self,f,instr):
+        """Read the fields of a raw file which grow with the scan steps, apart from detector counts and monitor."""
+        sample = _tools.getNXGroup(f,'NXsample')
+        self.Ei = np.array(instr.get('monochromator/energy'))
+        self.A3 = np.array(f.get('entry/sample/rotation_angle'))
+        self.A4 = np.array(instr.get('analyzer/polar_angle')).reshape(-1)
+        self.temperature = np.array(sample.get('temperature'))
+        self.magneticField = np.array(sample.get('magnetic_field'))
+        self.electricField = np.array(sample.get('electric_field'))
+        for key in ['magneticField','temperature','electricField']:
+            if self.__dict__[key].dtype ==object: # Is np nan object
+                self.__dict__[key] = None
+        self.scanParameters,self.scanValues,self.scanUnits = getScanParameter(f)
+
+    def _registerCalibrations(self,instr):
+        """Load the normalization tables of all binnings in the file into the calibration registry."""
+        for binning in self.possibleBinnings:
+            self._calibrationKeys[int(binning)] = calibrationRegistry.register(self.instrument,binning,*loadCalibration(instr,binning))
+
+    def _setCalibration(self,binning):
+        """Point the normalization tables to the shared tables of the given binning."""
+        self.instrumentCalibrationEf,self.instrumentCalibrationA4,self.instrumentCalibrationEdges = calibrationRegistry.get(self._calibrationKeys[int(binning)])
+        for key in ['instrumentCalibrationEf','instrumentCalibrationA4','instrumentCalibrationEdges']:
+            self._lazyFields.pop(key,None)
+
+    def materialize(self):
+        """Read all fields not yet loaded from disk into memory."""
+        for key in list(self.__dict__.get('_lazyFields',{}).keys()):
+            if key in self._lazyFields: # Calibration tables are read together
+                self._loadField(key)
+
+    def isFactorized(self):
+        """Return true if the coordinates of the converted file are factorized and not yet calculated for all steps."""
+        return not self.__dict__.get('_coordinates') is None and 'qx' in self.__dict__.get('_lazyFields',{})
 
-        
+    @_tools.KwargChecker()
+    def iterateFlat(self,stepsPerChunk=10):
+        """Iterate through a converted file in chunks of scan steps. Factorized coordinates are calculated for each chunk only.
+
+        Kwargs:
+
+            - stepsPerChunk (int): Number of scan steps in each chunk (default 10).
+
+        Returns:
+
+            - chunks (generator): Dictionaries of flattened I, Monitor, Norm, qx, qy, energy, h, k and l of each chunk. Fields not 
+              loaded, see fields of DataFile, are left out.
+
+        """
+        steps = self.I.shape[0]
+        for start in range(0,steps,stepsPerChunk):
+            stop = min(start+stepsPerChunk,steps)
+            chunk = {'I':self.I[start:stop]}
+            for key in ['Monitor','Norm']: # Compactly stored fields are broadcast to the intensity
+                if getattr(self,key,None) is None:
+                    continue
+                value = np.asarray(getattr(self,key))
+                if value.shape[0]>1:
+                    value = value[start:stop]
+                chunk[key] = np.broadcast_to(value,chunk['I'].shape)
+            if self.isFactorized():
+                chunk.update(self._coordinates.calculate(start,stop))
+            else:
+                for key in FactorizedCoordinates.fields:
+                    if not getattr(self,key,None) is None:
+                        chunk[key] = getattr(self,key)[start:stop]
+            yield dict([(key,value.flatten()) for key,value in chunk.items()])
+
+    @_tools.KwargChecker()
+    def fieldDtype(self,key):
+        """Type of a point field (I, Monitor, Norm, qx, qy, energy, h, k or l) without calculating factorized coordinates.
+
+        Args:
+
+            - key (string): Name of field.
+
+        Returns:
+
+            - dtype (numpy dtype): Type of the field or None if the field is not loaded.
+
+        """
+        if self.isFactorized() and key in FactorizedCoordinates.fields:
+            return _tools.computeDtype(self._coordinates.precision) or np.dtype(np.float64)
+        value = getattr(self,key,None)
+        return None if value is None else np.asarray(value).dtype
+
+    def addMask(self,mask):
+        """Add a mask removing points of this converted file from cuts and binning, see Mask module. Masked counts of a raw data 
+        file are set to zero when converting. Data files start out with the masks of defaultMasks.
+
+        Args:
+
+            - mask (Mask): Mask to be added.
+
+        """
+        if not isinstance(mask,Mask.Mask):
+            raise AttributeError('Provided mask is not of type Mask but {}.'.format(type(mask)))
+        self.masks = self.__dict__.get('masks',[])+[mask]
+
+    def maskBitmap(self,masks=None):
+        """Combined bitmap of the masks of this file and the given masks, True for masked points and broadcastable to the intensity.
+
+        Kwargs:
+
+            - masks (list of Masks): Masks applied together with the masks of the file (default None).
+
+        Returns:
+
+            - bitmap (bool array): Combined bitmap or None if no masks are present.
+
+        """
+        return Mask.combineMasks(self,self.__dict__.get('masks',[])+([] if masks is None else list(masks)))
+
+    def close(self):
+        """Close the underlying HDF5 file. Fields not yet loaded are no longer accessible afterwards."""
+        f = self.__dict__.get('_file')
+        if not f is None:
+            f.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+    def __getstate__(self):
+        self.materialize()
+        state = self.__dict__.copy()
+        state['_file'] = None
+        state.pop('_pointTable',None) # Cached points are rebuilt when needed
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        # Tables of other binnings are only known if already registered in this process, otherwise they are reloaded from file
+        self._calibrationKeys = dict([(binning,key) for binning,key in state.get('_calibrationKeys',{}).items() if key in calibrationRegistry])
+        if 'instrumentCalibrationEf' in state:
+            self._calibrationKeys[int(self.binning)] = calibrationRegistry.register(self.instrument,self.binning,self.instrumentCalibrationEf,
+                                                                                  self.instrumentCalibrationA4,self.instrumentCalibrationEdges)
+            self._setCalibration(self.binning)
 
     @property
     def A3Off(self):
@@ -178,13 +409,15 @@ class DataFile(object):
     def difference(self,other,keys = set(['sample','instrument','Ei','I','_A3','_A4','binning','scanParameters'])):
         """Return the difference between two data files by keys"""
         dif = []
-        if not set(self.__dict__.keys()) == set(other.__dict__.keys()): # Check if same generation and type (hdf or nxs)
-            return list(set(self.__dict__.keys())-set(other.__dict__.keys()))
+        selfKeys = set(self.__dict__.keys()).union(self.__dict__.get('_lazyFields',{}).keys())
+        otherKeys = set(other.__dict__.keys()).union(other.__dict__.get('_lazyFields',{}).keys())
+        if not selfKeys == otherKeys: # Check if same generation and type (hdf or nxs)
+            return list(selfKeys-otherKeys)
 
         comparisonKeys = keys
         for key in comparisonKeys:
-            skey = self.__dict__[key]
-            okey = other.__dict__[key]
+            skey = getattr(self,key)
+            okey = getattr(other,key)
             if isinstance(skey,np.ndarray):
                 try:
                     if not np.all(np.isclose(skey,okey)):
@@ -193,7 +426,7 @@ class DataFile(object):
                 except (TypeError, AttributeError):
                     if np.all(skey!=okey):
                         dif.append(key)
-            elif not np.all(self.__dict__[key]==other.__dict__[key]):
+            elif not np.all(skey==okey):
                 dif.append(key)
         return dif
 
@@ -210,7 +443,45 @@ class DataFile(object):
         return s in self.__dict__.keys()
 
     @_tools.KwargChecker()
-    def convert(self,binning):
+    def convert(self,binning,integrationMethod='reduceat',factorized=False,precision=None):
+        """Convert raw data file into Qx, Qy, energy and h, k, l using the normalization table of the given binning.
+
+        Args:
+
+            - binning (int or list of ints): Binning to be used. If a list is given, the file is converted into all binnings 
+              sharing the raw counts and the binning independent angle calculations.
+
+        Kwargs:
+
+            - integrationMethod (string): Method used to sum raw pixels into binned pixels, 'reduceat', 'cumsum' or 'loop', see _tools.integratePixelRanges (default 'reduceat').
+
+            - factorized (bool): If true, qx, qy, energy, h, k and l are not stored but kept as FactorizedCoordinates, i.e. per step angles 
+              and energies and per pixel A4 and final energies. They are calculated for all steps when first accessed or by materialize, 
+              and in chunks of steps by iterateFlat (default False).
+
+            - precision (string): Floating point type of the converted coordinates and normalization, 'float32' or 'float64'. Angles 
+              and energies are calculated in float64 and only the results are stored in the given type (default precision of this file).
+
+        Returns:
+
+            - convFile (DataFile or list of DataFiles): Converted data file or list of these in the order of the binnings given.
+
+        Raises:
+
+            - AttributeError
+
+        """
+        if precision is None:
+            precision = self.__dict__.get('precision')
+        else:
+            precision = _tools.computeDtype(precision).name
+        setup = self._conversionSetup()
+        if isinstance(binning,(list,tuple,np.ndarray)):
+            return [self._convertBinning(setup,b,integrationMethod,factorized,precision) for b in binning]
+        return self._convertBinning(setup,binning,integrationMethod,factorized,precision)
+
+    def _conversionSetup(self):
+        """Calculate the binning independent parts of the conversion."""
         if self.instrument == 'CAMEA':
             EPrDetector = 8 
         elif self.instrument in ['MULTIFLEXX','FLATCONE']:
@@ -218,14 +489,11 @@ class DataFile(object):
         else:
             raise AttributeError('Instrument type of data file not understood. {} was given.'.format(self.instrument))
         
-        self.loadBinning(binning)
-        
-        EfNormalization = self.instrumentCalibrationEf
-        A4Normalization = self.instrumentCalibrationA4#np.array(instrument.get('calib{}/a4offset'.format(str(binning))))
-        EdgesNormalization = self.instrumentCalibrationEdges#np.array(instrument.get('calib{}/boundaries'.format(str(binning))))
         Data = self.I#np.array(instrument.get('detector/data'))
+        bitmap = self.maskBitmap()
+        if not bitmap is None: # Masked raw counts are not integrated into binned pixels
+            Data = np.where(bitmap,0,Data)
         
-
         detectors = Data.shape[1]
         steps = Data.shape[0]
         
@@ -246,65 +514,85 @@ class DataFile(object):
         else:
             A3Zero = np.deg2rad(np.array(A3Zero))
 
-        A4 = np.deg2rad(A4Normalization)
-        A4=A4.reshape(detectors,binning*EPrDetector,order='C')
-
-        PixelEdge = EdgesNormalization.reshape(detectors,EPrDetector,binning,2).astype(int)
-        factorsqrtEK = 0.694692
-        
         A4File = self.A4
         
         A4File = A4File.reshape((-1,1,1))
 
-        A4Mean = -(A4.reshape((1,detectors,binning*EPrDetector))+np.deg2rad(A4File-A4Zero))
-        
-        Intensity=np.zeros((Data.shape[0],Data.shape[1],EPrDetector*binning),dtype=int)
-        for i in range(detectors): # for each detector
-            for j in range(EPrDetector):
-                for k in range(binning):
-                    Intensity[:,i,j*binning+k] = np.sum(Data[:,i,PixelEdge[i,j,k,0]:PixelEdge[i,j,k,1]],axis=1)
-
-        EfMean = EfNormalization[:,1].reshape(1,A4.shape[0],EPrDetector*binning)
-        EfNormalization = (EfNormalization[:,0]*np.sqrt(2*np.pi)*EfNormalization[:,2]).reshape(1,A4.shape[0],EPrDetector*binning)
         A3 = np.deg2rad(np.array(self.A3))+A3Zero #file.get('/entry/sample/rotation_angle/')
         if A3.shape[0]==1:
             A3 = A3*np.ones((steps))
         
         A3.resize((steps,1,1))
         Ei = self.Ei.reshape(-1,1,1)#np.array(instrument.get('monochromator/energy'))
-        if False:
-            kf = factorsqrtEK*np.sqrt(EfMean)#.reshape(1,detectors,binning*EPrDetector)
-            
-            ki = factorsqrtEK*np.sqrt(Ei).reshape(-1,1,1)
-            # Shape everything into shape (steps,detectors,bins) (if external parameter is changed, this is assured by A3 reshape)
-            Qx = ki-kf*np.cos(A4Mean)
-            Qy = -kf*np.sin(A4Mean)
-            QX = Qx*np.cos(A3)-Qy*np.sin(A3)
-            QY = Qx*np.sin(A3)+Qy*np.cos(A3)
-        else:
-            UBINV = np.linalg.inv(self.sample.orientationMatrix)
-            HKL,QX,QY = TasUBlib.calcTasQH(UBINV,[np.rad2deg(A3).squeeze(),np.rad2deg(-A4Mean)],Ei.squeeze(),EfMean.squeeze())
-        DeltaE = Ei-EfMean
-        if DeltaE.shape[0]==1:
-            DeltaE = DeltaE*np.ones((steps,1,1))
+        UBINV = np.linalg.inv(self.sample.orientationMatrix)
         Monitor = self.Monitor.reshape((steps,1,1))#np.array(file.get('/entry/control/data'),dtype=int).reshape((steps,1,1))
-        Monitor = Monitor*np.ones((1,detectors,EPrDetector*binning))
-        Normalization = EfNormalization*np.ones((steps,1,1))
+        return {'EPrDetector':EPrDetector,'Data':Data,'detectors':detectors,'steps':steps,'A4Zero':A4Zero,'A4File':A4File,
+                'A3':A3,'Ei':Ei,'UBINV':UBINV,'Monitor':Monitor}
 
-        shapes = QX.shape
-        sample = self.sample
-        pos = sample.inv_tr(QX.flatten(),QY.flatten())
-        H,K,L = (sample.orientationMatrix[0].reshape(-1,1)*pos[0].reshape(1,-1)+sample.orientationMatrix[1].reshape(-1,1)*pos[1].reshape(1,-1)).reshape(3,*shapes)
+    def _convertBinning(self,setup,binning,integrationMethod='reduceat',factorized=False,precision=None):
+        """Convert data file into a single binning using the binning independent parts of the conversion."""
+        return self._convertedFile(self._convertSteps(setup,self._binningSetup(setup,binning),integrationMethod,factorized,precision))
 
-        ###########################
-        Monitor[:,:,:binning] = 0 #
-        ###########################
+    def _binningSetup(self,setup,binning):
+        """Calculate the per pixel parts of the conversion into a single binning, which do not depend on the scan steps."""
+        self.loadBinning(binning)
+        EPrDetector = setup['EPrDetector']
+        detectors = setup['detectors']
+        
+        EfNormalization = self.instrumentCalibrationEf
+        A4Normalization = self.instrumentCalibrationA4#np.array(instrument.get('calib{}/a4offset'.format(str(binning))))
+        EdgesNormalization = self.instrumentCalibrationEdges#np.array(instrument.get('calib{}/boundaries'.format(str(binning))))
 
+        A4 = np.deg2rad(A4Normalization)
+        A4=A4.reshape(-1,binning*EPrDetector,order='C')
+
+        PixelEdge = EdgesNormalization.reshape(-1,EPrDetector,binning,2).astype(int)
+
+        EfMean = EfNormalization[:,1].reshape(-1,EPrDetector*binning)
+        EfNormalization = (EfNormalization[:,0]*np.sqrt(2*np.pi)*EfNormalization[:,2]).reshape(-1,EPrDetector*binning)
+        detectorSubset = self.__dict__.get('detectorSubset')
+        if not detectorSubset is None: # Normalization tables cover all detectors
+            A4,PixelEdge,EfMean,EfNormalization = [table[detectorSubset] for table in [A4,PixelEdge,EfMean,EfNormalization]]
+        EfMean = EfMean.reshape(1,detectors,EPrDetector*binning)
+        EfNormalization = EfNormalization.reshape(1,detectors,EPrDetector*binning)
+        return {'binning':binning,'A4':A4,'PixelEdge':PixelEdge.reshape(detectors,EPrDetector*binning,2),'EfMean':EfMean,
+                'EfNormalization':EfNormalization}
+
+    def _convertSteps(self,setup,binningSetup,integrationMethod='reduceat',factorized=False,precision=None):
+        """Convert the scan steps of a conversion setup using the per pixel parts of a binning. Returns dictionary of converted fields."""
+        EPrDetector = setup['EPrDetector']
+        Data = setup['Data']
+        detectors = setup['detectors']
+        binning = binningSetup['binning']
+        A4 = binningSetup['A4']
+        EfNormalization = binningSetup['EfNormalization']
+
+        Intensity = _tools.integratePixelRanges(Data,binningSetup['PixelEdge'],method=integrationMethod).astype(int)
+
+        coordinates = FactorizedCoordinates(setup['UBINV'],self.sample,setup['A3'],setup['Ei'],setup['A4File'],setup['A4Zero'],
+                                            A4.reshape((1,detectors,binning*EPrDetector)),binningSetup['EfMean'],precision=precision)
+        Monitor = np.asarray(setup['Monitor'],dtype=float) # Monitor only depends on step and normalization only on pixel
+        Normalization = EfNormalization.astype(_tools.computeDtype(precision) or np.float64) # float64 unless a precision is set
+
+        fields = {'I':Intensity,'Monitor':Monitor,'binning':binning,'Norm':Normalization,'precision':precision}
+        if factorized:
+            fields['_coordinates'] = coordinates
+        else:
+            fields.update(coordinates.calculate())
+        return fields
 
+    def _convertedFile(self,fields):
+        """Create converted data file from the converted fields of this raw data file."""
+        binning = fields['binning']
         convFile = DataFile(self) # Copy everything from old file
-        updateDict = {'I':Intensity,'Monitor':Monitor,'qx':QX,'qy':QY,'energy':DeltaE,'binning':binning,'Norm':Normalization,
-        'h':H,'k':K,'l':L,'type':'nxs','fileLocation':None,'original_file':self,'name':self.name.replace('.hdf','.nxs')}
+        updateDict = {'type':'nxs','fileLocation':None,'original_file':self,'name':self.name.replace('.hdf','.nxs'),
+        'fingerprint':self.conversionFingerprint(binning),'_coordinates':None}
+        updateDict.update(fields)
         convFile.updateProperty(updateDict)
+        convFile.masks = defaultMasks(convFile)
+        if not convFile._coordinates is None: # Coordinates are calculated when first needed
+            for key in FactorizedCoordinates.fields:
+                convFile._lazyFields[key] = 'coordinates'
         return convFile
 
 
@@ -422,29 +710,54 @@ class DataFile(object):
         if binning is None or binning == self.binning:
             binning = self.binning
         else:
-            with hdf.File(self.fileLocation) as f:
-                # Check if binning is in file
-                instr = getInstrument(f)
-                
-                binningsPossible = np.array([int(x[-1]) for x in np.array(instr) if x[:5]=='calib'])#np.array([int(x.split('_')[0]) for x in np.array(f.get('entry/calibration'))])
-                if not binning in binningsPossible:
-                    raise AttributeError('The provided binning ({}) is not present in the data file.'.format(binning))
-                
-                #self.instrumentCalibrationEf = np.array(f.get('entry/calibration/{}_pixels/ef'.format(str(self.binning))))
-                #self.instrumentCalibrationA4 = np.array(f.get('entry/calibration/{}_pixels/a4'.format(str(self.binning))))
-                #self.instrumentCalibrationEdges = np.array(f.get('entry/calibration/{}_pixels/edges'.format(str(self.binning))))
-                Ef = np.array(instr.get('calib{}/final_energy'.format(str(binning))))
-                width = np.array(instr.get('calib{}/width'.format(str(binning))))
-                bg = np.array(instr.get('calib{}/background'.format(str(binning))))
-                amp = np.array(instr.get('calib{}/amplitude'.format(str(binning))))
-                self.instrumentCalibrationEf = np.array([amp,Ef,width,bg]).T
-                self.instrumentCalibrationA4 = np.array(instr.get('calib{}/a4offset'.format(str(binning))))
-                if self.instrumentCalibrationA4 is None:
-                    print('self.instrumentCalibrationA4 is NONE with binning {}!!'.format(binning))
-                self.instrumentCalibrationEdges = np.array(instr.get('calib{}/boundaries'.format(str(binning))))
-                self.binning = binning 
+            # Check if binning is in file
+            if not binning in self.possibleBinnings:
+                raise AttributeError('The provided binning ({}) is not present in the data file.'.format(binning))
+            self._calibrationKey(binning)
+            self._setCalibration(binning)
+            self.binning = binning 
         #return self
 
+    def _calibrationKey(self,binning):
+        """Return the registry key of the normalization tables of a binning, reading the tables from file if needed."""
+        if not int(binning) in self._calibrationKeys: # Tables not yet in registry
+            if not binning in self.possibleBinnings:
+                raise AttributeError('The provided binning ({}) is not present in the data file.'.format(binning))
+            with hdf.File(self.fileLocation,'r') as f:
+                self._registerCalibrations(_tools.getInstrument(f))
+        return self._calibrationKeys[int(binning)]
+
+    def conversionFingerprint(self,binning):
+        """Fingerprint of everything the conversion into a given binning depends on: the raw file (location, modification 
+        time and size), the normalization tables, the binning, the sample orientation, the A3 and A4 offsets and the MJOLNIR version.
+
+        Args:
+
+            - binning (int): Binning of the conversion.
+
+        Returns:
+
+            - fingerprint (string): Hex digest identifying the conversion.
+
+        Raises:
+
+            - AttributeError
+
+        """
+        if not self.type == 'hdf':
+            raise AttributeError('Only raw (hdf) data files can be converted.')
+        stat = os.stat(self.fileLocation)
+        fingerprint = hashlib.sha1()
+        for part in [os.path.realpath(self.fileLocation),stat.st_mtime,stat.st_size,self._calibrationKey(binning),int(binning),MJOLNIR.__version__]:
+            fingerprint.update(str(part).encode())
+        for array in [self.sample.orientationMatrix,self.A3Off,self.A4Off]:
+            fingerprint.update(np.ascontiguousarray(array,dtype=float).tobytes())
+        for name in ['stepSubset','detectorSubset']: # Conversions of a subset differ from the conversion of the full file
+            subset = self.__dict__.get(name)
+            if not subset is None:
+                fingerprint.update(name.encode()+np.ascontiguousarray(subset,dtype=np.int64).tobytes())
+        return fingerprint.hexdigest()
+
     @_tools.KwargChecker()
     def calculateEdgePolygons(self,addEdge=True):
         """Method to calculate bounding polygon for all energies. The energies are split using the bin-edges method of DataSet. Hereafter,
@@ -589,43 +902,81 @@ class DataFile(object):
         return edgePolygon,EBins
 
 
-    def saveNXsqom(self,saveFileName):
-        """Save converted file into an NXsqom.
+    @_tools.KwargChecker()
+    def saveNXsqom(self,saveFileName,chunks='step',compression=None,compressionLevel=None,shuffle=False,precision=None,link=False,resizable=False):
+        """Save converted file into an NXsqom. The monitor of masked points, see maskBitmap, is written as zero. Monitor and 
+        normalization are written in the shape of the intensity and, for loading, in their compact shapes, see NXsqomCompactFields.
 
         Args:
 
             - saveFileName (string): File name to be saved into.
 
+        Kwargs:
+
+            - chunks (string, int, tuple or None): Chunk shape of the data fields. 'step' stores each scan step (all detectors and pixels) in 
+              one chunk, giving fast reads of any range of steps, an integer stores that many steps per chunk, a tuple is used as is and None 
+              stores the fields contiguously, which is not possible together with compression or shuffle (default 'step').
+
+            - compression (string): Compression of the data fields, 'gzip', 'lzf' or None (default None).
+
+            - compressionLevel (int): Level of gzip compression between 0 and 9 (default None, i.e. 4).
+
+            - shuffle (bool): If true, the byte shuffle filter is applied before compression (default False).
+
+            - precision (dict): Data type of fields overwriting the defaults in NXsqomFields, e.g. {'qx':'float16'} (default None).
+
+            - link (bool): If true, the raw data is referenced through external links to the raw file instead of being copied. The 
+              converted file then only holds the reduced data and depends on the raw file staying in place, see materializeNXsqom (default False).
+
+            - resizable (bool): If true, the data fields can be extended along the step axis, see ScanFollower (default False).
+
+        Raises:
+
+            - AttributeError
+
         """
 
         if not self.__hasattr__('original_file'):
             raise AttributeError('Data file does not have link to the original file. This is needed to make a complete copy when creating nxs-files')
         if not self.type =='nxs':
             raise AttributeError('Only nxs typed files can be saved as nxs-files.')
+        if not self.__dict__.get('stepSubset') is None or not self.__dict__.get('detectorSubset') is None:
+            raise AttributeError('Data file {} holds a subset of steps or detectors of the raw file and cannot be saved as nxs-file.'.format(self.name))
+        missing = [key for key in NXsqomFields.keys() if self.__dict__.get(key,0) is None]
+        if len(missing)>0:
+            raise AttributeError('Data file {} has been loaded without the field(s) {} and cannot be saved as nxs-file.'.format(self.name,', '.join(missing)))
+        factorized = [key for key in FactorizedCoordinates.fields if self.isFactorized()] # Written in chunks of steps
+        compact = list(NXsqomCompactFields.keys()) # Written in the shape of the intensity as all other fields and in their compact shape
+        shapes = dict([(key,self.I.shape if key in factorized+compact else np.shape(getattr(self,key))) for key in NXsqomFields.keys()])
+        datasetOptions = dict([(key,NXsqomDatasetOptions(shapes[key],chunks=chunks,compression=compression,
+                                compressionLevel=compressionLevel,shuffle=shuffle,resizable=resizable)) for key in NXsqomFields.keys()])
+        compactOptions = dict([(key,NXsqomDatasetOptions(np.shape(getattr(self,key)),chunks=chunks,compression=compression,
+                                compressionLevel=compressionLevel,shuffle=shuffle,resizable=resizable)) for key in compact])
+        dataTypes = dict([(key,dtype) for key,(_,dtype,_) in NXsqomFields.items()])
+        if not precision is None:
+            for key,dtype in precision.items():
+                if not key in dataTypes:
+                    raise AttributeError('Precision given for unknown field {}. Possible fields are: {}.'.format(key,', '.join(sorted(dataTypes.keys()))))
+                dataTypes[key] = np.dtype(dtype)
 
         datafile = self.original_file
-        Intensity = self.I # Dont swap axis as they are correct!
-        Monitor = self.Monitor
-        QX = self.qx
-        QY = self.qy
-        DeltaE = self.energy 
         binning = self.binning
-        Normalization = self.Norm
-        H = self.h
-        K = self.k
-        L = self.l
+        bitmap = self.maskBitmap()
 
         if os.path.exists(saveFileName):
             warnings.warn('The file {} exists alread. Old file will be renamed to {}.'.format(saveFileName,saveFileName+'_old'))
             os.rename(saveFileName,saveFileName+'_old')
         fd = hdf.File(saveFileName,'w')
         fs = hdf.File(datafile.fileLocation,'r')
-        group_path = fs['/entry'].parent.name
-        
-        group_id = fd.require_group(group_path)
-        
-        
-        fs.copy('/entry', group_id, name="/entry")
+        if link:
+            linkRawEntry(fs,fd)
+        else:
+            group_path = fs['/entry'].parent.name
+            
+            group_id = fd.require_group(group_path)
+            
+            
+            fs.copy('/entry', group_id, name="/entry")
         
         definition = fd.create_dataset('entry/definition',(1,),dtype='S70',data=np.string_('NXsqom'))
         definition.attrs['NX_class'] = 'NX_CHAR'
@@ -648,38 +999,447 @@ class DataFile(object):
 
         normalizationString = proc.create_dataset('binning',shape=(1,),dtype='int32',data=binning)
         normalizationString.attrs['NX_class']=b'NX_INT'
+
+        if not self.__dict__.get('fingerprint') is None:
+            fingerprint = proc.create_dataset('fingerprint',shape=(1,),dtype='S70',data=np.string_(self.fingerprint))
+            fingerprint.attrs['NX_class']=b'NX_CHAR'
         
         data = fd.get('entry/data')
         
-        fileLength = Intensity.shape
-        
-        Int = data.create_dataset('intensity',shape=(fileLength),dtype='int32',data=Intensity)
-        Int.attrs['NX_class']='NX_INT'
-        
-        monitor = data.create_dataset('monitor',shape=(fileLength),dtype='int32',data=Monitor)
-        monitor.attrs['NX_class']=b'NX_INT'
+        for key,(name,_,NXClass) in NXsqomFields.items(): # Dont swap axis as they are correct!
+            if key in factorized:
+                dataset = data.create_dataset(name,shape=shapes[key],dtype=dataTypes[key],**datasetOptions[key])
+            else:
+                value = np.broadcast_to(getattr(self,key),shapes[key])
+                if key == 'Monitor' and not bitmap is None: # Masked monitor is written as zero as by earlier versions
+                    value = np.where(np.broadcast_to(bitmap,shapes[key]),0,value)
+                dataset = data.create_dataset(name,dtype=dataTypes[key],data=value,**datasetOptions[key])
+            dataset.attrs['NX_class']=NXClass
+            if key in compact:
+                dataset = data.create_dataset(NXsqomCompactFields[key],dtype=dataTypes[key],data=getattr(self,key),**compactOptions[key])
+                dataset.attrs['NX_class']=NXClass
+        data.attrs['MJOLNIR_format_version'] = NXsqomFormatVersion
+        if len(factorized)>0:
+            for start,stop,coordinates in self._coordinates.iterate():
+                for key in factorized:
+                    data[NXsqomFields[key][0]][start:stop] = coordinates[key]
 
-        normalization = data.create_dataset('normalization',shape=(fileLength),dtype='float32',data=Normalization)
-        normalization.attrs['NX_class']=b'NX_FLOAT'
-        
-        qx = data.create_dataset('qx',shape=(fileLength),dtype='float32',data=QX)
-        qx.attrs['NX_class']=b'NX_FLOAT'
-        
-        qy = data.create_dataset('qy',shape=(fileLength),dtype='float32',data=QY)
-        qy.attrs['NX_class']=b'NX_FLOAT'
+        fd.close()
+        fs.close()
+
+            
+class FactorizedCoordinates(object):
+    """Q and energy coordinates of a converted data file stored in factorized form: sample rotation, incoming energy and 
+    analyser angle for each scan step together with A4 offset and final energy for each pixel. Coordinates are calculated 
+    for ranges of steps on demand."""
+    fields = ['qx','qy','energy','h','k','l']
 
-        en = data.create_dataset('en',shape=(fileLength),dtype='float32',data=DeltaE)
-        en.attrs['NX_class']=b'NX_FLOAT'
+    def __init__(self,UBINV,sample,A3,Ei,A4File,A4Zero,A4Pixel,EfMean,precision=None):
+        """Args:
 
-        h = data.create_dataset('h',shape=(fileLength),dtype='float32',data=H)
-        k = data.create_dataset('k',shape=(fileLength),dtype='float32',data=K)
-        l = data.create_dataset('l',shape=(fileLength),dtype='float32',data=L)
-        for x in [h,k,l]:
-            x.attrs['NX_class']=b'NX_FLOAT'
+            - UBINV (3x3 array): Inverse of the orientation matrix.
 
-        fd.close()
+            - sample (Sample): Sample of data file.
+
+            - A3 (array): Sample rotation of each step in radians of shape (steps,1,1).
 
+            - Ei (array): Incoming energy of shape (steps,1,1) or (1,1,1).
+
+            - A4File (array): Analyser angle in degrees of shape (steps,1,1) or (1,1,1).
+
+            - A4Zero (float): Offset of analyser angle in degrees.
+
+            - A4Pixel (array): A4 offset of each pixel in radians of shape (1,detectors,pixels).
+
+            - EfMean (array): Final energy of each pixel of shape (1,detectors,pixels).
+
+        Kwargs:
+
+            - precision (string): Floating point type of the calculated coordinates (default None, i.e. the global compute precision).
+
+        """
+        self.UBINV = UBINV
+        self.sample = sample
+        self.A3 = A3
+        self.Ei = Ei
+        self.A4File = A4File
+        self.A4Zero = A4Zero
+        self.A4Pixel = A4Pixel
+        self.EfMean = EfMean
+        self.precision = precision
+
+    @property
+    def shape(self):
+        return (self.A3.shape[0],)+self.A4Pixel.shape[1:]
+
+    @property
+    def nbytes(self):
+        return int(np.sum([np.asarray(x).nbytes for x in [self.A3,self.Ei,self.A4File,self.A4Pixel,self.EfMean]]))
+
+    def calculate(self,start=0,stop=None):
+        """Calculate coordinates of a range of scan steps.
+
+        Kwargs:
+
+            - start (int): First step (default 0).
+
+            - stop (int): Step after last step (default all steps).
+
+        Returns:
+
+            - coordinates (dict): qx, qy, energy, h, k and l of shape (stop-start,detectors,pixels).
+
+        """
+        steps = self.A3.shape[0]
+        if stop is None:
+            stop = steps
+        def stepSlice(value): # Values constant during the scan are stored for a single step
+            if value.shape[0]>1:
+                return value[start:stop]
+            return value
+        A3 = self.A3[start:stop]
+        Ei = stepSlice(self.Ei)
+        EfMean = self.EfMean
+        factorsqrtEK = 0.694692
+        
+        A4Mean = -(self.A4Pixel+np.deg2rad(stepSlice(self.A4File)-self.A4Zero))
+
+        if False:
+            kf = factorsqrtEK*np.sqrt(EfMean)#.reshape(1,detectors,binning*EPrDetector)
             
+            ki = factorsqrtEK*np.sqrt(Ei).reshape(-1,1,1)
+            # Shape everything into shape (steps,detectors,bins) (if external parameter is changed, this is assured by A3 reshape)
+            Qx = ki-kf*np.cos(A4Mean)
+            Qy = -kf*np.sin(A4Mean)
+            QX = Qx*np.cos(A3)-Qy*np.sin(A3)
+            QY = Qx*np.sin(A3)+Qy*np.cos(A3)
+        else:
+            HKL,QX,QY = TasUBlib.calcTasQH(self.UBINV,[np.rad2deg(A3).squeeze(),np.rad2deg(-A4Mean)],Ei.squeeze(),EfMean.squeeze())
+        DeltaE = Ei-EfMean
+        if DeltaE.shape[0]==1:
+            DeltaE = DeltaE*np.ones((stop-start,1,1))
+
+        shapes = QX.shape
+        sample = self.sample
+        pos = sample.inv_tr(QX.flatten(),QY.flatten())
+        H,K,L = (sample.orientationMatrix[0].reshape(-1,1)*pos[0].reshape(1,-1)+sample.orientationMatrix[1].reshape(-1,1)*pos[1].reshape(1,-1)).reshape(3,*shapes)
+        coordinates = {'qx':QX,'qy':QY,'energy':DeltaE,'h':H,'k':K,'l':L}
+        return dict([(key,_tools.castPrecision(value,self.__dict__.get('precision'))) for key,value in coordinates.items()])
+
+    def iterate(self,stepsPerChunk=10):
+        """Calculate coordinates in chunks of scan steps.
+
+        Kwargs:
+
+            - stepsPerChunk (int): Number of scan steps in each chunk (default 10).
+
+        Returns:
+
+            - chunks (generator): Tuples of start step, stop step and coordinates of chunk.
+
+        """
+        steps = self.A3.shape[0]
+        for start in range(0,steps,stepsPerChunk):
+            stop = min(start+stepsPerChunk,steps)
+            yield start,stop,self.calculate(start,stop)
+
+class ScanFollower(object):
+    """Incremental conversion of a raw data file while the scan is still running. Only scan steps written since the last update
+    are read and converted, while the normalization tables and all per pixel parts of the conversion are prepared once per scan.
+    The converted steps are appended to an in-memory converted data file and optionally to a nxs-file, in which the raw data is
+    linked, see DataFile.saveNXsqom."""
+    _scanKeys = ['Ei','_A3','_A4','temperature','magneticField','electricField','scanParameters','scanValues','scanUnits']
+
+    @_tools.KwargChecker()
+    def __init__(self,fileLocation,binning=8,saveLocation=None,swmr=True,integrationMethod='reduceat'):
+        """Start following a raw data file and convert the steps written so far.
+
+        Args:
+
+            - fileLocation (string): Location of raw (hdf) data file.
+
+        Kwargs:
+
+            - binning (int): Binning used for the conversion (default 8).
+
+            - saveLocation (string): If given, converted steps are also saved into this nxs-file (default None).
+
+            - swmr (bool): If true, the raw file is kept open in single writer multiple reader mode and refreshed on each update. 
+              Otherwise it is reopened on each update, e.g. for writers closing the file between steps (default True).
+
+            - integrationMethod (string): Method used to sum raw pixels into binned pixels, see DataFile.convert (default 'reduceat').
+
+        Raises:
+
+            - AttributeError
+
+        """
+        self._rawFile = DataFile(fileLocation)
+        if not self._rawFile.type == 'hdf':
+            raise AttributeError('Only raw (hdf) data files can be followed.')
+        self.binning = binning
+        self.saveLocation = saveLocation
+        self.swmr = swmr
+        self.integrationMethod = integrationMethod
+        self.dataFile = None
+        self.steps = 0
+        self._binningSetup = None
+        self._file = None
+        self._datasets = None
+        self._buffers = {}
+
+        rawFile = self._rawFile
+        scanFields = dict([(key,rawFile.__dict__[key]) for key in self._scanKeys])
+        stop = self._availableSteps(rawFile.I.shape[0],len(rawFile.Monitor),scanFields)
+        if stop>0:
+            self._appendSteps(rawFile.I[:stop],rawFile.Monitor,scanFields,stop)
+
+    def _open(self):
+        if not self.swmr:
+            return hdf.File(self._rawFile.fileLocation,'r')
+        if self._file is None:
+            try:
+                self._file = hdf.File(self._rawFile.fileLocation,'r',libver='latest',swmr=True)
+            except (IOError,OSError,ValueError) as e:
+                warnings.warn('File {} could not be opened in SWMR mode ({}). Reverting to reopening the file on each update.'.format(self._rawFile.name,e))
+                self.swmr = False
+                return self._open()
+            self._datasets = self._readDatasets(self._file)
+        for dataset in self._datasets:
+            dataset.refresh()
+        return self._file
+
+    def _readDatasets(self,f):
+        """Datasets read on each update, see update, _readScanFields and getScanParameter. Only these are refreshed in SWMR mode."""
+        instr = f[self._rawFile._instrumentPath]
+        dataGroup = _tools.getNXGroup(f,'NXdata')
+        groups = [(instr,['detector/counts','monochromator/energy','analyzer/polar_angle']),
+                  (f,['entry/control/data','entry/sample/rotation_angle']),
+                  (_tools.getNXGroup(f,'NXsample'),['temperature','magnetic_field','electric_field']),
+                  (_tools.getNXGroup(f,'NXentry'),['scanvars']),
+                  (dataGroup,[] if dataGroup is None else list(dataGroup.keys()))] # Scanned values
+        datasets = []
+        for group,names in groups:
+            if group is None:
+                continue
+            for name in names:
+                item = group.get(name)
+                if isinstance(item,hdf.Dataset) and not item in datasets: # Hard links to a dataset are refreshed once
+                    datasets.append(item)
+        return datasets
+
+    def close(self):
+        """Close the raw data file if kept open in SWMR mode."""
+        if not self._file is None:
+            self._datasets = None
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+    def _availableSteps(self,countSteps,monitorSteps,scanFields):
+        """Number of steps for which counts, monitor and all scanned angles and energies have been written."""
+        steps = min(countSteps,monitorSteps)
+        for key in ['Ei','_A3','_A4']:
+            value = np.asarray(scanFields[key])
+            if value.ndim>0 and value.shape[0]>1:
+                steps = min(steps,value.shape[0])
+        return steps
+
+    def update(self):
+        """Read and convert the steps written to the raw file since the last update.
+
+        Returns:
+
+            - newSteps (int): Number of steps converted.
+
+        """
+        rawFile = self._rawFile
+        f = self._open()
+        try:
+            rawFile._readScanFields(f,f[rawFile._instrumentPath])
+            scanFields = dict([(key,rawFile.__dict__[key]) for key in self._scanKeys])
+            monitor = np.array(f.get('entry/control/data'))
+            counts = f.get(rawFile._instrumentPath+'/detector/counts')
+            stop = self._availableSteps(counts.shape[0],len(monitor),scanFields)
+            if stop<=self.steps:
+                return 0
+            newCounts = prepareRawCounts(np.array(counts[self.steps:stop]))
+        finally:
+            if not self.swmr:
+                f.close()
+        return self._appendSteps(newCounts,monitor,scanFields,stop)
+
+    def _appendSteps(self,counts,monitor,scanFields,stop):
+        """Convert the steps from the last converted step up to stop and append them to the converted file."""
+        start = self.steps
+        rawFile = self._rawFile
+        def stepSlice(value): # Restrict values changing during the scan to the new steps
+            value = np.asarray(value)
+            if value.ndim>0 and value.shape[0]>1:
+                return value[start:stop]
+            return value
+
+        rawFile.I = counts
+        rawFile.Monitor = np.asarray(monitor)[start:stop]
+        rawFile.Ei = stepSlice(scanFields['Ei'])
+        rawFile.A3 = stepSlice(scanFields['_A3'])
+        rawFile.A4 = stepSlice(scanFields['_A4'])
+        setup = rawFile._conversionSetup()
+        if self._binningSetup is None:
+            self._binningSetup = rawFile._binningSetup(setup,self.binning)
+        fields = rawFile._convertSteps(setup,self._binningSetup,self.integrationMethod)
+
+        metaData = dict(scanFields)
+        for key in ['Ei','_A3','_A4']:
+            value = np.asarray(scanFields[key])
+            if value.ndim>0 and value.shape[0]>1:
+                metaData[key] = value[:stop]
+
+        if self.dataFile is None:
+            self.dataFile = rawFile._convertedFile(fields)
+            self.dataFile.updateProperty(metaData)
+            if not self.saveLocation is None:
+                self.dataFile.saveNXsqom(self.saveLocation,link=True,resizable=True)
+        else:
+            self._appendFields(fields)
+            self.dataFile.updateProperty(metaData)
+            if not self.saveLocation is None:
+                self._appendToFile(fields)
+        self.steps = stop
+        return stop-start
+
+    def _appendFields(self,fields):
+        """Append converted steps to the converted file. Fields are views of buffers growing geometrically, so following a scan 
+        step by step costs amortized time proportional to the steps converted, see DataSet.PointTable.extend."""
+        for key in NXsqomStepFields:
+            value = np.asarray(self.dataFile.__dict__[key])
+            steps,stop = value.shape[0],value.shape[0]+fields[key].shape[0]
+            buffer = self._buffers.get(key)
+            dtype = np.result_type(value,fields[key])
+            if buffer is None or buffer.shape[0]<stop or buffer.shape[1:]!=value.shape[1:] or buffer.dtype!=dtype:
+                buffer = self._buffers[key] = np.empty((max(stop,2*steps),)+value.shape[1:],dtype=dtype)
+                buffer[:steps] = value
+            buffer[steps:stop] = fields[key]
+            self.dataFile.__dict__[key] = buffer[:stop]
+
+    def _appendToFile(self,fields):
+        shape = fields['I'].shape
+        bitmap = self.dataFile.maskBitmap() # Masked monitor is written as zero, see DataFile.saveNXsqom
+        if not bitmap is None:
+            bitmap = np.broadcast_to(bitmap[-shape[0]:] if bitmap.shape[0]>1 else bitmap,shape)
+        with hdf.File(self.saveLocation,'r+') as f:
+            data = f['entry/data']
+            for key in NXsqomStepFields:
+                dataset = data[NXsqomFields[key][0]]
+                steps = dataset.shape[0]
+                dataset.resize(steps+fields[key].shape[0],axis=0)
+                value = np.broadcast_to(fields[key],shape)
+                if key == 'Monitor' and not bitmap is None:
+                    value = np.where(bitmap,0,value)
+                dataset[steps:] = value
+                if key in NXsqomCompactFields and NXsqomCompactFields[key] in data:
+                    dataset = data[NXsqomCompactFields[key]]
+                    dataset.resize(steps+fields[key].shape[0],axis=0)
+                    dataset[steps:] = fields[key]
+
+    @_tools.KwargChecker()
+    def follow(self,interval=1.0,timeout=60.0,callback=None):
+        """Update repeatedly until no new steps have been written for a given time.
+
+        Kwargs:
+
+            - interval (float): Time in seconds between updates (default 1.0).
+
+            - timeout (float): Time in seconds without new steps after which the scan is considered finished (default 60.0).
+
+            - callback (function): Called as callback(follower,newSteps) after each update converting new steps, e.g. to redraw cuts (default None).
+
+        Returns:
+
+            - dataFile (DataFile): Converted data file.
+
+        """
+        lastChange = time.time()
+        while True:
+            newSteps = self.update()
+            if newSteps>0:
+                lastChange = time.time()
+                if not callback is None:
+                    callback(self,newSteps)
+            elif time.time()-lastChange>=timeout:
+                break
+            time.sleep(interval)
+        return self.dataFile
+
+def prepareRawCounts(counts):
+    """Bring raw detector counts of shape (steps, pixels, detectors) into shape (steps, detectors, pixels)."""
+    return counts.swapaxes(1,2)
+
+def defaultMasks(datafile):
+    """Masks data files start out with. Raw data files mask the lowest 200 raw pixels of each detector, where a spurion is 
+    present, and converted data files mask the binned pixels of the lowest final energy, whose monitor used to be set to zero. 
+    The masks are kept in the masks attribute of the file, where they can be inspected, removed or replaced. Counts and monitor 
+    of masked points are no longer zero in I and Monitor of the file or of a DataSet, but are left out of cuts and binning.
+
+    Args:
+
+        - datafile (DataFile): Raw or converted data file.
+
+    Returns:
+
+        - masks (list of Masks): Default masks of the data file.
+
+    """
+    if datafile.type == 'hdf':
+        return [Mask.PixelMask(range(200))]
+    return [Mask.PixelMask(range(int(datafile.binning)))]
+
+def subsetIndices(subset,length):
+    """Sorted indices of a subset of scan steps or detectors given as slice, integer or list of integers. None selects everything and is returned as is."""
+    if subset is None:
+        return None
+    if isinstance(subset,slice):
+        indices = np.arange(length)[subset]
+    else:
+        indices = np.asarray(subset,dtype=int).reshape(-1)
+    indices = np.unique(np.where(indices<0,indices+length,indices))
+    if len(indices)==0 or indices[0]<0 or indices[-1]>=length:
+        raise AttributeError('Subset {} is empty or out of range for {} entries.'.format(subset,length))
+    return indices
+
+def readSubset(dataset,subsets):
+    """Read the part of a dataset given by subsets of indices along some axes.
+
+    Args:
+
+        - dataset (hdf dataset): Dataset to be read.
+
+        - subsets (dict): Axis to (indices, length) where indices are sorted as returned by subsetIndices. Axes are only 
+          restricted if the indices are not None and the dataset has the given length along the axis, e.g. not for compactly stored fields.
+
+    Each axis is read as one hyperslab from the first to the last index and the indices in between not selected are dropped afterwards.
+
+    """
+    if len(dataset.shape)==0:
+        return np.array(dataset)
+    hyperslab = [slice(None)]*len(dataset.shape)
+    selection = {}
+    for axis,(indices,length) in subsets.items():
+        if indices is None or axis>=len(dataset.shape) or dataset.shape[axis]!=length:
+            continue
+        hyperslab[axis] = slice(indices[0],indices[-1]+1)
+        if not len(indices)==indices[-1]+1-indices[0]: # Not contiguous
+            selection[axis] = indices-indices[0]
+    value = dataset[tuple(hyperslab)]
+    for axis,indices in selection.items():
+        value = np.take(value,indices,axis=axis)
+    return value
+
 def decodeStr(string):
     try:
         if 'decode' in string.__dir__():
@@ -689,6 +1449,288 @@ def decodeStr(string):
     except:
         return string
 
+def readMetaData(fileLocation):
+    """Read the header information of a raw (hdf) or converted (nxs) data file without touching detector counts, 
+    converted coordinates or normalization tables.
+
+    Args:
+
+        - fileLocation (string): Location of the data file.
+
+    Returns:
+
+        - metaData (dict): Dictionary with name, fileLocation, type, instrument, title, scanCommand, scanParameters, scanValues, scanUnits,
+          Ei, A3, A4, temperature, magneticField, electricField, sampleName, possibleBinnings and binning (None for raw files).
+
+    Raises:
+
+        - AttributeError
+
+    """
+    if not os.path.isfile(fileLocation):
+        raise AttributeError('File location does not exist({}).'.format(fileLocation))
+    fileType = fileLocation.split('.')[-1]
+    if not fileType in ['nxs','hdf']:
+        raise AttributeError('File is not of type nxs or hdf.')
+
+    metaData = {'name':fileLocation.split('/')[-1],'fileLocation':os.path.abspath(fileLocation),'type':fileType}
+    with hdf.File(fileLocation,'r') as f:
+        instr = _tools.getInstrument(f)
+        sample = _tools.getNXGroup(f,'NXsample')
+        metaData['instrument'] = instr.name.split('/')[-1]
+        metaData['title'] = decodeStr(np.array(f.get('entry/title'))[0])
+        metaData['scanCommand'] = decodeStr(np.array(f.get('entry/scancommand'))[0])
+        metaData['scanParameters'],metaData['scanValues'],metaData['scanUnits'] = getScanParameter(f)
+        metaData['Ei'] = np.array(instr.get('monochromator/energy'))
+        A3 = sample.get('rotation_angle')
+        if A3 is None: # Raw files only store the scanned A3 values
+            A3 = f.get('entry/data/rotation_angle')
+        metaData['A3'] = np.array(A3).reshape(-1) if not A3 is None else np.array([0.0])
+        metaData['A4'] = np.array(instr.get('analyzer/polar_angle')).reshape(-1)
+        for key,path in zip(['temperature','magneticField','electricField'],['temperature','magnetic_field','electric_field']):
+            value = sample.get(path)
+            metaData[key] = None if value is None else np.array(value)
+        metaData['sampleName'] = decodeStr(np.array(sample.get('name'))[0])
+        metaData['possibleBinnings'] = np.array([int(x[-1]) for x in np.array(instr) if x[:5]=='calib'])
+        if fileType == 'nxs':
+            metaData['binning'] = np.array(f.get('entry/reduction/MJOLNIR_algorithm_convert/binning'))[0]
+        else:
+            metaData['binning'] = None
+    return metaData
+
+# Attribute of converted data file: (name in entry/data, default data type, NeXus class)
+NXsqomFields = {'I':('intensity',np.dtype('int32'),b'NX_INT'),'Monitor':('monitor',np.dtype('int32'),b'NX_INT'),
+                'Norm':('normalization',np.dtype('float32'),b'NX_FLOAT'),'qx':('qx',np.dtype('float32'),b'NX_FLOAT'),
+                'qy':('qy',np.dtype('float32'),b'NX_FLOAT'),'energy':('en',np.dtype('float32'),b'NX_FLOAT'),
+                'h':('h',np.dtype('float32'),b'NX_FLOAT'),'k':('k',np.dtype('float32'),b'NX_FLOAT'),'l':('l',np.dtype('float32'),b'NX_FLOAT')}
+
+# Monitor and normalization are also stored in their compact shapes (steps,1,1) and (1,detectors,pixels) from format version 2 on, 
+# next to the full size fields read by earlier versions
+NXsqomCompactFields = {'Monitor':'monitor_compact','Norm':'normalization_compact'}
+NXsqomFormatVersion = 2
+
+# Fields growing with the scan steps, i.e. all but the normalization which only depends on the pixel
+NXsqomStepFields = [key for key in NXsqomFields.keys() if not key == 'Norm']
+
+def NXsqomDatasetOptions(shape,chunks='step',compression=None,compressionLevel=None,shuffle=False,resizable=False):
+    """Storage options of the data fields in a NXsqom file, see DataFile.saveNXsqom.
+
+    Args:
+
+        - shape (tuple): Shape of the data field, (steps, detectors, pixels).
+
+    Kwargs:
+
+        - chunks (string, int, tuple or None): 'step', number of steps per chunk, chunk shape or None for contiguous storage (default 'step').
+
+        - compression (string): 'gzip', 'lzf' or None (default None).
+
+        - compressionLevel (int): Level of gzip compression (default None).
+
+        - shuffle (bool): Apply byte shuffle filter (default False).
+
+        - resizable (bool): Allow fields to be extended along the step axis (default False).
+
+    Returns:
+
+        - options (dict): Keyword arguments for h5py create_dataset.
+
+    Raises:
+
+        - AttributeError
+
+    """
+    if not compression in [None,'gzip','lzf']:
+        raise AttributeError('Compression not understood. Expected "gzip", "lzf" or None but received {}.'.format(compression))
+    if not compressionLevel is None and not compression == 'gzip':
+        raise AttributeError('A compression level is only possible with gzip compression.')
+    if chunks == 'step':
+        chunks = 1
+    if isinstance(chunks,(int,np.integer)):
+        if chunks<1:
+            raise AttributeError('Number of steps per chunk has to be positive, received {}.'.format(chunks))
+        chunks = (int(min(chunks,shape[0])),)+tuple(shape[1:])
+    elif not chunks is None:
+        chunks = tuple(chunks)
+        if not len(chunks) == len(shape):
+            raise AttributeError('Chunk shape {} does not match shape of data {}.'.format(chunks,shape))
+        chunks = tuple([min(chunk,length) for chunk,length in zip(chunks,shape)]) # Chunks are at most the size of the field
+    if chunks is None and (not compression is None or shuffle or resizable):
+        raise AttributeError('Compression, shuffle filter and resizable fields require chunked storage.')
+    options = {'chunks':chunks,'shuffle':shuffle}
+    if resizable:
+        options['maxshape'] = (None,)+tuple(shape[1:])
+    if not compression is None:
+        options['compression'] = compression
+        if not compressionLevel is None:
+            options['compression_opts'] = compressionLevel
+    return options
+
+def linkRawEntry(source,target):
+    """Reference the entry of a raw file from a converted file through external links. The entry and its data group are 
+    created in the converted file, as reduced data and reduction information are added to these, while all their members 
+    point to the raw file.
+
+    Args:
+
+        - source (hdf file): Open raw data file.
+
+        - target (hdf file): Open converted data file in write mode.
+
+    """
+    rawFileLocation = os.path.realpath(source.filename)
+    for groupPath in ['entry','entry/data']:
+        group = target.create_group(groupPath)
+        for key,value in source[groupPath].attrs.items():
+            group.attrs[key] = value
+        for name in source[groupPath]:
+            if groupPath == 'entry' and name == 'data':
+                continue
+            group[name] = hdf.ExternalLink(rawFileLocation,'/'+groupPath+'/'+name)
+
+def materializeNXsqom(fileLocation):
+    """Replace all external links in a converted file by copies of the linked raw data, making the file self-contained 
+    for archiving, see DataFile.saveNXsqom.
+
+    Args:
+
+        - fileLocation (string): Location of converted data file.
+
+    Returns:
+
+        - materialized (int): Number of links replaced.
+
+    Raises:
+
+        - AttributeError
+
+    """
+    if not os.path.isfile(fileLocation):
+        raise AttributeError('File location does not exist({}).'.format(fileLocation))
+    materialized = 0
+    with hdf.File(fileLocation,'r+') as f:
+        groups = [f]
+        while len(groups)>0:
+            group = groups.pop()
+            for name in list(group.keys()):
+                link = group.get(name,getlink=True)
+                if isinstance(link,hdf.ExternalLink):
+                    linkedFile = os.path.join(os.path.dirname(os.path.realpath(fileLocation)),link.filename)
+                    if not os.path.isfile(linkedFile):
+                        raise AttributeError('Linked raw data file {} of {} does not exist.'.format(link.filename,fileLocation))
+                    del group[name]
+                    with hdf.File(linkedFile,'r') as source:
+                        source.copy(link.path,group,name=name)
+                    materialized+=1
+                elif isinstance(link,hdf.HardLink) and isinstance(group[name],hdf.Group):
+                    groups.append(group[name])
+    return materialized
+
+def readConversionFingerprint(f):
+    """Read the fingerprint of the conversion stored in a converted (nxs) file, see DataFile.conversionFingerprint.
+
+    Args:
+
+        - f (string or hdf file): Location or open HDF5 file of converted data file.
+
+    Returns:
+
+        - fingerprint (string): Stored fingerprint or None if the file has none or can not be read.
+
+    """
+    if not isinstance(f,hdf.File):
+        try:
+            with hdf.File(f,'r') as openFile:
+                return readConversionFingerprint(openFile)
+        except (IOError,OSError):
+            return None
+    fingerprint = f.get('entry/reduction/MJOLNIR_algorithm_convert/fingerprint')
+    if fingerprint is None:
+        return None
+    return decodeStr(np.array(fingerprint)[0])
+
+class CalibrationRegistry(object):
+    """Registry of normalization tables shared between all data files of the process. Tables are identified by 
+    instrument, binning and a hash of their content and are handed out as read-only arrays."""
+    def __init__(self):
+        self._tables = {}
+
+    def register(self,instrument,binning,instrumentCalibrationEf,instrumentCalibrationA4,instrumentCalibrationEdges):
+        """Add normalization tables to the registry if not already present.
+
+        Args:
+
+            - instrument (string): Name of instrument.
+
+            - binning (int): Binning of the tables.
+
+            - instrumentCalibrationEf (array): Amplitude, final energy, width and background for each pixel.
+
+            - instrumentCalibrationA4 (array): A4 offset for each pixel.
+
+            - instrumentCalibrationEdges (array): Pixel boundaries.
+
+        Returns:
+
+            - key (tuple): Key of the tables in the registry.
+
+        """
+        tables = [np.asarray(x) for x in [instrumentCalibrationEf,instrumentCalibrationA4,instrumentCalibrationEdges]]
+        contentHash = hashlib.sha1()
+        for table in tables:
+            contentHash.update(str((table.shape,table.dtype.str)).encode())
+            contentHash.update(np.ascontiguousarray(table).tobytes())
+        key = (instrument,int(binning),contentHash.hexdigest())
+        if not key in self._tables:
+            tables = [np.array(x) for x in tables] # Own copy which can not be changed by anyone
+            for table in tables:
+                table.setflags(write=False)
+            self._tables.setdefault(key,tuple(tables)) # Files may be loaded concurrently, the first registration is kept
+        return key
+
+    def get(self,key):
+        """Return the shared tables (instrumentCalibrationEf, instrumentCalibrationA4, instrumentCalibrationEdges) of a key."""
+        return self._tables[key]
+
+    def clear(self):
+        """Remove all tables from the registry."""
+        self._tables = {}
+
+    def __contains__(self,key):
+        return key in self._tables
+
+    def __len__(self):
+        return len(self._tables)
+
+calibrationRegistry = CalibrationRegistry()
+
+def loadCalibration(instr,binning):
+    """Load the normalization tables of a given binning from the instrument group.
+
+    Args:
+
+        - instr (hdf group): Open NXinstrument group holding the calib groups.
+
+        - binning (int): Binning of the normalization table.
+
+    Returns:
+
+        - instrumentCalibrationEf (array): Amplitude, final energy, width and background for each pixel.
+
+        - instrumentCalibrationA4 (array): A4 offset for each pixel.
+
+        - instrumentCalibrationEdges (array): Pixel boundaries.
+
+    """
+    Ef = np.array(instr.get('calib{}/final_energy'.format(str(binning))))
+    width = np.array(instr.get('calib{}/width'.format(str(binning))))
+    bg = np.array(instr.get('calib{}/background'.format(str(binning))))
+    amp = np.array(instr.get('calib{}/amplitude'.format(str(binning))))
+    instrumentCalibrationEf = np.array([amp,Ef,width,bg]).T
+    instrumentCalibrationA4 = np.array(instr.get('calib{}/a4offset'.format(str(binning))))
+    instrumentCalibrationEdges = np.array(instr.get('calib{}/boundaries'.format(str(binning))))
+    return instrumentCalibrationEf,instrumentCalibrationA4,instrumentCalibrationEdges
+
 @_tools.KwargChecker()
 def getScanParameter(f):
     """Extract scan parameter from hdf file.
@@ -698,9 +1740,10 @@ def getScanParameter(f):
         - f (hdf): Open HDF5 file object from which parameters are extracted.
 
     """
-    if f.get('/entry/scanvars') is None:
+    entry = _tools.getNXGroup(f,'NXentry')
+    if entry.get('scanvars') is None:
         return [],[],[]
-    scanParameters = [x.decode() for x in f.get('/entry/scanvars')]
+    scanParameters = [x.decode() for x in entry.get('scanvars')]
     scanValues = []
     scanUnits = []
 
@@ -723,7 +1766,7 @@ def getScanParameter(f):
     
         
 
-    dataGroup = f.get('/entry/data')
+    dataGroup = _tools.getNXGroup(f,'NXdata')
     for d in dataGroup:
         if d in scanParameters:
             SCP = dataGroup[d]
@@ -991,19 +2034,10 @@ def rotationMatrix(alpha,beta,gamma,format='deg'):
 def vectorAngle(V1,V2):
     return np.arccos(np.dot(V1,V2.T)/(np.linalg.norm(V1)*np.linalg.norm(V2)))
 
-def getNX_class(x,y,attribute):
-    try:
-        variableType = y.attrs['NX_class']
-    except:
-        variableType = ''
-    if variableType==attribute:
-        return x
-    
-def getInstrument(file):
-    location = file.visititems(lambda x,y: getNX_class(x,y,b'NXinstrument'))
-    return file.get(location)
-
-def extractData(files):
+def extractData(files,coordinates=True,counts=True):
+    """Extract data fields of a list of data files. If coordinates is false, qx, qy, energy, h, k and l of converted files are 
+    returned as None, e.g. to keep factorized coordinates from being calculated. If counts is false, I, Norm and Monitor are 
+    returned as None, e.g. to keep them from being stacked in memory."""
     if not isinstance(files,list):
         files = [files]
     I = []
@@ -1031,12 +2065,15 @@ def extractData(files):
     scanParamValue = []
     scanParamUnit = []
     for datafile in files:
-        I.append(datafile.I)
-        if(files[0].type!='hdf'):
+        if counts:
+            I.append(datafile.I)
+            Monitor.append(datafile.Monitor)
+            if(files[0].type!='hdf'):
+                Norm.append(datafile.Norm)
+        if(files[0].type!='hdf') and coordinates:
             qx.append(datafile.qx)
             qy.append(datafile.qy)
             energy.append(datafile.energy)
-            Norm.append(datafile.Norm)
             H.append(datafile.h)
             K.append(datafile.k)
             L.append(datafile.l)
@@ -1045,7 +2082,6 @@ def extractData(files):
         scanParamUnit.append(datafile.scanUnits)
             
         
-        Monitor.append(datafile.Monitor)
         if np.array(datafile.A3Off).shape is ():
             datafile.A3Off = 0.0
         a3.append(datafile.A3-datafile.A3Off)
@@ -1059,30 +2095,37 @@ def extractData(files):
         instrumentCalibrationA4.append(datafile.instrumentCalibrationA4)
         instrumentCalibrationEdges.append(datafile.instrumentCalibrationEdges)
         
-    I = np.array(I)
-    if(files[0].type!='hdf'):
-        qx = np.array(qx)
-        qy = np.array(qy)
-        H = np.array(H)
-        K = np.array(K)
-        L = np.array(L)
-        energy = np.array(energy)
+    I = stackArrays(I)
+    if(files[0].type!='hdf' and not coordinates):
+        qx = qy = H = K = L = energy = None
+    elif(files[0].type!='hdf'):
+        qx = stackArrays(qx)
+        qy = stackArrays(qy)
+        H = stackArrays(H)
+        K = stackArrays(K)
+        L = stackArrays(L)
+        energy = stackArrays(energy)
 
     scanParameters = scanParameters
     scanParamValue = scanParamValue
     scanParamUnit = scanParamUnit
 
-    Norm = np.array(Norm)
-    Monitor = np.array(Monitor)
+    if counts and files[0].type!='hdf': # Compact in the files
+        shapes = [np.shape(i) for i in I]
+        Norm = stackToIntensity(Norm,shapes)
+        Monitor = stackToIntensity(Monitor,shapes)
+    else:
+        Norm = stackArrays(Norm)
+        Monitor = stackArrays(Monitor)
+    if not counts:
+        I = Norm = Monitor = None
 
     a3 = np.array(a3)
     a4 = np.array(a4)
 
     a3Off = np.array(a3Off)
     a4Off = np.array(a4Off)
-    instrumentCalibrationEf = np.array(instrumentCalibrationEf)
-    instrumentCalibrationA4 = np.array(instrumentCalibrationA4)
-    instrumentCalibrationEdges = np.array(instrumentCalibrationEdges)
+    # Normalization tables are kept as lists of the shared tables from the calibration registry
     Ei = np.array(Ei)
     if files[0].type!='hdf':
         return I,qx,qy,energy,Norm,Monitor,a3,a3Off,a4,a4Off,instrumentCalibrationEf,\
@@ -1090,6 +2133,39 @@ def extractData(files):
     else:
         return I,Monitor,a3,a3Off,a4,a4Off,instrumentCalibrationEf,\
         instrumentCalibrationA4,instrumentCalibrationEdges,Ei,scanParameters,scanParamValue,scanParamUnit
+
+def stackArrays(arrays):
+    """Stack arrays along a new first axis like np.array. Arrays of equal shape lying back to back in one memory map, as loaded 
+    by DataSet.load, are stacked as a view of the memory map without copying."""
+    first = arrays[0] if len(arrays)>0 else None
+    if isinstance(first,np.memmap) and first.size>0 and first.flags['C_CONTIGUOUS']:
+        address = first.__array_interface__['data'][0]
+        consecutive = [isinstance(array,np.memmap) and array._mmap is first._mmap and array.shape == first.shape and array.dtype == first.dtype 
+                       and array.flags['C_CONTIGUOUS'] and array.__array_interface__['data'][0] == address+i*first.nbytes for i,array in enumerate(arrays)]
+        if np.all(consecutive):
+            return np.lib.stride_tricks.as_strided(first,shape=(len(arrays),)+first.shape,strides=(first.nbytes,)+first.strides,writeable=False)
+    return np.array(arrays)
+
+def stackToIntensity(arrays,shapes):
+    """Stack arrays stored compactly, like monitor and normalization of converted files, as read-only views in the shapes of 
+    the intensities of the files, see stackArrays. If all arrays and all shapes are equal, the compact arrays are stacked and 
+    broadcast, otherwise each array is broadcast to its shape before stacking.
+
+    Args:
+
+        - arrays (list of arrays): Arrays broadcastable to the shapes.
+
+        - shapes (list of tuples): Shapes of the intensities of the files.
+
+    Returns:
+
+        - stacked (array): Stacked arrays in the shape of the stacked intensities.
+
+    """
+    if np.all([shape == shapes[0] for shape in shapes]) and np.all([np.shape(array) == np.shape(arrays[0]) for array in arrays]):
+        return np.broadcast_to(stackArrays(arrays),(len(arrays),)+tuple(shapes[0]))
+    return stackArrays([np.broadcast_to(array,shape) for array,shape in zip(arrays,shapes)])
+
 def rotMatrix(v,theta): # https://en.wikipedia.org/wiki/Rotation_matrix
     v/=np.linalg.norm(v)
     m11 = np.cos(theta)+v[0]**2*(1-np.cos(theta))
@@ -1471,6 +2547,394 @@ def test_DataFile_ScanParameter():
 
 
 
+def test_DataFile_lazy():
+    fileName = 'Data/camea2018n000017.nxs'
+    assertFile(fileName)
+    eager = DataFile(fileName)
+    with DataFile(fileName,lazy=True) as lazyFile:
+        assert(not 'I' in lazyFile.__dict__)
+        assert(not 'instrumentCalibrationEf' in lazyFile.__dict__)
+        assert(lazyFile.scanCommand == eager.scanCommand)
+        assert(np.all(lazyFile.I == eager.I)) # Read on first access
+        assert('I' in lazyFile.__dict__)
+        assert(lazyFile == eager)
+
+    try: # Not loaded before closing
+        lazyFile.qx
+        assert False
+    except AttributeError:
+        assert True
+
+    rawFile = DataFile('Data/camea2018n000017.hdf',lazy=True)
+    assert(np.all(rawFile.I==DataFile('Data/camea2018n000017.hdf').I))
+    converted = rawFile.convert(binning=8) # Copy does not depend on open file
+    rawFile.close()
+    assert(np.all(converted.instrumentCalibrationEdges==rawFile.instrumentCalibrationEdges))
+
+def test_DataFile_readMetaData():
+    for fileName in ['Data/camea2018n000017.hdf','Data/camea2018n000017.nxs']:
+        assertFile(fileName)
+        meta = readMetaData(fileName)
+        df = DataFile(fileName)
+        assert(meta['name'] == df.name)
+        assert(meta['instrument'] == df.instrument)
+        assert(meta['scanCommand'] == df.scanCommand[0].decode())
+        assert(meta['title'] == df.title[0].decode())
+        assert(np.all(meta['Ei'] == df.Ei))
+        assert(np.all(meta['possibleBinnings'] == df.possibleBinnings))
+        assert(np.all(meta['scanParameters'] == df.scanParameters))
+        assert(np.all(meta['scanUnits'] == df.scanUnits))
+
+    assert(readMetaData('Data/camea2018n000017.nxs')['binning'] == 8)
+
+    try:
+        readMetaData('/nope.txt')
+        assert False
+    except AttributeError:
+        assert True
+
+def test_DataFile_NXClassPaths():
+    with hdf.File('Data/camea2018n000017.hdf','r') as f:
+        paths = _tools.calculateNXClassPaths(f)
+        assert(paths['NXinstrument'] == ['/entry/CAMEA'])
+        assert(paths['NXmonitor'] == ['/entry/control','/entry/proton_beam'])
+        fingerprint = _tools.NXLayoutFingerprint(f)
+        assert(_tools.getNXClassPaths(f) == paths)
+        assert(_tools._NXClassPathCache[fingerprint] == paths)
+        assert(_tools.getInstrument(f).name == '/entry/CAMEA')
+        assert(_tools.getNXGroup(f,'NXsample').name == '/entry/sample')
+        assert(_tools.getNXGroup(f,'NXnotPresent') is None)
+
+        calculateFingerprint = _tools.NXLayoutFingerprint
+        try: # Later lookups in the open file use its cached map
+            _tools.NXLayoutFingerprint = None
+            assert(_tools.getNXGroup(f,'NXsample').name == '/entry/sample')
+        finally:
+            _tools.NXLayoutFingerprint = calculateFingerprint
+
+        stale = {'NXinstrument':['/entry/WRONG']}
+        _tools._NXClassPathCache[fingerprint] = _tools._NXOpenFileCache[f.id.fileno] = stale # Stale cache is detected and recalculated
+        assert(_tools.getInstrument(f).name == '/entry/CAMEA')
+        assert(_tools.getNXClassPaths(f) == paths and _tools._NXClassPathCache[fingerprint] == paths)
+
+def test_DataFile_CalibrationRegistry():
+    df1 = DataFile('Data/camea2018n000136.hdf')
+    df2 = DataFile('Data/camea2018n000137.hdf')
+    for binning in [1,8,3]:
+        df1.loadBinning(binning)
+        df2.loadBinning(binning)
+        assert(df1.binning == binning)
+        assert(df1.instrumentCalibrationEf is df2.instrumentCalibrationEf) # Same table shared between files
+        assert(df1.instrumentCalibrationEdges is df2.instrumentCalibrationEdges)
+        assert(len(df1.instrumentCalibrationA4) == 104*8*binning)
+
+    Ef,A4,Edges = calibrationRegistry.get(df1._calibrationKeys[3])
+    try: # Shared tables are read-only
+        Ef[0,0] = 0.0
+        assert False
+    except ValueError:
+        assert True
+
+    with hdf.File('Data/camea2018n000136.hdf','r') as f:
+        reference = loadCalibration(_tools.getInstrument(f),3)
+    assert(np.all(reference[0]==Ef))
+
+    df1.fileLocation = '/nope.hdf' # Switching binning does not touch the file
+    df1.loadBinning(1)
+    df2.loadBinning(1)
+    assert(df1.instrumentCalibrationEdges is df2.instrumentCalibrationEdges)
+
+    import pickle
+    df3 = pickle.loads(pickle.dumps(df2))
+    assert(df3.instrumentCalibrationEf is df2.instrumentCalibrationEf)
+
+def test_DataFile_convertMultipleBinnings():
+    df = DataFile('Data/camea2018n000017.hdf')
+    convertedFiles = df.convert(binning=[8,1,3])
+    assert(df.binning == 3)
+    for binning,converted in zip([8,1,3],convertedFiles):
+        single = DataFile('Data/camea2018n000017.hdf').convert(binning=binning)
+        assert(converted.binning == binning)
+        for key in ['I','qx','qy','energy','h','k','l','Norm','Monitor']:
+            assert(np.all(np.isclose(getattr(converted,key),getattr(single,key),equal_nan=True)))
+
+def test_DataFile_compactMonitorNormalization():
+    import tempfile, shutil
+    converted = DataFile('Data/camea2018n000017.hdf').convert(binning=8)
+    steps,detectors,pixels = converted.I.shape
+    assert(converted.Monitor.shape == (steps,1,1))
+    assert(converted.Norm.shape == (1,detectors,pixels))
+    folder = tempfile.mkdtemp()
+    try:
+        fileName = os.path.join(folder,'compact.nxs')
+        converted.saveNXsqom(fileName)
+        with hdf.File(fileName,'r') as f: # Full size fields are kept for earlier versions
+            assert(f['entry/data'].attrs['MJOLNIR_format_version'] == NXsqomFormatVersion)
+            assert(f['entry/data/monitor'].shape == (steps,detectors,pixels))
+            assert(f['entry/data/normalization'].shape == (steps,detectors,pixels))
+            assert(f['entry/data/monitor_compact'].shape == (steps,1,1))
+            assert(f['entry/data/normalization_compact'].shape == (1,detectors,pixels))
+            masked = np.broadcast_to(converted.maskBitmap(),(steps,detectors,pixels)) # Masked monitor is written as zero
+            assert(np.all(f['entry/data/monitor'][()] == np.where(masked,0,np.broadcast_to(converted.Monitor,masked.shape))))
+        loaded = DataFile(fileName)
+        assert(loaded.Monitor.shape == (steps,1,1) and loaded.Norm.shape == (1,detectors,pixels))
+        assert(np.all(np.isclose(loaded.Norm*loaded.Monitor,converted.Norm*converted.Monitor,equal_nan=True)))
+
+        with hdf.File(fileName,'r+') as f: # Files of format version 1 hold full size fields only
+            del f['entry/data/monitor_compact'], f['entry/data/normalization_compact'], f['entry/data'].attrs['MJOLNIR_format_version']
+        loaded = DataFile(fileName)
+        assert(loaded.Monitor.shape == (steps,detectors,pixels))
+        assert(np.all(np.isclose(loaded.Norm,np.broadcast_to(converted.Norm,loaded.Norm.shape),equal_nan=True)))
+    finally:
+        shutil.rmtree(folder)
+
+def test_DataFile_integratePixelRanges():
+    data = np.random.randint(0,100,size=(4,3,50)).astype(np.int32)
+    edges = np.array([[[0,10],[10,50],[5,5]],[[-10,-2],[40,70],[30,20]],[[0,0],[2,3],[49,50]]])
+    looped = _tools.integratePixelRanges(data,edges,method='loop')
+    assert(looped.shape == (4,3,3))
+    assert(np.all(looped[:,1,0] == data[:,1,-10:-2].sum(axis=1)))
+    for method in ['cumsum','reduceat']:
+        assert(np.all(looped == _tools.integratePixelRanges(data,edges,method=method)))
+
+    try:
+        _tools.integratePixelRanges(data,edges,method='wrong')
+        assert False
+    except AttributeError:
+        assert True
+
+    try:
+        _tools.integratePixelRanges(data,edges[:2])
+        assert False
+    except AttributeError:
+        assert True
+
+    df = DataFile('Data/camea2018n000017.hdf')
+    for binning in [1,8]:
+        looped = df.convert(binning,integrationMethod='loop').I
+        assert(np.all(looped == df.convert(binning).I))
+        assert(np.all(looped == df.convert(binning,integrationMethod='cumsum').I))
+
+def test_DataFile_saveNXsqomOptions():
+    import tempfile, shutil
+    converted = DataFile('Data/camea2018n000017.hdf').convert(binning=8)
+    shape = converted.I.shape
+    folder = tempfile.mkdtemp()
+    try:
+        default = os.path.join(folder,'default.nxs')
+        converted.saveNXsqom(default)
+        with hdf.File(default,'r') as f:
+            assert(f['entry/data/intensity'].chunks == (1,)+shape[1:])
+            assert(f['entry/data/qx'].compression is None)
+            assert(f['entry/data/qx'].dtype == np.float32)
+
+        compressed = os.path.join(folder,'compressed.nxs')
+        converted.saveNXsqom(compressed,chunks=2,compression='gzip',compressionLevel=6,shuffle=True,precision={'qx':'float64','I':'int64'})
+        with hdf.File(compressed,'r') as f:
+            assert(f['entry/data/en'].chunks == (2,)+shape[1:])
+            assert(f['entry/data/en'].compression == 'gzip' and f['entry/data/en'].shuffle)
+            assert(f['entry/data/qx'].dtype == np.float64 and f['entry/data/intensity'].dtype == np.int64)
+
+        contiguous = os.path.join(folder,'contiguous.nxs')
+        converted.saveNXsqom(contiguous,chunks=None)
+        with hdf.File(contiguous,'r') as f:
+            assert(f['entry/data/h'].chunks is None)
+
+        for fileName in [compressed,contiguous]:
+            loaded = DataFile(fileName)
+            reference = DataFile(default)
+            for key in ['I','qx','qy','energy','h','k','l','Norm','Monitor']:
+                assert(np.all(np.isclose(getattr(loaded,key),getattr(reference,key),equal_nan=True)))
+
+        for kwargs in [{'compression':'bzip2'},{'compression':'lzf','compressionLevel':3},{'chunks':None,'shuffle':True},
+                       {'chunks':(1,2)},{'chunks':0},{'precision':{'intensity':'int16'}}]:
+            try:
+                converted.saveNXsqom(os.path.join(folder,'wrong.nxs'),**kwargs)
+                assert False
+            except AttributeError:
+                assert True
+    finally:
+        shutil.rmtree(folder)
+
+def test_DataFile_saveNXsqomLinked():
+    import tempfile, shutil
+    folder = tempfile.mkdtemp()
+    try:
+        rawFile = os.path.join(folder,'camea2018n000017.hdf')
+        shutil.copy('Data/camea2018n000017.hdf',rawFile)
+        converted = DataFile(rawFile).convert(binning=8)
+        copied = os.path.join(folder,'copied.nxs')
+        linked = os.path.join(folder,'linked.nxs')
+        converted.saveNXsqom(copied)
+        converted.saveNXsqom(linked,link=True)
+        assert(os.path.getsize(linked)<os.path.getsize(copied))
+        with hdf.File(linked,'r') as f:
+            assert(isinstance(f['entry'].get('CAMEA',getlink=True),hdf.ExternalLink))
+            assert(isinstance(f['entry/data'].get('counts',getlink=True),hdf.ExternalLink))
+            assert(isinstance(f['entry/data'].get('qx',getlink=True),hdf.HardLink))
+
+        reference = DataFile(copied)
+        loaded = DataFile(linked)
+        assert(loaded == reference)
+        assert(np.all(loaded.instrumentCalibrationEf == reference.instrumentCalibrationEf))
+        assert(np.all(readMetaData(linked)['A4'] == readMetaData(copied)['A4']))
+
+        assert(materializeNXsqom(linked)>0)
+        assert(materializeNXsqom(linked)==0)
+        os.remove(rawFile)
+        loaded = DataFile(linked)
+        assert(loaded == reference)
+        with hdf.File(linked,'r') as f, hdf.File(copied,'r') as g:
+            assert(np.all(np.array(f['entry/data/counts']) == np.array(g['entry/data/counts'])))
+    finally:
+        shutil.rmtree(folder)
+
+def test_DataFile_ScanFollower():
+    import tempfile, shutil
+    folder = tempfile.mkdtemp()
+    try:
+        rawFile = os.path.join(folder,'camea2018n000136.hdf')
+        saveFile = os.path.join(folder,'camea2018n000136.nxs')
+        shutil.copy('Data/camea2018n000136.hdf',rawFile)
+        fullSteps = {}
+        def growTo(steps): # Mimic the instrument writing a scan step by step
+            with hdf.File(rawFile,'r+') as f:
+                def resize(name,obj):
+                    if isinstance(obj,hdf.Dataset) and obj.maxshape[0] is None and (name in fullSteps or obj.shape[0] == 121):
+                        if not name in fullSteps:
+                            fullSteps[name] = np.array(obj)
+                        obj.resize(steps,axis=0)
+                        obj[:] = fullSteps[name][:steps]
+                f.visititems(resize)
+        growTo(5)
+        follower = ScanFollower(rawFile,binning=8,saveLocation=saveFile,swmr=False)
+        assert(follower.steps == 5 and follower.dataFile.I.shape[0] == 5)
+        assert(follower.update() == 0)
+        growTo(6)
+        assert(follower.update() == 1)
+        I = follower.dataFile.I
+        growTo(7)
+        assert(follower.update() == 1)
+        assert(np.shares_memory(I,follower.dataFile.I)) # Appended in place to the buffer grown geometrically
+        growTo(121)
+        updates = []
+        converted = follower.follow(interval=0.0,timeout=0.0,callback=lambda follower,newSteps: updates.append(newSteps))
+        assert(updates == [114] and follower.steps == 121)
+
+        reference = DataFile(rawFile).convert(binning=8)
+        saved = DataFile(saveFile)
+        for key in ['I','qx','qy','energy','h','k','l','Norm','Monitor']:
+            assert(np.all(np.isclose(getattr(converted,key),getattr(reference,key),atol=1e-6,equal_nan=True)))
+            assert(np.all(np.isclose(getattr(saved,key),getattr(reference,key),atol=1e-6,equal_nan=True)))
+        assert(np.all(converted.temperature == reference.temperature))
+        assert(saved.Monitor.shape == (121,1,1)) # Compact monitor is appended as well
+
+        with ScanFollower(rawFile,binning=1) as follower: # SWMR reading of complete file
+            assert(follower.steps == 121 and follower.update() == 0)
+            if follower.swmr: # Only datasets read are refreshed
+                names = [dataset.name for dataset in follower._datasets]
+                assert('/entry/control/data' in names and '/entry/CAMEA/detector/counts' in names)
+                assert(not '/entry/CAMEA/calib8/final_energy' in names)
+            assert(np.all(follower.dataFile.I == DataFile(rawFile).convert(binning=1).I))
+    finally:
+        shutil.rmtree(folder)
+
+def test_DataFile_factorizedCoordinates():
+    import tempfile, shutil
+    df = DataFile('Data/camea2018n000136.hdf')
+    reference = df.convert(binning=8)
+    converted = df.convert(binning=8,factorized=True)
+    assert(converted.isFactorized() and not reference.isFactorized())
+    assert(converted._coordinates.shape == reference.qx.shape)
+    assert(converted._coordinates.nbytes < reference.qx.nbytes)
+
+    chunks = list(converted.iterateFlat(stepsPerChunk=7))
+    assert(len(chunks) == 18 and converted.isFactorized())
+    for key in ['I','Monitor','Norm']+FactorizedCoordinates.fields:
+        flat = np.concatenate([chunk[key] for chunk in chunks])
+        assert(np.all(np.isclose(flat,np.broadcast_to(getattr(reference,key),reference.I.shape).flatten(),equal_nan=True)))
+
+    folder = tempfile.mkdtemp()
+    try:
+        converted.saveNXsqom(os.path.join(folder,'factorized.nxs'),chunks=10) # Written chunkwise
+        assert(converted.isFactorized())
+        reference.saveNXsqom(os.path.join(folder,'reference.nxs'))
+        loaded = DataFile(os.path.join(folder,'factorized.nxs'))
+        for key in FactorizedCoordinates.fields:
+            assert(np.all(np.isclose(getattr(loaded,key),getattr(DataFile(os.path.join(folder,'reference.nxs')),key))))
+    finally:
+        shutil.rmtree(folder)
+
+    converted.materialize()
+    assert(not converted.isFactorized())
+    for key in FactorizedCoordinates.fields:
+        assert(np.all(np.isclose(getattr(converted,key),getattr(reference,key))))
+
+def test_DataFile_subset():
+    full = DataFile('Data/camea2018n000136.hdf')
+    steps = slice(0,91)
+    detectors = list(range(39,78))+[100] # Wedges 3 to 5 and a single detector
+    df = DataFile('Data/camea2018n000136.hdf',steps=steps,detectors=detectors)
+    assert(df.I.shape == (91,40,full.I.shape[2]))
+    assert(np.all(df.I == full.I[steps][:,detectors]))
+    assert(np.all(df.Monitor == full.Monitor[steps]))
+    assert(np.all(df.A3 == full.A3[steps]))
+    assert(df.scanValues.shape[1] == 91)
+
+    converted = df.convert(binning=8)
+    reference = full.convert(binning=8)
+    for key in ['I','qx','qy','energy','h','k','l']:
+        assert(np.all(np.isclose(getattr(converted,key),getattr(reference,key)[steps][:,detectors],equal_nan=True)))
+    assert(np.all(np.isclose(converted.Norm,reference.Norm[:,detectors])))
+    assert(not df.conversionFingerprint(8) == full.conversionFingerprint(8))
+    try: # Subset cannot be saved
+        converted.saveNXsqom('Data/subset.nxs')
+        assert False
+    except AttributeError:
+        assert True
+
+    fileName = 'Data/camea2018n000017.nxs'
+    assertFile(fileName)
+    fullNXs = DataFile(fileName)
+    with DataFile(fileName,lazy=True,fields=['I','qx','qy','en'],steps=[0,2],detectors=5) as nxs:
+        assert(nxs.Norm is None and nxs.h is None)
+        assert(np.all(nxs.I == fullNXs.I[[0,2]][:,[5]]))
+        assert(np.all(nxs.energy == fullNXs.energy[[0,2]][:,[5]]))
+
+    for kwargs in [{'fields':['notAField']},{'steps':[1000]},{'detectors':slice(200,300)}]:
+        try:
+            DataFile(fileName,**kwargs)
+            assert False
+        except AttributeError:
+            assert True
+
+def test_DataFile_precision():
+    df = DataFile('Data/camea2018n000136.hdf')
+    reference = df.convert(binning=8)
+    converted = df.convert(binning=8,precision='float32')
+    factorized = df.convert(binning=8,precision='float32',factorized=True)
+    for key in ['qx','qy','energy','h','k','l','Norm']:
+        assert(getattr(converted,key).dtype == np.float32)
+        assert(getattr(factorized,key).dtype == np.float32)
+        assert(np.all(np.isclose(getattr(converted,key),getattr(reference,key),rtol=1e-5,atol=1e-5,equal_nan=True)))
+    assert(converted.I.dtype == reference.I.dtype)
+
+    try:
+        _tools.setComputePrecision('float32') # Global precision is used if none is given
+        converted = df.convert(binning=8)
+        assert(converted.energy.dtype == np.float32 and converted.Norm.dtype == np.float32)
+        assert(DataFile('Data/camea2018n000017.nxs',precision='float64').qx.dtype == np.float64)
+    finally:
+        _tools.setComputePrecision(None)
+    default = df.convert(binning=8) # Types are unchanged without a precision
+    assert(default.qx.dtype == np.float32 and default.energy.dtype == np.float64 and default.Norm.dtype == np.float64)
+
+    try:
+        _tools.setComputePrecision('int32')
+        assert False
+    except AttributeError:
+        assert True
+
 def assertFile(file):
     """Make sure that file exists for methods to work"""
     if not os.path.isfile(file):
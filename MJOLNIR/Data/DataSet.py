@@ -27,7 +27,16 @@ import matplotlib.ticker as ticker
 
 import datetime
 import warnings
-from MJOLNIR.Data import DataFile,Viewer3D
+import multiprocessing
+import threading
+try:
+    import queue
+except ImportError: # Python 2
+    import Queue as queue
+import collections
+import itertools
+import json
+from MJOLNIR.Data import DataFile,Viewer3D,Mask
 from MJOLNIR import _tools
 
 import time
@@ -37,7 +46,7 @@ import pytest
 
 class DataSet(object):
     @_tools.KwargChecker(include=['Author']) # Not used as excess kwargs are input as settings
-    def __init__(self, dataFiles=None, normalizationfiles=None, calibrationfiles=None, convertedFiles=None, **kwargs):
+    def __init__(self, dataFiles=None, normalizationfiles=None, calibrationfiles=None, convertedFiles=None, loadOptions=None, precision=None, prefetch=0, memoryBudget=None, **kwargs):
         """DataSet object to hold all informations about data.
         
         Kwargs:
@@ -50,6 +59,21 @@ class DataSet(object):
 
             - convertedFiles (string, DataFile or list of strings): Location of converted data files (default None).
 
+            - loadOptions (dict): Selection of fields, steps and detectors (fields, steps and detectors) passed on to DataFile when loading 
+              data files given by location, e.g. {'fields':['I','qx','qy','energy'],'steps':slice(0,91)} (default None).
+
+            - precision (string): Floating point type of coordinates and normalization of the DataSet and of files converted by it, 
+              'float32' or 'float64'. Histograms in cuts and binning accumulate in float64 (default None, i.e. the global compute 
+              precision, see _tools.setComputePrecision).
+
+            - prefetch (int): Number of files read ahead on a thread pool while loading data files given by location, e.g. 4. If 0, 
+              files are read one by one. Time spent reading and processing files is kept in loadTiming, see timingReport (default 0).
+
+            - memoryBudget (int): Memory in bytes for out-of-core operation. If given, intensity, normalization, monitor and 
+              coordinates of the files are not stacked in memory by the DataSet, and binData3D, cut1D, cutQE, cutPowder and cut1DE 
+              (and their plotting wrappers) stream over the files in chunks of scan steps fitting the budget, summing the histograms 
+              of each chunk (default None, i.e. all points are held in memory).
+
         Raises:
 
             - ValueError
@@ -62,6 +86,12 @@ class DataSet(object):
         self._normalizationfiles = []
         self._convertedFiles = []
         self._calibrationfiles = []
+        self._loadOptions = loadOptions
+        self.masks = []
+        self._prefetch = prefetch
+        self.loadTiming = {'files':0,'io':0.0,'wait':0.0,'compute':0.0}
+        self.precision = None if precision is None else _tools.computeDtype(precision).name
+        self.memoryBudget = memoryBudget
 
 
         if dataFiles is not None:
@@ -102,7 +132,7 @@ class DataSet(object):
     @dataFiles.setter
     def dataFiles(self,dataFiles):
         try:
-            correctDataFiles = isListOfDataFiles(dataFiles)
+            correctDataFiles = self._loadDataFiles(dataFiles)
             [self._dataFiles.append(file) for file in correctDataFiles if file.type=='hdf']
             [self._convertedFiles.append(file) for file in correctDataFiles if file.type=='nxs']
         except Exception as e:
@@ -136,7 +166,7 @@ class DataSet(object):
     @convertedFiles.setter
     def convertedFiles(self,convertedFiles):
         try:
-            correctDataFiles = isListOfDataFiles(convertedFiles)
+            correctDataFiles = self._loadDataFiles(convertedFiles)
             [self._dataFiles.append(file) for file in correctDataFiles if file.type=='hdf']
             [self._convertedFiles.append(file) for file in correctDataFiles if file.type=='nxs']
         except Exception as e:
@@ -171,15 +201,79 @@ class DataSet(object):
     def settings(self,*args,**kwargs):
         raise NotImplementedError('Settings cannot be overwritten.')    
 
+    def _loadDataFiles(self,files):
+        """Load data files given by location with the load options of the DataSet, reading ahead on a thread pool."""
+        timing = self.__dict__.get('loadTiming')
+        if timing is None:
+            timing = self.loadTiming = {'files':0,'io':0.0,'wait':0.0,'compute':0.0}
+        start = time.time()
+        waited = timing['wait']
+        dataFiles = isListOfDataFiles(files,loadOptions=self.__dict__.get('_loadOptions'),prefetch=self.__dict__.get('_prefetch',0),timing=timing)
+        timing['compute'] += time.time()-start-(timing['wait']-waited) # Time not spent waiting for files, e.g. comparing samples
+        return dataFiles
+
+    def timingReport(self):
+        """Report of the time spent loading the data files of the DataSet.
+
+        Returns:
+
+            - report (string): Number of files loaded, time spent reading them (summed over all reading threads), time spent waiting 
+              for files to be read and time spent processing them, i.e. extracting data in _getData.
+
+        """
+        timing = self.__dict__.get('loadTiming',{})
+        return 'Loaded {} file(s): I/O {:.3f} s (waited {:.3f} s), compute {:.3f} s'.format(timing.get('files',0),timing.get('io',0.0),
+                                                                                       timing.get('wait',0.0),timing.get('compute',0.0))
+
     def save(self, filename):
-        try:                                # Opening the given file with an error catch
-            fileObject = open(filename, 'wb')
-        except IOError as e:                        # Catch all IO-errors
-            print("Error in opening file:\n{}".format(e))
-        else:
-            pickle.dump(self, fileObject)
-            fileObject.close()  
+        """Save the DataSet as a single HDF5 container. Intensity, monitor, normalization and coordinates of all files are 
+        written as flat, contiguous arrays (factorized coordinates are calculated in chunks of scan steps), while metadata, 
+        samples, masks and normalization tables of each file are written next to them. Tables shared between files are 
+        written once. The container is read with load, which memory maps the flat arrays. It is written to a temporary file 
+        which then replaces filename, so DataSets still memory mapping an earlier container at filename are not overwritten.
 
+        Args:
+
+            - filename (string): Location of the container.
+
+        """
+        temporary = filename+'.tmp'
+        try:
+            with hdf.File(temporary,'w') as f:
+                f.attrs['format'] = 'MJOLNIR DataSet'
+                f.attrs['version'] = 1
+                written = {}
+                _writeState(f,dict([(key,self.__dict__.get(key)) for key in ['precision','memoryBudget','_settings','masks','_prefetch','_normalizationfiles','_calibrationfiles']]),written)
+                for group,files in [('dataFiles',self.dataFiles),('convertedFiles',self.convertedFiles)]:
+                    _writeDataFiles(f.create_group(group),files,written)
+            if hasattr(os,'replace'):
+                os.replace(temporary,filename)
+            else: # Python 2 has no os.replace and os.rename does not overwrite on Windows
+                if os.path.exists(filename):
+                    os.remove(filename)
+                os.rename(temporary,filename)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+
+    def __getattr__(self,key):
+        # Factorized coordinates of converted files are only calculated when first accessed, and out-of-core DataSets stack 
+        # intensity, normalization, monitor and coordinates on each access only
+        convertedFiles = self.__dict__.get('_convertedFiles') or []
+        files = convertedFiles if len(convertedFiles)>0 else self.__dict__.get('_dataFiles') or []
+        if len(files)>0 and (key in ['I','Monitor'] or (key in DataFile.FactorizedCoordinates.fields+['Norm'] and len(convertedFiles)>0)):
+            arrays = [getattr(datafile,key) for datafile in files]
+            if not key in ['I','Monitor']:
+                arrays = [_tools.castPrecision(array,self.__dict__.get('precision')) for array in arrays]
+            if key in ['Monitor','Norm'] and len(convertedFiles)>0: # Compact in the files, read-only views in the shape of the intensity
+                value = DataFile.stackToIntensity(arrays,[datafile.I.shape for datafile in files])
+            else:
+                value = DataFile.stackArrays(arrays)
+            if self.__dict__.get('memoryBudget') is None:
+                self.__dict__[key] = value
+            return value
+        raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__,key))
 
     def __eq__(self, other): 
         print(self.__dict__.keys())
@@ -198,7 +292,7 @@ class DataSet(object):
         return string
 
     @_tools.KwargChecker()
-    def convertDataFile(self,dataFiles=None,binning=8,saveLocation=None,saveFile=True):
+    def convertDataFile(self,dataFiles=None,binning=8,saveLocation=None,saveFile=True,workers=1,force=False,saveOptions=None,factorized=False,precision=None):
         """Conversion method for converting scan file(s) to hkl file. Converts the given hdf file into NXsqom format and saves in a file with same name, but of type .nxs.
         Copies all of the old data file into the new to ensure complete reduncency. Determins the binning wanted from the file name of normalization file.
 
@@ -206,12 +300,31 @@ class DataSet(object):
 
             - dataFiles (DataFile, string or list of): File path(s), file must be of hdf format (default self.dataFiles).
 
-            - binning (int): Binning to be used when converting files (default 8).
+            - binning (int or list of ints): Binning to be used when converting files. If a list is given, each file is converted into all binnings in one pass and saved with the suffix '_binning#' (default 8).
 
             - saveLocation (string): File path to save location of data file(s) (defaults to same as raw file).
 
             - saveFile (bool): If true, the file(s) will be saved as nxs-files. Otherwise they will only persis in memory.
 
+            - workers (int): Number of processes converting and saving files concurrently. Converted files keep the order of the data files and 
+              errors are collected per file and raised together after all other files have been converted. If any file fails, the converted 
+              files of the DataSet are left unchanged, while files converted successfully are still saved and reused by a new conversion (default 1).
+
+            - force (bool): If false, an existing nxs-file whose conversion fingerprint matches the raw file, normalization table, binning, 
+              sample orientation and MJOLNIR version is loaded instead of converting again. If true, files are always converted (default False). 
+              Existing files are never reused for factorized conversions.
+
+            - saveOptions (dict): Storage options (chunks, compression, compressionLevel, shuffle and precision) passed on to DataFile.saveNXsqom (default None).
+
+            - factorized (bool): If true, Q and energy coordinates of converted files are kept factorized and calculated on demand, 
+              see DataFile.convert. Binning of the DataSet then calculates them in chunks of scan steps (default False).
+
+            - precision (string): Floating point type of converted coordinates and normalization, 'float32' or 'float64' (default precision of the DataSet).
+
+        Returns:
+
+            - convertedFiles (list): Only if a list of binnings is given, list of converted files for each binning. The DataSet holds the files of the first binning.
+
         Raises:
 
             - IOError
@@ -230,48 +343,399 @@ class DataSet(object):
 
         
         dataFiles = self.dataFiles
-        convertedFiles = []
+        if precision is None:
+            precision = self.__dict__.get('precision')
+        multipleBinnings = isinstance(binning,(list,tuple,np.ndarray))
+        if multipleBinnings:
+            binnings = list(binning)
+        else:
+            binnings = [binning]
+        tasks = []
         for rawfile in dataFiles:
-            convFile = rawfile.convert(binning)
-
+            saveLocations = [None]*len(binnings)
             if saveFile:
-                if not saveLocation is None:
-                    if not os.path.isabs(saveLocation): # if full path is given
-                        saveloc = saveLocation
-                        if not saveLocation.split('.')[-1] == 'nxs':
-                            if saveLocation[-1]!='/':
-                                saveLocation+='/'
-                            saveloc = saveLocation+rawfile.fileLocation.replace('.hdf','.nxs').split('/')[-1]
-                        else:
-                            saveloc = saveLocation
-                    else:
-                        if not saveLocation.split('.')[-1] == 'nxs':
-                            if saveLocation[-1]!='/':
-                                saveLocation+='/'
-                            saveloc = saveLocation+rawfile.fileLocation.replace('.hdf','.nxs').split('/')[-1]
-                        else:
-                            saveloc = saveLocation
+                saveloc = self._saveLocation(rawfile,saveLocation)
+                if multipleBinnings:
+                    saveLocations = [os.path.splitext(saveloc)[0]+'_binning{}.nxs'.format(b) for b in binnings]
                 else:
-                    saveloc = rawfile.fileLocation.replace('.hdf','.nxs')
-                
-                convFile.saveNXsqom(saveloc)
-            
-            #file.close()
-            
-            convertedFiles.append(convFile)
-        self.convertedFiles = convertedFiles    
-        self._getData()
+                    saveLocations = [saveloc]
+            tasks.append((rawfile,binnings,saveLocations,force,saveOptions,factorized,precision))
+
+        if workers>1:
+            pool = multiprocessing.Pool(processes=workers)
+            try:
+                results = pool.map(_convertWorker,tasks,chunksize=1) # Results are returned in order of tasks
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_convertWorker(task) for task in tasks]
+
+        errors = []
+        converted = []
+        for task,(convFiles,error) in zip(tasks,results):
+            if not error is None:
+                errors.append(error)
+                continue
+            rawfile = task[0]
+            if workers>1:
+                rawfile.loadBinning(binnings[-1]) # Same state of raw file as after serial conversion
+            for convFile in convFiles:
+                convFile.original_file = rawfile
+            converted.append(convFiles)
+        if len(errors)>0:
+            raise AttributeError('Conversion failed for {} of {} file(s):\n{}'.format(len(errors),len(tasks),'\n'.join(errors)))
+
+        convertedFiles = [[convFiles[binningId] for convFiles in converted] for binningId in range(len(binnings))]
+        if len(converted)>0:
+            self.convertedFiles = convertedFiles[0]
+            self._getData()
+        if multipleBinnings:
+            return convertedFiles
+
+    def _saveLocation(self,rawfile,saveLocation):
+        """Find the location of the nxs-file of a converted raw file."""
+        if not saveLocation is None:
+            if not os.path.isabs(saveLocation): # if full path is given
+                saveloc = saveLocation
+                if not saveLocation.split('.')[-1] == 'nxs':
+                    if saveLocation[-1]!='/':
+                        saveLocation+='/'
+                    saveloc = saveLocation+rawfile.fileLocation.replace('.hdf','.nxs').split('/')[-1]
+                else:
+                    saveloc = saveLocation
+            else:
+                if not saveLocation.split('.')[-1] == 'nxs':
+                    if saveLocation[-1]!='/':
+                        saveLocation+='/'
+                    saveloc = saveLocation+rawfile.fileLocation.replace('.hdf','.nxs').split('/')[-1]
+                else:
+                    saveloc = saveLocation
+        else:
+            saveloc = rawfile.fileLocation.replace('.hdf','.nxs')
+        return saveloc
             
     def _getData(self): # Internal method to populate I,qx,qy,energy,Norm and Monitor
-        
+        start = time.time()
+        self._pointTable = None # Rebuilt from the files on first use
+        outOfCore = not self.__dict__.get('memoryBudget') is None
         if len(self.convertedFiles)!=0:
+            factorized = np.any([datafile.isFactorized() for datafile in self.convertedFiles])
             self.I,self.qx,self.qy,self.energy,self.Norm,self.Monitor,self.a3,self.a3Off,self.a4,self.a4Off,self.instrumentCalibrationEf, \
             self.instrumentCalibrationA4,self.instrumentCalibrationEdges,self.Ei,self.scanParameters,\
-            self.scanParameterValues,self.scanParameterUnits,self.h,self.k,self.l = DataFile.extractData(self.convertedFiles)
+            self.scanParameterValues,self.scanParameterUnits,self.h,self.k,self.l = DataFile.extractData(self.convertedFiles,coordinates=not (factorized or outOfCore),counts=not outOfCore)
+            if factorized or outOfCore: # Calculated or stacked when accessed
+                for key in DataFile.FactorizedCoordinates.fields+(['I'] if outOfCore else []):
+                    del self.__dict__[key]
+            for key in ['Norm','Monitor']: # Broadcast after casting the compact arrays of the files when accessed
+                self.__dict__.pop(key,None)
+            for key in ['qx','qy','energy','h','k','l']:
+                if key in self.__dict__:
+                    self.__dict__[key] = _tools.castPrecision(self.__dict__[key],self.__dict__.get('precision'))
         else:
             self.I,self.Monitor,self.a3,self.a3Off,self.a4,self.a4Off,self.instrumentCalibrationEf, \
             self.instrumentCalibrationA4,self.instrumentCalibrationEdges,self.Ei,self.scanParameters,\
-            self.scanParameterValues,self.scanParameterUnits = DataFile.extractData(self.dataFiles)
+            self.scanParameterValues,self.scanParameterUnits = DataFile.extractData(self.dataFiles,counts=not outOfCore)
+            if outOfCore:
+                del self.__dict__['I'], self.__dict__['Monitor']
+        if 'loadTiming' in self.__dict__:
+            self.loadTiming['compute'] += time.time()-start
+
+    @_tools.KwargChecker()
+    def view(self,files=None,steps=None,condition=None):
+        """View of some of the converted files and scan steps of the DataSet sharing its point table, see DataSetView. Cut, 
+        binning and plot methods of the view only use the selected points, e.g.
+
+        >>> cold = ds.view(condition=lambda datafile: np.isclose(np.mean(datafile.temperature),1.5,atol=0.1))
+        >>> middle = ds.view(steps=slice(20,81))
+
+        Kwargs:
+
+            - files (list of ints, DataFiles or strings): Indices, DataFiles or locations of converted files of the DataSet to be 
+              kept (default None, i.e. all files).
+
+            - steps (slice or list of ints): Scan steps of each file to be kept (default None, i.e. all steps).
+
+            - condition (function): Function of a DataFile returning True for files to be kept, e.g. selecting on temperature, 
+              magnetic field or Ei (default None).
+
+        Returns:
+
+            - view (DataSetView): View of the selected files and steps.
+
+        Raises:
+
+            - AttributeError
+
+        """
+        if not self.__dict__.get('memoryBudget') is None:
+            raise AttributeError('Views share the point table of the DataSet and are not available out of core.')
+        if files is None:
+            indices = list(range(len(self.convertedFiles)))
+        else:
+            if not isinstance(files,(list,tuple,range,np.ndarray)):
+                files = [files]
+            indices = []
+            for file in files:
+                matches = [i for i,datafile in enumerate(self.convertedFiles) if (file is datafile if isinstance(file,DataFile.DataFile) else 
+                           (i == file if not isinstance(file,str) else isinstance(datafile.fileLocation,str) and os.path.abspath(datafile.fileLocation)==os.path.abspath(file)))]
+                if len(matches)==0:
+                    raise AttributeError('File {} is not a converted file of the DataSet.'.format(file))
+                indices.append(matches[0])
+        if not condition is None:
+            indices = [i for i in indices if condition(self.convertedFiles[i])]
+        return DataSetView(self,indices,steps=steps)
+
+    @_tools.KwargChecker()
+    def append(self,files):
+        """Add data files to the DataSet without rebuilding it, e.g. scans arriving during an experiment. Only the new files are 
+        loaded and their metadata appended, and the point table is extended in place if already built, see pointTable. Stacked 
+        intensity, normalization, monitor and coordinates of the DataSet are stacked again on next access only.
+
+        Args:
+
+            - files (string, DataFile or list of strings or DataFiles): Data files or locations of data files to be added.
+
+        Raises:
+
+            - AttributeError
+
+        """
+        newFiles = self._loadDataFiles(files)
+        existing = self.convertedFiles+self.dataFiles
+        if len(existing)!=0 and len(newFiles)!=0:
+            sameSample = [existing[0].sample==datafile.sample for datafile in newFiles]
+            if not np.all(sameSample):
+                raise AttributeError('Files does not have the same sample! Compared to first entry: {}'.format(sameSample))
+        [self._dataFiles.append(file) for file in newFiles if file.type=='hdf']
+        [self._convertedFiles.append(file) for file in newFiles if file.type=='nxs']
+
+        files = self.convertedFiles if len(self.convertedFiles)!=0 else self.dataFiles # Files described by the data of the DataSet
+        added = [file for file in newFiles if file.type==('nxs' if len(self.convertedFiles)!=0 else 'hdf')]
+        if len(added)==0:
+            return
+        if len(added)==len(files): # First files of their type
+            self._getData()
+        else:
+            self._appendData(added)
+        self.sample = files[0].sample
+
+    def _appendData(self,files): # Internal method to append metadata of files of the same type as the data of the DataSet
+        start = time.time()
+        keys = ['a3','a3Off','a4','a4Off','instrumentCalibrationEf','instrumentCalibrationA4','instrumentCalibrationEdges','Ei',
+                'scanParameters','scanParameterValues','scanParameterUnits']
+        if files[0].type=='nxs':
+            values = DataFile.extractData(files,coordinates=False,counts=False)[6:17]
+        else:
+            values = DataFile.extractData(files,counts=False)[2:13]
+        for key,value in zip(keys,values):
+            old = self.__dict__[key]
+            self.__dict__[key] = old+list(value) if isinstance(old,list) else DataFile.stackArrays(list(old)+list(value))
+        for key in ['I','Monitor','Norm']+DataFile.FactorizedCoordinates.fields: # Stacked again on access
+            self.__dict__.pop(key,None)
+
+        table = self.__dict__.get('_pointTable')
+        masks = self.__dict__.get('masks',[])
+        if files[0].type=='nxs' and not table is None and table.key == PointTable.tableKey(self.convertedFiles[:-len(files)],masks,self.__dict__.get('precision')):
+            table.extend(files)
+        else:
+            self._pointTable = None
+        if 'loadTiming' in self.__dict__:
+            self.loadTiming['compute'] += time.time()-start
+
+    def addMask(self,mask):
+        """Add a mask removing points of all converted files from cuts and binning, see Mask module. Masks of the DataSet are 
+        applied together with the masks of the individual files.
+
+        Args:
+
+            - mask (Mask): Mask to be added.
+
+        Raises:
+
+            - AttributeError
+
+        """
+        if not isinstance(mask,Mask.Mask):
+            raise AttributeError('Provided mask is not of type Mask but {}.'.format(type(mask)))
+        self.masks = self.__dict__.get('masks',[])+[mask]
+
+    def pointTable(self):
+        """Flattened point table of the converted files of the DataSet with the masks of the DataSet and files applied, see 
+        PointTable. The table is built on first use and rebuilt only when files, masks or precision change.
+
+        Returns:
+
+            - table (PointTable): Columns of I, Monitor, Norm, qx, qy, energy, h, k, l and file, step, detector and pixel indices.
+
+        Raises:
+
+            - AttributeError
+
+        """
+        if len(self.convertedFiles)==0:
+            raise AttributeError('DataSet has no converted files.')
+        masks = self.__dict__.get('masks',[])
+        table = self.__dict__.get('_pointTable')
+        if table is None or table.key != PointTable.tableKey(self.convertedFiles,masks,self.__dict__.get('precision')):
+            table = self._pointTable = PointTable(self.convertedFiles,masks=masks,precision=self.__dict__.get('precision'))
+        return table
+
+    def spatialIndex(self,pointsPerCell=None):
+        """Spatial index over qx, qy and energy of the point table, see SpatialIndex. Once built, cut1D, cutQE, cut1DE, cutPowder 
+        and plotQPlane only gather the points of grid cells touched by the cut instead of testing all points, with identical 
+        results. The index is rebuilt when the point table changes, apart from points appended within the bounds of the grid, 
+        which are inserted into it, see SpatialIndex.extend.
+
+        Kwargs:
+
+            - pointsPerCell (int): Mean number of points in each grid cell (default None, i.e. that of the current index or 64).
+
+        Returns:
+
+            - index (SpatialIndex): Spatial index of the point table.
+
+        """
+        table = self.pointTable()
+        index = self.__dict__.get('_spatialIndex')
+        if pointsPerCell is None:
+            pointsPerCell = 64 if index is None else index.pointsPerCell
+        if index is None or not index.table is table or index.pointsPerCell != pointsPerCell or (index.size != len(table) and not index.extend()):
+            index = self._spatialIndex = SpatialIndex(table,pointsPerCell=pointsPerCell)
+        return index
+
+    def _matchDataFiles(self,dataFiles):
+        """Data files given as DataFiles or locations, using the converted files of the DataSet for matching locations so only 
+        files not part of the DataSet are loaded. Files loaded are cached by absolute location and modification time, so repeated 
+        cuts of the same files reuse them together with their point tables, see filePointTable."""
+        if isinstance(dataFiles,(str,DataFile.DataFile)):
+            dataFiles = [dataFiles]
+        if not isinstance(dataFiles,list):
+            return isListOfDataFiles(dataFiles)
+        locations = dict([(os.path.abspath(datafile.fileLocation),datafile) for datafile in self.convertedFiles if isinstance(datafile.fileLocation,str)])
+        loaded = self.__dict__.setdefault('_loadedFiles',{}) # Absolute location to modification time and DataFile
+        matched = []
+        for file in dataFiles:
+            if isinstance(file,str):
+                location = os.path.abspath(file)
+                mtime = os.path.getmtime(location) if os.path.isfile(location) else None
+                if location in locations:
+                    file = locations[location]
+                elif location in loaded and loaded[location][0] == mtime:
+                    file = loaded[location][1]
+            matched.append(file)
+        matched = isListOfDataFiles(matched)
+        for file,datafile in zip(dataFiles,matched):
+            if isinstance(file,str) and not os.path.abspath(file) in locations:
+                loaded[os.path.abspath(file)] = (os.path.getmtime(file),datafile)
+        return matched
+
+    def _pointSet(self,dataFiles=None,select=None):
+        """Flattened intensity, qx, qy, energy, normalization and monitor of all points of the converted files not removed by the 
+        masks of the DataSet or of the files. In memory, these are the columns of the point table, see pointTable, so cuts and 
+        binning never copy or see masked points. If the spatial index is built, see spatialIndex, only points of grid cells that 
+        may hold points selected by select are gathered. Out of core, the files are streamed in chunks of scan steps and only points for 
+        which select(qx,qy,energy) is true are kept, see _selectedChunks. Cuts out of core sum histograms of chunks instead, see 
+        _chunkHistograms."""
+        if dataFiles is None and len(self.convertedFiles)==0:
+            raise AttributeError('No data file to be binned provided in either input or DataSet object.')
+        masks = self.__dict__.get('masks',[])
+        keys = ['I','qx','qy','energy','Norm','Monitor']
+        if self.__dict__.get('memoryBudget') is None:
+            if dataFiles is None:
+                table = self.pointTable()
+                if hasattr(select,'cells') and not self.__dict__.get('_spatialIndex') is None: # Only points of cells touched by the cut
+                    rows = self.spatialIndex().query(select.cells)
+                    return [table.take(key,rows) for key in keys]
+                if not select is None and isinstance(table.columns,_RowRanges): # Only selected points of a view are gathered
+                    rows = table.selectRows(select)
+                    return [table.take(key,rows) for key in keys]
+                return [table[key] for key in keys]
+            parts = [] # Points of each file from the table of the DataSet or the table cached on the file
+            for datafile in self._matchDataFiles(dataFiles):
+                index = [i for i,convertedFile in enumerate(self.convertedFiles) if convertedFile is datafile]
+                if len(index)>0:
+                    parts.append(self.pointTable().fileColumns(index[0]))
+                else:
+                    parts.append(filePointTable(datafile,masks=masks,precision=self.__dict__.get('precision')).fileColumns(0))
+            if len(parts)==1: # Views of the table
+                return [parts[0][key] for key in keys]
+            return [np.concatenate([part[key] for part in parts]) for key in keys]
+
+        points = [[] for _ in keys]
+        for fields in self._selectedChunks(dataFiles,select):
+            for point,field in zip(points,fields):
+                point.append(field)
+        return [np.concatenate(point) if len(point)>0 else np.array([]) for point in points]
+
+    def _selectedChunks(self,dataFiles=None,select=None):
+        """Out of core, intensity, qx, qy, energy, normalization and monitor of the unmasked points for which select(qx,qy,energy) 
+        is true, streamed in chunks of scan steps fitting the memory budget, see iterateDataFiles. Chunks without such points are skipped."""
+        files = self.convertedFiles if dataFiles is None else self._matchDataFiles(dataFiles)
+        keys = ['I','qx','qy','energy','Norm','Monitor']
+        for chunk in iterateDataFiles(files,stepsPerChunk=memoryStepsPerChunk(files,self.memoryBudget),masks=self.__dict__.get('masks',[])):
+            fields = [chunk[key] if key in ['I','Monitor'] else _tools.castPrecision(chunk[key],self.__dict__.get('precision')) for key in keys]
+            if not select is None:
+                keep = select(*fields[1:4])
+                fields = [field[keep] for field in fields]
+            if len(fields[0])>0:
+                yield fields
+
+    def _chunkValues(self,dataFiles,select,values):
+        """First pass of cuts out of core. Returns the unique values of values([qx,qy,energy]) over all chunks of points selected by 
+        select, one array for each group of bins (e.g. each energy bin of cutPowder). Bin edges depend on all points of a cut, so they 
+        are found from these, holding one coordinate of each distinct point instead of all fields of the points."""
+        empty = np.zeros(0)
+        collected = [[np.unique(value)] for value in values([empty,empty,empty])]
+        for I,qx,qy,energy,Norm,Monitor in self._selectedChunks(dataFiles,select):
+            for group,value in zip(collected,values([qx,qy,energy])):
+                group.append(np.unique(value))
+        return [np.unique(np.concatenate(group)) for group in collected]
+
+    def _chunkHistograms(self,dataFiles,select,histograms):
+        """Second pass of cuts out of core. Returns the histograms histograms([qx,qy,energy],I,Norm,Monitor), binned with edges fixed by 
+        the first pass, see _chunkValues, summed over all chunks of points selected by select as in binDataFiles3D. Only the histograms of 
+        one chunk and their sums are held in memory."""
+        totals = None
+        for I,qx,qy,energy,Norm,Monitor in self._selectedChunks(dataFiles,select):
+            parts = histograms([qx,qy,energy],I,Norm,Monitor)
+            if totals is None:
+                dtypes = [part.dtype for part in parts]
+                totals = [_tools.accumulationWeights(part) for part in parts] # Chunks are summed in float64 and int64
+            else:
+                totals = [total+part for total,part in zip(totals,parts)]
+        if totals is None: # No points selected
+            empty = np.zeros(0)
+            return histograms([empty,empty,empty],empty,empty,empty)
+        return [total.astype(dtype) for total,dtype in zip(totals,dtypes)]
+
+    def _cut1DChunks(self,q1,q2,width,minPixel,EnergyBins,extend=True,dataFiles=None):
+        """Out of core 1D cuts from q1 to q2 for each energy bin, see cut1D and cutQE. Returns the return value of cut1D for each bin."""
+        energies = list(zip(EnergyBins[:-1],EnergyBins[1:]))
+        select = _lineSelection(q1,q2,width,np.min(EnergyBins),np.max(EnergyBins),extend=extend)
+        def values(positions): # Positions along the cut of points within the width
+            along = []
+            for Emin,Emax in energies:
+                propos,_,insideWidth = _cut1DProjection(positions,q1,q2,width,Emin,Emax,extend=extend)
+                along.append(propos[0][insideWidth])
+            return along
+        lenbins = [np.array(_tools.binEdges(along,minPixel)) for along in self._chunkValues(dataFiles,select,values)]
+
+        def histograms(positions,I,Norm,Monitor):
+            parts = []
+            for (Emin,Emax),bins in zip(energies,lenbins):
+                if len(bins)>0:
+                    propos,inside,_ = _cut1DProjection(positions,q1,q2,width,Emin,Emax,extend=extend)
+                    parts.extend(_cut1DHistogram(propos,I[inside],Norm[inside],Monitor[inside],bins,width))
+            return parts
+        parts = self._chunkHistograms(dataFiles,select,histograms)
+        cuts = []
+        for (Emin,Emax),bins in zip(energies,lenbins):
+            data = None
+            if len(bins)>0:
+                data,parts = parts[:4],parts[4:]
+            cuts.append(_cut1DResult(data,q1,q2,width,Emin,Emax,bins))
+        return cuts
 
     @_tools.KwargChecker()
     def binData3D(self,dx,dy,dz,dataFiles=None):
@@ -298,30 +762,23 @@ class DataSet(object):
             - Datalist: List of converted data files having 4 sub arrays: Intensity(counts), Monitor, Normalization, Normalization count
 
             - bins: 3 arrays containing edge positions in x, y, and z directions.
+
+        .. note::
+            If the coordinates of the converted files are factorized (and not yet calculated) and the point table is not built, data is binned in chunks of scan steps, see binDataFiles3D.
+            Out of core, chunks are sized to the memory budget of the DataSet.
+            Masked points are not binned, see addMask.
+
         """
         
-        if dataFiles is None:
-            if len(self.convertedFiles)==0:
+        if not self.__dict__.get('memoryBudget') is None: # Out of core
+            files = self.convertedFiles if dataFiles is None else self._matchDataFiles(dataFiles)
+            if len(files)==0:
                 raise AttributeError('No data file to be binned provided in either input or DataSet object.')
-            else:
-                I = self.I
-                qx = self.qx
-                qy = self.qy
-                energy = self.energy
-                Norm = self.Norm
-                Monitor = self.Monitor
-
-        else: 
-            DS = DataSet(convertedFiles = dataFiles)
-            I,qx,qy,energy,Norm,Monitor, = DS.I,DS.qx,DS.qy,DS.energy,DS.Norm,DS.Monitor#dataFiles.extractData()
-            
-        
-        #print(qx.shape)
-        #print(np.concatenate(qx,axis=0).flatten().shape)
-        pos=[np.concatenate(qx,axis=0).flatten(),np.concatenate(qy,axis=0).flatten(),np.concatenate(energy,axis=0).flatten()]
-        I = np.concatenate(I,axis=0)
-        Monitor = np.concatenate(Monitor,axis=0)
-        Norm = np.concatenate(Norm,axis=0)
+            return binDataFiles3D(dx,dy,dz,files,stepsPerChunk=memoryStepsPerChunk(files,self.memoryBudget),masks=self.__dict__.get('masks'))
+        if dataFiles is None and self.__dict__.get('_pointTable') is None and len(self.convertedFiles)!=0 and np.any([datafile.isFactorized() for datafile in self.convertedFiles]):
+            return binDataFiles3D(dx,dy,dz,self.convertedFiles,masks=self.__dict__.get('masks'))
+        I,qx,qy,energy,Norm,Monitor = self._pointSet(dataFiles)
+        pos=[qx,qy,energy]
         returnData,bins = binData3D(dx,dy,dz,pos,I,norm=Norm,mon=Monitor)
 
         return returnData,bins
@@ -362,23 +819,15 @@ class DataSet(object):
             - Data list (4 arrays): Intensity, monitor count, normalization and normalization counts binned in the 1D cut.
             
             - Bin list (3 arrays): Bin edge positions in plane of size (n+1,3), orthogonal positions of bin edges in plane of size (2,2), and energy edges of size (2).
-            
-        """
-        if dataFiles is None:
-            if len(self.convertedFiles)==0:
-                raise AttributeError('No data file to be binned provided in either input or DataSet object.')
-            else:
-                I = self.I
-                qx = self.qx
-                qy = self.qy
-                energy = self.energy
-                Norm = self.Norm
-                Monitor = self.Monitor
 
-        else: 
-            DS = DataSet(convertedFiles = dataFiles)
-            I,qx,qy,energy,Norm,Monitor, = DS.I,DS.qx,DS.qy,DS.energy,DS.Norm,DS.Monitor#dataFiles.extractData()
+        .. note::
+            Out of core, the data is streamed twice: once to find the bins along the cut and once to sum the histograms of each chunk. 
+            A coverage plot needs all points of the cut, which are then gathered instead.
             
+        """
+        if not self.__dict__.get('memoryBudget') is None and not plotCoverage:
+            return self._cut1DChunks(q1,q2,width,minPixel,[Emin,Emax],extend=extend,dataFiles=dataFiles)[0]
+        I,qx,qy,energy,Norm,Monitor = self._pointSet(dataFiles,select=_lineSelection(q1,q2,width,Emin,Emax,extend=extend))
         positions = [qx,qy,energy]
        
         return cut1D(positions,I,Norm,Monitor,q1,q2,width,minPixel,Emin,Emax,plotCoverage=plotCoverage,extend=extend)
@@ -413,24 +862,8 @@ class DataSet(object):
         """
         
         
-        if dataFiles is None:
-            if len(self.convertedFiles)==0:
-                raise AttributeError('No data file to be binned provided in either input or DataSet object.')
-            else:
-                I = self.I
-                qx = self.qx
-                qy = self.qy
-                energy = self.energy
-                Norm = self.Norm
-                Monitor = self.Monitor
-
-        else: 
-            DS = DataSet(convertedFiles = dataFiles)
-            I,qx,qy,energy,Norm,Monitor = DS.I,DS.qx,DS.qy,DS.energy,DS.Norm,DS.Monitor#dataFiles.extractData()
-            
-        positions = [qx,qy,energy]
-
-        return plotCut1D(positions,I,Norm,Monitor,q1,q2,width,minPixel,Emin,Emax,ax,plotCoverage,extend=extend,**kwargs)
+        D,P = self.cut1D(q1,q2,width,minPixel,Emin,Emax,plotCoverage=plotCoverage,extend=extend,dataFiles=dataFiles)
+        return _plotCut1D(D,P,ax,**kwargs)
 
     @_tools.KwargChecker()
     def cutQE(self,q1,q2,width,minPixel,EnergyBins,extend=True,dataFiles=None):
@@ -464,28 +897,9 @@ class DataSet(object):
             - binDistance (n arrays): n isntances of arrays holding the distance in q to q1.
 
         """
-        if dataFiles is None:
-            if len(self.convertedFiles)==0:
-                raise AttributeError('No data file to be binned provided in either input or DataSet object.')
-            else:
-                I = self.I
-                qx = self.qx
-                qy = self.qy
-                energy = self.energy
-                Norm = self.Norm
-                Monitor = self.Monitor
-
-        else: 
-            #dataFiles = isListOfDataFiles(dataFiles)
-            DS = DataSet(convertedFiles = dataFiles)
-            I,qx,qy,energy,Norm,Monitor = DS.I,DS.qx,DS.qy,DS.energy,DS.Norm,DS.Monitor#dataFiles.extractData()
-            
-        I = np.concatenate([x.flatten() for x in I])
-        qx = np.concatenate([x.flatten() for x in qx])#self.qx
-        qy = np.concatenate([x.flatten() for x in qy])#self.qy
-        energy = np.concatenate([x.flatten() for x in energy])#self.energy
-        Norm = np.concatenate([x.flatten() for x in Norm])#self.Norm
-        Monitor = np.concatenate([x.flatten() for x in Monitor])#self.Monitor
+        if not self.__dict__.get('memoryBudget') is None: # Histograms of chunks are summed, see cut1D
+            return _cutQEResult(self._cut1DChunks(q1,q2,width,minPixel,EnergyBins,extend=extend,dataFiles=dataFiles),q1)
+        I,qx,qy,energy,Norm,Monitor = self._pointSet(dataFiles,select=_lineSelection(q1,q2,width,np.min(EnergyBins),np.max(EnergyBins),extend=extend))
         positions = [qx,qy,energy]
         
         return cutQE(positions,I,Norm,Monitor,q1,q2,width,minPixel,EnergyBins,extend=extend)
@@ -532,30 +946,7 @@ class DataSet(object):
         """
         
         
-        if dataFiles is None:
-            if len(self.convertedFiles)==0:
-                raise AttributeError('No data file to be binned provided in either input or DataSet object.')
-            else:
-                I = self.I
-                qx = self.qx
-                qy = self.qy
-                energy = self.energy
-                Norm = self.Norm
-                Monitor = self.Monitor
-
-        else: 
-            dataFiles = isListOfDataFiles(dataFiles)
-            I,qx,qy,energy,Norm,Monitor = dataFiles.extractData()
-            
-        I = np.concatenate([x.flatten() for x in I])
-        qx = np.concatenate([x.flatten() for x in qx])#self.qx
-        qy = np.concatenate([x.flatten() for x in qy])#self.qy
-        energy = np.concatenate([x.flatten() for x in energy])#self.energy
-        Norm = np.concatenate([x.flatten() for x in Norm])#self.Norm
-        Monitor = np.concatenate([x.flatten() for x in Monitor])#self.Monitor
-        positions = [qx,qy,energy]
-        
-        return plotCutQE(positions,I,Norm,Monitor,q1,q2,width,minPixel,EnergyBins,ax = None,**kwargs)
+        return _plotCutQE(q1,q2,self.cutQE(q1,q2,width,minPixel,EnergyBins,dataFiles=dataFiles),ax,**kwargs)
 
     @_tools.KwargChecker()
     def cutPowder(self,EBinEdges,qMinBin=0.01,dataFiles=None):
@@ -579,21 +970,21 @@ class DataSet(object):
             - qbins (n arrays): n arrays holding the bin edges along the lenght of q
 
         """
-        if dataFiles is None:
-            if len(self.convertedFiles)==0:
-                raise AttributeError('No data file to be binned provided in either input or DataSet object.')
-            else:
-                I = self.I
-                qx = self.qx
-                qy = self.qy
-                energy = self.energy
-                Norm = self.Norm
-                Monitor = self.Monitor
-
-        else: 
-            dataFiles = isListOfDataFiles(dataFiles)
-            I,qx,qy,energy,Norm,Monitor = dataFiles.extractData()
-            
+        select = _energySelection(np.min(EBinEdges),np.max(EBinEdges))
+        if not self.__dict__.get('memoryBudget') is None: # Histograms of chunks are summed, see cut1D
+            def groups(positions): # Length of q and points of each energy bin
+                q = np.linalg.norm(positions[:2],axis=0)
+                for i in range(len(EBinEdges)-1):
+                    yield q,np.logical_and(positions[2]>EBinEdges[i],positions[2]<=EBinEdges[i+1])
+            qbins = [np.array(_tools.binEdges(value,tolerance=qMinBin)) for value in self._chunkValues(dataFiles,select,lambda positions: [q[inside] for q,inside in groups(positions)])]
+            def histograms(positions,I,Norm,Monitor):
+                parts = []
+                for (q,inside),bins in zip(groups(positions),qbins):
+                    parts.extend(_cutPowderHistogram(q[inside],I[inside],Norm[inside],Monitor[inside],bins))
+                return parts
+            parts = self._chunkHistograms(dataFiles,select,histograms)
+            return [parts[i::4] for i in range(4)],qbins
+        I,qx,qy,energy,Norm,Monitor = self._pointSet(dataFiles,select=select)
         positions = [qx,qy,energy]
 
         return cutPowder(positions,I,Norm,Monitor,EBinEdges,qMinBin)
@@ -628,24 +1019,8 @@ class DataSet(object):
             - Bin list (3 arrays): Bin edge positions in plane of size (n+1,3), orthogonal positions of bin edges in plane of size (2,2), and energy edges of size (2).
 
         """
-        if dataFiles is None:
-            if len(self.convertedFiles)==0:
-                raise AttributeError('No data file to be binned provided in either input or DataSet object.')
-            else:
-                I = self.I
-                qx = self.qx
-                qy = self.qy
-                energy = self.energy
-                Norm = self.Norm
-                Monitor = self.Monitor
-
-        else: 
-            DS = DataSet(convertedFiles = dataFiles)
-            I,qx,qy,energy,Norm,Monitor, = DS.I,DS.qx,DS.qy,DS.energy,DS.Norm,DS.Monitor#dataFiles.extractData()
-            
-        positions = [qx,qy,energy]
-
-        return plotCutPowder(positions,I,Norm,Monitor,EBinEdges,qMinBin,ax,**kwargs)
+        data,qbins = self.cutPowder(EBinEdges,qMinBin=qMinBin,dataFiles=dataFiles)
+        return _plotCutPowder(EBinEdges,data,qbins,ax,**kwargs)
 
     def createRLUAxes(self,figure=None):
         """Wrapper for the createRLUAxes method.
@@ -698,25 +1073,33 @@ class DataSet(object):
             
             
         """
-        if dataFiles is None:
-            if len(self.convertedFiles)==0:
-                raise AttributeError('No data file to be binned provided in either input or DataSet object.')
-            else:
-                I = self.I
-                qx = self.qx
-                qy = self.qy
-                energy = self.energy
-                Norm = self.Norm
-                Monitor = self.Monitor
-
-        else: 
-            DS = DataSet(convertedFiles = dataFiles)
-            I,qx,qy,energy,Norm,Monitor, = DS.I,DS.qx,DS.qy,DS.energy,DS.Norm,DS.Monitor#dataFiles.extractData()
-        #if ax is None and RLUPlot is True:
-        #    ax = self.createRLUAxes()
-        
+        select = xRange = None
+        outOfCore = not self.__dict__.get('memoryBudget') is None
+        if outOfCore or (dataFiles is None and not self.__dict__.get('_spatialIndex') is None):
+            select = _energySelection(EMin,EMax) # Out of core, only points within the energy window are kept of each chunk
+            if not enlargen: # x bins span all points, not only those selected
+                xRange = self._xRange(binning,dataFiles)
+        I,qx,qy,energy,Norm,Monitor = self._pointSet(dataFiles,select=select)
         pos = [qx,qy,energy]
-        return plotQPlane(I,Monitor,Norm,pos,EMin,EMax,binning=binning,xBinTolerance=xBinTolerance,yBinTolerance=yBinTolerance,enlargen=enlargen,log=log,ax=ax,**kwargs)
+        return plotQPlane(I,Monitor,Norm,pos,EMin,EMax,binning=binning,xBinTolerance=xBinTolerance,yBinTolerance=yBinTolerance,enlargen=enlargen,log=log,ax=ax,xRange=xRange,**kwargs)
+
+    def _xRange(self,binning,dataFiles=None):
+        """Lower and upper x of all points not masked, with x being qx for binning 'xy' and the angle in the plane for binning 
+        'polar', see plotQPlane. Out of core, the files are streamed in chunks of scan steps."""
+        def planeX(qx,qy):
+            return qx if binning == 'xy' else np.arctan2(qy,qx)
+        if self.__dict__.get('memoryBudget') is None:
+            table = self.pointTable()
+            x = planeX(table['qx'],table['qy'])
+            return [np.min(x),np.max(x)] if len(x)>0 else None
+        files = self.convertedFiles if dataFiles is None else self._matchDataFiles(dataFiles)
+        xRange = None
+        for chunk in iterateDataFiles(files,stepsPerChunk=memoryStepsPerChunk(files,self.memoryBudget),masks=self.__dict__.get('masks',[])):
+            x = planeX(*[_tools.castPrecision(chunk[key],self.__dict__.get('precision')) for key in ['qx','qy']])
+            if len(x)==0:
+                continue
+            xRange = [np.min(x),np.max(x)] if xRange is None else [min(xRange[0],np.min(x)),max(xRange[1],np.max(x))]
+        return xRange
 
     @_tools.KwargChecker()
     def plotA3A4(self,dataFiles=None,ax=None,planes=[],log=False,returnPatches=False,binningDecimals=3,singleFigure=False,plotTessellation=False,Ei_err = 0.05,temperature_err=0.2,magneticField_err=0.2,electricField_err=0.2):
@@ -1323,31 +1706,9 @@ class DataSet(object):
             - Bin list (1 array): Bin edge positions in energy
 
         """
-        if dataFiles is None:
-                if len(self.convertedFiles)==0:
-                    raise AttributeError('No data file to be binned provided in either input or DataSet object.')
-                else:
-                    I = self.I
-                    qx = self.qx
-                    qy = self.qy
-                    energy = self.energy
-                    Norm = self.Norm
-                    Monitor = self.Monitor
-                    sample = self.convertedFiles[0].sample
-
-        else: 
-            #dataFiles = isListOfDataFiles(dataFiles)
-            DS = DataSet(convertedFiles = dataFiles)
-            I,qx,qy,energy,Norm,Monitor = DS.I,DS.qx,DS.qy,DS.energy,DS.Norm,DS.Monitor#dataFiles.extractData()
-            sample = DS.convertedFiles[0].sample
-            
-        I = np.concatenate([x.flatten() for x in I])
-        qx = np.concatenate([x.flatten() for x in qx])#self.qx
-        qy = np.concatenate([x.flatten() for x in qy])#self.qy
-        energy = np.concatenate([x.flatten() for x in energy])#self.energy
-        Norm = np.concatenate([x.flatten() for x in Norm])#self.Norm
-        Monitor = np.concatenate([x.flatten() for x in Monitor])#self.Monitor
-        positions = [qx,qy,energy]
+        if not dataFiles is None:
+            dataFiles = self._matchDataFiles(dataFiles)
+        sample = self.convertedFiles[0].sample if dataFiles is None else dataFiles[0].sample
 
         if format.lower() in ['rlu','hkl']: # Recalculate q points into qx and qy points
 
@@ -1360,6 +1721,24 @@ class DataSet(object):
         elif format.lower()=='qxqy': # Do nothing
             Q = np.array(q)
 
+        select = _pointSelection(Q,width)
+        if not self.__dict__.get('memoryBudget') is None: # Histograms of chunks are summed, see cut1D
+            def values(positions): # Energies of points within energy limits, within q range and within both
+                return [positions[2][inside] for inside in _cut1DEMasks(positions,E1,E2,Q,width)]
+            insideEnergy,inside,Energies = self._chunkValues(dataFiles,select,values)
+            if len(insideEnergy)==0:
+                raise AttributeError('No points are within the provided energy limits.')
+            elif len(inside)==0:
+                raise AttributeError('No points are inside selected q range.')
+            bins = np.array(_tools.binEdges(Energies,minPixel))
+            if len(bins)==0:
+                return [np.array(np.array([])),np.array([]),np.array([]),np.array([])],[[E1,E2]]
+            def histograms(positions,I,Norm,Monitor):
+                allInside = _cut1DEMasks(positions,E1,E2,Q,width)[2]
+                return _cut1DEHistogram(positions[2][allInside],I[allInside],Norm[allInside],Monitor[allInside],bins)
+            return self._chunkHistograms(dataFiles,select,histograms),[bins]
+        I,qx,qy,energy,Norm,Monitor = self._pointSet(dataFiles,select=select)
+        positions = [qx,qy,energy]
 
         return cut1DE(positions = positions, I=I, Norm=Norm,Monitor=Monitor,E1=E1,E2=E2,q=Q,width=width,minPixel=minPixel)
 
@@ -1397,23 +1776,639 @@ class DataSet(object):
         return Viewer
 
 
-def load(filename):
-    """Function to load an object from a pickled file.
+class DataSetView(DataSet):
+    """Selection of converted files and scan steps of a DataSet created by DataSet.view. The points of the view are ranges of 
+    rows of the point table of the parent DataSet, see PointTable.subset, so creating a view copies no points and cutting it 
+    gathers at most the selected points. Cut, binning and plot methods of DataSet are available on the view. Metadata like a3 and Ei holds all steps of the 
+    selected files. The view keeps the masks and point table of the parent at creation, so masks are added to the parent 
+    before creating the view."""
+    def __init__(self,parent,fileIndices,steps=None):
+        """Args:
+
+            - parent (DataSet): DataSet viewed.
+
+            - fileIndices (list of ints): Indices of the converted files of the parent to be kept.
+
+        Kwargs:
+
+            - steps (slice or list of ints): Scan steps of each file to be kept (default None, i.e. all steps).
+
+        """
+        self._dataFiles = []
+        self._normalizationfiles = parent.normalizationfiles
+        self._convertedFiles = [parent.convertedFiles[i] for i in fileIndices]
+        self._calibrationfiles = parent.calibrationfiles
+        self._loadOptions = parent.__dict__.get('_loadOptions')
+        self.masks = list(parent.__dict__.get('masks',[]))
+        self._prefetch = parent.__dict__.get('_prefetch',0)
+        self.loadTiming = {'files':0,'io':0.0,'wait':0.0,'compute':0.0}
+        self.precision = parent.__dict__.get('precision')
+        self.memoryBudget = None
+        self._settings = parent.settings
+        self.fileIndices = list(fileIndices)
+        self.steps = steps
+        self._pointTable = parent.pointTable().subset(self.fileIndices,steps=steps)
+        for key in ['a3','a3Off','a4','a4Off','instrumentCalibrationEf','instrumentCalibrationA4','instrumentCalibrationEdges','Ei',
+                    'scanParameters','scanParameterValues','scanParameterUnits']:
+            if key in parent.__dict__:
+                values = [parent.__dict__[key][i] for i in self.fileIndices]
+                self.__dict__[key] = values if isinstance(parent.__dict__[key],list) else DataFile.stackArrays(values)
+        if len(self._convertedFiles)!=0:
+            self.sample = self._convertedFiles[0].sample
+
+    def pointTable(self):
+        if len(self.convertedFiles)==0:
+            raise AttributeError('DataSet view has no converted files.')
+        return self._pointTable
+
+    def addMask(self,mask):
+        raise AttributeError('Masks cannot be added to a view. Add the mask to the viewed DataSet and create the view again.')
+
+    def append(self,files):
+        raise AttributeError('Files cannot be appended to a view. Append them to the viewed DataSet and create the view again.')
+
+
+class PointTable(object):
+    """Flattened points of converted data files in one preallocated, contiguous column per field. Masked points are left out. 
+    The table is built once for the files, masks and precision of a DataSet, see DataSet.pointTable, and all cuts and binning 
+    use its columns without copying. Columns are read-only."""
+    fields = ['I','Monitor','Norm','qx','qy','energy','h','k','l']
+    indices = ['file','step','detector','pixel']
+
+    def __init__(self,files,masks=None,precision=None,stepsPerChunk=10):
+        """Args:
+
+            - files (list of DataFiles): Converted data files.
+
+        Kwargs:
+
+            - masks (list of Masks): Masks applied together with the masks of the files (default None).
+
+            - precision (string): Floating point type of coordinates and normalization (default None, i.e. the global compute 
+              precision, see _tools.setComputePrecision).
+
+            - stepsPerChunk (int): Number of scan steps read at a time, limiting factorized coordinates calculated at once (default 10).
+
+        """
+        self.masks = masks
+        self.precision = precision
+        self.stepsPerChunk = stepsPerChunk
+        self.files = []
+        self.offsets = [0]
+        self.columns = {}
+        self._buffers = None
+        self.extend(files)
+
+    def extend(self,files):
+        """Append the points of further files to the table. Columns are views of buffers growing geometrically, so adding files 
+        one at a time costs amortized time proportional to the points added.
+
+        Args:
+
+            - files (list of DataFiles): Converted data files to be added.
+
+        """
+        if self._buffers is None and len(self.files)>0:
+            raise AttributeError('Subsets of point tables cannot be extended.')
+        bitmaps = []
+        for datafile in files:
+            bitmap = datafile.maskBitmap(self.masks)
+            bitmaps.append(None if bitmap is None else np.broadcast_to(bitmap,datafile.I.shape))
+        start = self.offsets[-1]
+        size = start+int(np.sum([datafile.I.size if bitmap is None else datafile.I.size-np.count_nonzero(bitmap) for datafile,bitmap in zip(files,bitmaps)]))
+
+        dtypes = {}
+        for key in PointTable.fields:
+            fileDtypes = [datafile.fieldDtype(key) for datafile in files]
+            if len(self.files)>0: # Fields of the table so far
+                if not key in self._buffers:
+                    continue
+                fileDtypes.append(self._buffers[key].dtype)
+            if len(fileDtypes)==0 or np.any([dtype is None for dtype in fileDtypes]): # Field not loaded for all files
+                continue
+            dtype = np.result_type(*fileDtypes)
+            if not key in ['I','Monitor'] and np.issubdtype(dtype,np.floating) and not _tools.computeDtype(self.precision) is None:
+                dtype = _tools.computeDtype(self.precision)
+            dtypes[key] = dtype
+        for key in PointTable.indices:
+            dtypes[key] = np.dtype(np.int64)
+
+        if self._buffers is None or size>len(self._buffers['file']) or np.any([not key in self._buffers or self._buffers[key].dtype != dtype for key,dtype in dtypes.items()]):
+            capacity = size if self._buffers is None else max(size,2*len(self._buffers['file']))
+            buffers = {}
+            for key,dtype in dtypes.items():
+                buffers[key] = np.empty(capacity,dtype=dtype)
+                if start>0:
+                    buffers[key][:start] = self._buffers[key][:start]
+            self._buffers = buffers
+        else:
+            self._buffers = dict([(key,self._buffers[key]) for key in dtypes.keys()])
+
+        offset = start
+        for fileId,(datafile,bitmap) in enumerate(zip(files,bitmaps),len(self.files)):
+            shape = datafile.I.shape
+            pointsPerStep = int(np.prod(shape[1:]))
+            stepsPerChunk = self.stepsPerChunk
+            for i,chunk in enumerate(datafile.iterateFlat(stepsPerChunk=stepsPerChunk)):
+                index = np.arange(i*stepsPerChunk*pointsPerStep,i*stepsPerChunk*pointsPerStep+len(chunk['I']))
+                if not bitmap is None:
+                    keep = np.logical_not(bitmap[i*stepsPerChunk:(i+1)*stepsPerChunk].flatten())
+                    index = index[keep]
+                    chunk = dict([(key,value[keep]) for key,value in chunk.items()])
+                stop = offset+len(index)
+                for key in PointTable.fields:
+                    if key in self._buffers:
+                        self._buffers[key][offset:stop] = chunk[key]
+                self._buffers['file'][offset:stop] = fileId
+                self._buffers['step'][offset:stop],self._buffers['detector'][offset:stop],self._buffers['pixel'][offset:stop] = np.unravel_index(index,shape)
+                offset = stop
+            self.offsets.append(offset)
+            self.files.append(datafile)
+
+        self.columns = {}
+        for key,buffer in self._buffers.items():
+            self.columns[key] = buffer[:offset]
+            self.columns[key].flags.writeable = False
+        self.key = PointTable.tableKey(self.files,self.masks,self.precision)
+
+    def subset(self,fileIndices,steps=None):
+        """Table of the points of some of the files and scan steps of this table. No points are copied: the columns of a subset 
+        of a single range of rows are slices of the columns of this table, while a subset of several ranges keeps the ranges and 
+        gathers rows on access only, see take and selectRows. File indices of the subset refer to the files of this table. Subsets 
+        cannot be extended.
+
+        Args:
+
+            - fileIndices (list of ints): Indices of the files in the files of this table.
+
+        Kwargs:
+
+            - steps (slice or list of ints): Scan steps of each file to be kept (default None, i.e. all steps).
+
+        Returns:
+
+            - table (PointTable): Subset of the table.
+
+        """
+        rows = [] # Ranges of rows of each file
+        for i in fileIndices:
+            start,stop = self.offsets[i],self.offsets[i+1]
+            if steps is None:
+                rows.append([(start,stop)])
+                continue
+            fileSteps = np.unique(np.arange(self.files[i].I.shape[0])[steps] if isinstance(steps,slice) else np.asarray(steps,dtype=int).reshape(-1))
+            stepColumn = self.rowRange('step',start,stop) # Sorted as points are ordered by step
+            ranges = np.split(fileSteps,np.nonzero(np.diff(fileSteps)!=1)[0]+1) if len(fileSteps)>0 else []
+            rows.append([(start+np.searchsorted(stepColumn,r[0],side='left'),start+np.searchsorted(stepColumn,r[-1],side='right')) for r in ranges])
+
+        ranges = [row for fileRows in rows for row in fileRows]
+        source = self.columns
+        if isinstance(self.columns,_RowRanges): # Ranges of the table this one is a subset of
+            ranges = [row for first,last in ranges for row in self.columns.restrict(first,last)]
+            source = self.columns.columns
+        merged = []
+        for first,last in ranges:
+            if len(merged)>0 and merged[-1][1]==first:
+                merged[-1] = (merged[-1][0],last)
+            elif last>first:
+                merged.append((first,last))
+
+        table = PointTable.__new__(PointTable)
+        table.masks = self.masks
+        table.precision = self.precision
+        table.stepsPerChunk = self.stepsPerChunk
+        table.files = [self.files[i] for i in fileIndices]
+        table.offsets = list(np.cumsum([0]+[int(np.sum([last-first for first,last in fileRows])) for fileRows in rows]))
+        table._buffers = None
+        if len(merged)>1:
+            table.columns = _RowRanges(source,merged)
+        else:
+            table.columns = dict([(key,column[merged[0][0]:merged[0][1]] if len(merged)==1 else column[:0]) for key,column in source.items()])
+        table.key = PointTable.tableKey(table.files,table.masks,table.precision)
+        return table
+
+    @staticmethod
+    def tableKey(files,masks=None,precision=None):
+        """Key identifying the files, masks and precision a table is built for. Tables are rebuilt when it changes."""
+        return (tuple(id(datafile) for datafile in files),tuple(id(mask) for mask in ([] if masks is None else masks)),
+                tuple(tuple(id(mask) for mask in datafile.__dict__.get('masks',[])) for datafile in files),precision)
+
+    def fileColumns(self,fileIndex):
+        """Columns of the points of one file of the table as views without copying.
+
+        Args:
+
+            - fileIndex (int): Index of the file in the files the table is built for.
+
+        Returns:
+
+            - columns (dict): Views of all columns restricted to the points of the file.
+
+        """
+        start,stop = self.offsets[fileIndex],self.offsets[fileIndex+1]
+        return dict([(key,self.rowRange(key,start,stop)) for key in self.columns.keys()])
+
+    def rowRange(self,key,start,stop):
+        """Rows start to stop of a column, a view unless the rows span several ranges of a subset."""
+        if isinstance(self.columns,_RowRanges):
+            return self.columns.gather(key,self.columns.restrict(start,stop))
+        return self.columns[key][start:stop]
+
+    def take(self,key,rows):
+        """Rows of a column, gathering only these rows from subsets of several ranges of rows.
+
+        Args:
+
+            - key (string): Field or index column.
+
+            - rows (array): Rows of the table.
+
+        Returns:
+
+            - values (array): Values of the column at the rows.
+
+        """
+        if isinstance(self.columns,_RowRanges):
+            return self.columns.take(key,rows)
+        return self.columns[key][rows]
+
+    def selectRows(self,select):
+        """Rows of the points for which select(qx,qy,energy) is true. Subsets of several ranges of rows are tested range by range, 
+        so no columns are gathered.
+
+        Args:
+
+            - select (function): Function of qx, qy and energy returning true for points to be kept.
+
+        Returns:
+
+            - rows (array): Sorted rows of the selected points.
+
+        """
+        keys = ['qx','qy','energy']
+        if not isinstance(self.columns,_RowRanges):
+            return np.flatnonzero(select(*[self.columns[key] for key in keys]))
+        ranges = self.columns
+        rows = [offset+np.flatnonzero(select(*[ranges.columns[key][first:last] for key in keys])) for offset,(first,last) in zip(ranges.offsets,ranges.ranges)]
+        return np.concatenate(rows)
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self,key):
+        return self.columns[key]
+
+
+class _RowRanges(object):
+    """Columns of a point table subset made of several ranges of rows of the columns of another table, see PointTable.subset. 
+    Columns are gathered on access only."""
+    def __init__(self,columns,ranges):
+        self.columns = columns
+        self.ranges = ranges
+        self.offsets = np.cumsum([0]+[last-first for first,last in ranges]) # First row of each range in the subset
+
+    def restrict(self,start,stop):
+        """Ranges of rows of the columns holding rows start to stop of the subset."""
+        restricted = []
+        for offset,(first,last) in zip(self.offsets,self.ranges):
+            lower,upper = max(start,offset),min(stop,offset+last-first)
+            if upper>lower:
+                restricted.append((first+lower-offset,first+upper-offset))
+        return restricted
+
+    def gather(self,key,ranges):
+        """Rows of a column in the given ranges, a view of the column for a single range."""
+        column = self.columns[key]
+        if len(ranges)<2:
+            return column[ranges[0][0]:ranges[0][1]] if len(ranges)==1 else column[:0]
+        gathered = np.concatenate([column[first:last] for first,last in ranges])
+        gathered.flags.writeable = False
+        return gathered
+
+    def take(self,key,rows):
+        rows = np.asarray(rows,dtype=int)
+        rangeIndex = np.searchsorted(self.offsets,rows,side='right')-1
+        firsts = np.array([first for first,_ in self.ranges],dtype=int)
+        return self.columns[key][rows-self.offsets[rangeIndex]+firsts[rangeIndex]]
+
+    def keys(self):
+        return self.columns.keys()
+
+    def __contains__(self,key):
+        return key in self.columns
+
+    def __getitem__(self,key):
+        return self.gather(key,self.ranges)
+
+
+class SpatialIndex(object):
+    """Uniform grid over qx, qy and energy of the points of a point table. Points are sorted by grid cell, so the points of 
+    any set of cells are found without testing all points. Points with coordinates not a number are left out, as no cut 
+    selects them."""
+    keys = ['qx','qy','energy']
+
+    def __init__(self,table,pointsPerCell=64):
+        """Args:
+
+            - table (PointTable): Point table to be indexed.
+
+        Kwargs:
+
+            - pointsPerCell (int): Mean number of points in each grid cell, setting the number of cells along each axis (default 64).
+
+        """
+        self.table = table
+        self.size = len(table)
+        self.pointsPerCell = pointsPerCell
+        coordinates = np.array([table[key] for key in SpatialIndex.keys],dtype=float)
+        points = np.nonzero(np.all(np.isfinite(coordinates),axis=0))[0]
+        coordinates = coordinates[:,points]
+
+        cellsPerAxis = max(1,int(np.round((len(points)/float(pointsPerCell))**(1.0/3.0))))
+        self.shape = (cellsPerAxis,)*3
+        self.points = len(points) # Points the grid is built for
+        self.lower = np.min(coordinates,axis=1) if len(points)>0 else np.zeros(3)
+        self.upper = np.max(coordinates,axis=1) if len(points)>0 else np.ones(3)
+        self.cellSize = (self.upper-self.lower)/cellsPerAxis
+        self.cellSize[self.cellSize<=0] = 1.0
+        linear = self._cellOf(coordinates)
+
+        self.order = points[np.argsort(linear,kind='stable')] # Rows of the table sorted by cell
+        counts = np.bincount(linear,minlength=int(np.prod(self.shape)))
+        self.starts = np.concatenate([[0],np.cumsum(counts)])
+        self._setCells()
+
+    def _cellOf(self,coordinates):
+        """Linear index of the grid cell of points given as array of shape (3,n) in qx, qy and energy."""
+        cell = np.clip(np.floor((coordinates-self.lower.reshape(3,1))/self.cellSize.reshape(3,1)).astype(int),0,self.shape[0]-1)
+        return np.ravel_multi_index(cell,self.shape)
+
+    def _setCells(self):
+        """Non-empty cells and their corners from the starts of the cells."""
+        self.cells = np.nonzero(np.diff(self.starts))[0]
+        cellIndex = np.array(np.unravel_index(self.cells,self.shape))
+        slack = 1e-6*self.cellSize.reshape(3,1) # Cells are widened to hold points rounded across their edges
+        self.cellLower = self.lower.reshape(3,1)+cellIndex*self.cellSize.reshape(3,1)-slack
+        self.cellUpper = self.lower.reshape(3,1)+(cellIndex+1)*self.cellSize.reshape(3,1)+slack
+
+    def extend(self):
+        """Insert the points appended to the table since the index was built or last extended into the existing grid. Points 
+        are inserted only if the grid still covers all of them and the grid holds at most twice the points it was built for, 
+        otherwise the index is left unchanged and has to be rebuilt.
+
+        Returns:
+
+            - extended (bool): True if the index now covers all points of the table.
+
+        """
+        size = len(self.table)
+        if size<self.size:
+            return False
+        coordinates = np.array([self.table.rowRange(key,self.size,size) for key in SpatialIndex.keys],dtype=float)
+        finite = np.all(np.isfinite(coordinates),axis=0)
+        coordinates = coordinates[:,finite]
+        if np.any(coordinates<self.lower.reshape(3,1)) or np.any(coordinates>self.upper.reshape(3,1)):
+            return False
+        if len(self.order)+coordinates.shape[1] > 2*max(self.points,1): # Cells would hold too many points for fast cuts
+            return False
+        rows = self.size+np.nonzero(finite)[0]
+        linear = self._cellOf(coordinates)
+        sort = np.argsort(linear,kind='stable')
+        self.order = np.insert(self.order,self.starts[linear[sort]+1],rows[sort]) # At the end of the points of each cell
+        counts = np.bincount(linear,minlength=int(np.prod(self.shape)))
+        self.starts = self.starts+np.concatenate([[0],np.cumsum(counts)])
+        self._setCells()
+        self.size = size
+        return True
+
+    def query(self,cells):
+        """Rows of the table of the points in all grid cells selected.
+
+        Args:
+
+            - cells (function): Function of the lower and upper corners of the non-empty cells (two arrays of shape (3,n) in qx, qy 
+              and energy) returning true for cells possibly holding points of interest.
+
+        Returns:
+
+            - rows (array): Rows of the points of the cells in the order of the table.
+
+        """
+        selected = self.cells[np.asarray(cells(self.cellLower,self.cellUpper),dtype=bool)]
+        starts = self.starts[selected]
+        lengths = self.starts[selected+1]-starts
+        positions = np.repeat(starts-np.cumsum(lengths)+lengths,lengths)+np.arange(np.sum(lengths))
+        return np.sort(self.order[positions])
+
+
+def filePointTable(datafile,masks=None,precision=None):
+    """Point table of a single converted data file, see PointTable. The table is cached on the file and reused for any 
+    combination of files cut together, until the masks or precision change.
+
+    Args:
+
+        - datafile (DataFile): Converted data file.
+
+    Kwargs:
+
+        - masks (list of Masks): Masks applied together with the masks of the file (default None).
+
+        - precision (string): Floating point type of coordinates and normalization (default None).
+
+    Returns:
+
+        - table (PointTable): Point table of the file.
+
+    """
+    table = datafile.__dict__.get('_pointTable')
+    if table is None or table.key != PointTable.tableKey([datafile],masks,precision):
+        table = datafile._pointTable = PointTable([datafile],masks=masks,precision=precision)
+    return table
+
+
+def load(filename,mmap=True):
+    """Load a DataSet saved by DataSet.save. Intensity, monitor, normalization and coordinates are memory mapped read-only from 
+    the container, so only the parts used are read from disk. DataSets pickled by earlier versions are unpickled.
+
+    Args:
+
+        - filename (string): Location of the saved DataSet.
+
+    Kwargs:
+
+        - mmap (bool): If true, memory map the flat arrays, otherwise read them into memory (default True).
+
+    Returns:
+
+        - dataSet (DataSet): The loaded DataSet.
 
     .. note::
         It is not possible to unpickle an object created in python 3 in python 2 or vice versa.
         
     """
-    try:                                # Opening the given file with an error catch
-        fileObject = open(filename, 'rb')
-    except IOError as e:                        # Catch all IO-errors
-        print("Error in opening file:\n{}".format(e))
-    else:
-        tmp_dict = pickle.load(fileObject)
-        
-        fileObject.close()
-        # TODO: Make checks that the object loaded is of correct format?
-        return tmp_dict
+    if not os.path.isfile(filename):
+        raise AttributeError('File location does not exist({}).'.format(filename))
+    if not hdf.is_hdf5(filename): # Pickled by earlier versions
+        with open(filename, 'rb') as fileObject:
+            return pickle.load(fileObject)
+
+    with hdf.File(filename,'r') as f:
+        if f.attrs.get('format') != 'MJOLNIR DataSet':
+            raise AttributeError('File {} is not a saved DataSet.'.format(filename))
+        state = _readState(f)
+        dataSet = DataSet(precision=state.get('precision'),prefetch=state.get('_prefetch',0),memoryBudget=state.get('memoryBudget'))
+        dataSet._settings.update(state.get('_settings') or {})
+        dataSet.masks = state.get('masks') or []
+        dataSet._normalizationfiles = state.get('_normalizationfiles') or []
+        dataSet._calibrationfiles = state.get('_calibrationfiles') or []
+        dataSet._dataFiles = _readDataFiles(f['dataFiles'],filename,mmap)
+        dataSet._convertedFiles = _readDataFiles(f['convertedFiles'],filename,mmap)
+
+    files = dataSet.convertedFiles if len(dataSet.convertedFiles)!=0 else dataSet.dataFiles
+    if len(files)!=0:
+        dataSet._getData()
+        dataSet.sample = files[0].sample
+    return dataSet
+
+
+_pointFields = ['I','Monitor','Norm']+DataFile.FactorizedCoordinates.fields # Fields written as flat arrays by DataSet.save
+
+def _writeDataFiles(group,files,written,stepsPerChunk=10):
+    """Write data files to a group of a saved DataSet. Point fields are concatenated over all files into one flat array each."""
+    layouts = []
+    for datafile in files:
+        for key,location in list(datafile.__dict__.get('_lazyFields',{}).items()): # Read all but factorized coordinates
+            if location != 'coordinates' and key in datafile._lazyFields:
+                datafile._loadField(key)
+        layout = {}
+        for key in _pointFields:
+            if datafile.isFactorized() and key in DataFile.FactorizedCoordinates.fields:
+                dtype = _tools.computeDtype(datafile._coordinates.precision) or np.dtype(np.float64)
+                layout[key] = (datafile.I.shape,dtype)
+            elif isinstance(datafile.__dict__.get(key),np.ndarray):
+                layout[key] = (datafile.__dict__[key].shape,datafile.__dict__[key].dtype)
+        layouts.append(layout)
+
+    points = group.create_group('points')
+    offsets = [{} for _ in files]
+    for key in _pointFields:
+        sizes = [int(np.prod(layout[key][0])) if key in layout else 0 for layout in layouts]
+        dtypes = [layout[key][1] for layout in layouts if key in layout]
+        if len(dtypes)==0:
+            continue
+        dataset = points.create_dataset(key,shape=(int(np.sum(sizes)),),dtype=np.result_type(*dtypes)) # Contiguous to be memory mapped
+        offset = 0
+        for i,(datafile,size) in enumerate(zip(files,sizes)):
+            if size==0:
+                continue
+            offsets[i][key] = [offset,list(layouts[i][key][0])]
+            if datafile.isFactorized() and key in DataFile.FactorizedCoordinates.fields:
+                perStep = size//layouts[i][key][0][0]
+                for start,stop,coordinates in datafile._coordinates.iterate(stepsPerChunk):
+                    dataset[offset+start*perStep:offset+stop*perStep] = coordinates[key].reshape(-1)
+            else:
+                dataset[offset:offset+size] = datafile.__dict__[key].reshape(-1)
+            offset+=size
+
+    for i,datafile in enumerate(files):
+        state = dict([(key,value) for key,value in datafile.__dict__.items() if not key in list(offsets[i].keys())+['_file','_lazyFields','_coordinates','_calibrationKeys','_pointTable']])
+        if isinstance(state.get('original_file'),DataFile.DataFile):
+            state['original_file'] = state['original_file'].fileLocation
+        fileGroup = group.create_group(str(i))
+        fileGroup.attrs['points'] = json.dumps(offsets[i])
+        _writeState(fileGroup,state,written)
+
+def _readDataFiles(group,fileLocation,mmap):
+    """Read data files from a group of a saved DataSet with point fields as views of the flat arrays."""
+    points = dict([(key,_mapDataset(dataset,fileLocation,mmap)) for key,dataset in group['points'].items()])
+    files = []
+    for i in range(len(group)-1):
+        fileGroup = group[str(i)]
+        state = _readState(fileGroup)
+        for key,(offset,shape) in json.loads(fileGroup.attrs['points']).items():
+            state[key] = points[key][offset:offset+int(np.prod(shape))].reshape(shape)
+        state.update({'_file':None,'_lazyFields':{},'_coordinates':None})
+        datafile = DataFile.DataFile.__new__(DataFile.DataFile)
+        datafile.__setstate__(state) # Registers normalization tables
+        files.append(datafile)
+    return files
+
+def _mapDataset(dataset,fileLocation,mmap=True):
+    """Memory map a contiguous dataset of an HDF5 file read-only, or read it if not possible. Only flat datasets of native 
+    numeric type lying completely inside the file are mapped."""
+    dtype = dataset.dtype
+    offset = dataset.id.get_offset() if dataset.chunks is None else None
+    if not mmap or offset is None or len(dataset.shape)!=1 or not dtype.kind in 'biuf' or not dtype.isnative \
+            or offset+dataset.size*dtype.itemsize > os.path.getsize(fileLocation):
+        return dataset[()]
+    return np.memmap(fileLocation,mode='r',dtype=dtype,offset=offset,shape=dataset.shape)
+
+def _writeState(group,state,written):
+    """Write attributes of an object to an HDF5 group. Arrays are written as datasets, arrays already written are hard linked, 
+    samples, masks and lists of these are written as subgroups and all other values as JSON. Written arrays are kept in written 
+    next to their dataset name, so their id is not reused by another array during the write."""
+    jsonState = {}
+    for key,value in state.items():
+        if isinstance(value,np.generic):
+            value = value.item()
+        if isinstance(value,np.ndarray) and value.dtype.kind in 'biufcSU':
+            if id(value) in written and written[id(value)][0] is value:
+                group[key] = group.file[written[id(value)][1]]
+            else:
+                dataset = group.create_dataset(key,data=np.char.encode(value,'utf-8') if value.dtype.kind=='U' else value)
+                dataset.attrs['unicode'] = value.dtype.kind=='U'
+                written[id(value)] = (value,dataset.name)
+        elif isinstance(value,(DataFile.Sample,Mask.Mask)):
+            subGroup = group.create_group(key)
+            subGroup.attrs['class'] = type(value).__name__
+            _writeState(subGroup,value.__dict__,written)
+        elif isinstance(value,list) and len(value)>0 and np.all([isinstance(item,(np.ndarray,DataFile.Sample,Mask.Mask)) for item in value]):
+            subGroup = group.create_group(key)
+            subGroup.attrs['class'] = 'list'
+            _writeState(subGroup,dict([(str(i),item) for i,item in enumerate(value)]),written)
+        else:
+            try:
+                jsonState[key] = json.loads(json.dumps(value,default=_toJSON))
+            except (TypeError,ValueError):
+                warnings.warn('Attribute {} of type {} cannot be saved and is skipped.'.format(key,type(value)))
+    group.attrs['state'] = json.dumps(jsonState)
+
+def _toJSON(value):
+    if isinstance(value,np.ndarray):
+        return {'__ndarray__':value.tolist()}
+    if isinstance(value,np.generic):
+        return value.item()
+    if isinstance(value,bytes):
+        return value.decode('utf-8','replace')
+    raise TypeError('{} is not JSON serializable'.format(type(value)))
+
+def _fromJSON(value):
+    if isinstance(value,dict):
+        if list(value.keys()) == ['__ndarray__']:
+            return np.array(value['__ndarray__'],dtype=object)
+        return dict([(key,_fromJSON(item)) for key,item in value.items()])
+    if isinstance(value,list):
+        return [_fromJSON(item) for item in value]
+    return value
+
+def _readState(group):
+    """Read attributes of an object written by _writeState."""
+    state = _fromJSON(json.loads(group.attrs['state']))
+    for key,item in group.items():
+        if isinstance(item,hdf.Dataset):
+            value = np.array(item)
+            state[key] = np.char.decode(value,'utf-8') if item.attrs.get('unicode',False) else value
+        elif 'class' in item.attrs:
+            subState = _readState(item)
+            className = item.attrs['class']
+            if className == 'list':
+                state[key] = [subState[str(i)] for i in range(len(subState))]
+            else:
+                module = DataFile if className == 'Sample' else Mask
+                value = getattr(module,className).__new__(getattr(module,className))
+                value.__dict__.update(subState)
+                state[key] = value
+    return state
 
 @_tools.KwargChecker()
 def cut1D(positions,I,Norm,Monitor,q1,q2,width,minPixel,Emin,Emax,plotCoverage=False,extend=True):
@@ -1458,68 +2453,80 @@ def cut1D(positions,I,Norm,Monitor,q1,q2,width,minPixel,Emin,Emax,plotCoverage=F
         - Bin list (3 arrays): Bin edge positions in plane of size (n+1,3), orthogonal positions of bin edges in plane of size (2,2), and energy edges of size (2).
         
     """
-    dirvec = np.array(q2,dtype=float)-np.array(q1,dtype=float)
-    dirLength = np.linalg.norm(dirvec)
-    dirvec/=dirLength
-    orthovec=np.array([dirvec[1],-dirvec[0]])
-    
-    ProjectMatrix = np.array([dirvec,orthovec])
-
-    insideEnergy = np.logical_and(positions[2]<=Emax,positions[2]>=Emin)
-    if(np.sum(insideEnergy)==0):
-        return [np.array(np.array([])),np.array([]),np.array([]),np.array([])],[np.array([]),np.array([]),[Emin,Emax]]
-        #raise AttributeError('No points are within the provided energy limits.')
-
-    positions2D = np.array([positions[0][insideEnergy], positions[1][insideEnergy]])
-    propos = np.dot(ProjectMatrix,positions2D-q1.reshape(2,1))
-    
-    if extend==False: # Only take points between the given q points
-        insideQ = np.logical_and(propos[0]>0,propos[0]<dirLength)
-        propos = propos[:,insideQ]
-
-
-    orthobins = [-width/2.0,width/2.0]
-    insideWidth = np.logical_and(propos[1]<orthobins[1],propos[1]>orthobins[0])
-    
+    Norm,Monitor = broadcastToIntensity(I,Norm,Monitor)
+    propos,inside,insideWidth = _cut1DProjection(positions,q1,q2,width,Emin,Emax,extend=extend)
     lenbins = np.array(_tools.binEdges(propos[0][insideWidth],minPixel))
-    orthopos = np.outer(orthobins,orthovec)
-    binpositions = np.outer(lenbins,dirvec)+q1
-    
-    if len(lenbins)==0:
-        return [np.array(np.array([])),np.array([]),np.array([]),np.array([])],[np.array([]),orthopos,[Emin,Emax]]
-    
-    normcounts = np.histogramdd(propos.T,bins=[lenbins,orthobins],weights=np.ones((propos.shape[1])).flatten())[0]
-
-    if extend==False: # Test both inside energy range AND inside q-limits
-        intensity = np.histogramdd(propos.T,bins=[lenbins,orthobins],weights=I[insideEnergy][insideQ].flatten())[0]
-        MonitorCount=  np.histogramdd(propos.T,bins=[lenbins,orthobins],weights=Monitor[insideEnergy][insideQ].flatten())[0]
-        Normalization= np.histogramdd(propos.T,bins=[lenbins,orthobins],weights=Norm[insideEnergy][insideQ].flatten())[0]
-    else:
-        intensity = np.histogramdd(propos.T,bins=[lenbins,orthobins],weights=I[insideEnergy].flatten())[0]
-        MonitorCount=  np.histogramdd(propos.T,bins=[lenbins,orthobins],weights=Monitor[insideEnergy].flatten())[0]
-        Normalization= np.histogramdd(propos.T,bins=[lenbins,orthobins],weights=Norm[insideEnergy].flatten())[0]
-    
-    EmeanVec = np.ones((len(binpositions),1))*(Emin+Emax)*0.5
-    binpositionsTotal = np.concatenate((binpositions,EmeanVec),axis=1)
+    data = None
+    if len(lenbins)>0:
+        data = _cut1DHistogram(propos,I[inside],Norm[inside],Monitor[inside],lenbins,width)
+    returnData,returnBins = _cut1DResult(data,q1,q2,width,Emin,Emax,lenbins)
    
-    if plotCoverage: # pragma: no cover
+    if plotCoverage and len(lenbins)>0: # pragma: no cover
+        insideEnergy = np.logical_and(positions[2]<=Emax,positions[2]>=Emin)
+        binpositions,orthopos = returnBins[0][:,:2],returnBins[1]
         plt.figure()
-        plt.scatter(positions2D[0],positions2D[1],s=0.5)
+        plt.scatter(positions[0][insideEnergy],positions[1][insideEnergy],s=0.5)
         plt.plot([binpositions[0][0]+orthopos[0][0],binpositions[-1][0]+orthopos[0][0]],[binpositions[0][1]+orthopos[0][1],binpositions[-1][1]+orthopos[0][1]],c='k')
         plt.plot([binpositions[0][0]+orthopos[1][0],binpositions[-1][0]+orthopos[1][0]],[binpositions[0][1]+orthopos[1][1],binpositions[-1][1]+orthopos[1][1]],c='k')
         for i in [0,-1]:
             plt.plot([binpositions[i][0]+orthopos[0][0],binpositions[i][0]+orthopos[1][0]],[binpositions[i][1]+orthopos[0][1],binpositions[i][1]+orthopos[1][1]],c='k')
         for i in range(len(binpositions)):
             plt.plot([binpositions[i][0]+orthopos[0][0],binpositions[i][0]+orthopos[1][0]],[binpositions[i][1]+orthopos[0][1],binpositions[i][1]+orthopos[1][1]],c='k',linewidth=0.5)
-        if extend==False:
-            plt.scatter(positions2D[0][insideQ][insideWidth],positions2D[1][insideQ][insideWidth],s=0.5)
-        else:
-            plt.scatter(positions2D[0][insideWidth],positions2D[1][insideWidth],s=0.5)
+        plt.scatter(positions[0][inside][insideWidth],positions[1][inside][insideWidth],s=0.5)
         ax = plt.gca()
         ax.set_aspect('equal', 'datalim')
         ax.set_xlabel('Qx [1/A]')
         ax.set_ylabel('Qy [1/A]')
-    return [intensity,MonitorCount,Normalization,normcounts],[binpositionsTotal,orthopos,np.array([Emin,Emax])]
+    return returnData,returnBins
+
+def _cut1DProjection(positions,q1,q2,width,Emin,Emax,extend=True):
+    """Project the points within the energy (and q) limits of a 1D cut from q1 to q2 onto the cut direction and its orthogonal, see cut1D.
+
+    Returns:
+
+        - propos (array): Positions along and orthogonal to the cut of size (2,n).
+
+        - inside (array): Indices of the n projected points.
+
+        - insideWidth (array): Mask of projected points within the width of the cut, whose positions along the cut define the bins.
+
+    """
+    q1 = np.array(q1,dtype=float)
+    dirvec = np.array(q2,dtype=float)-q1
+    dirLength = np.linalg.norm(dirvec)
+    dirvec/=dirLength
+    ProjectMatrix = np.array([dirvec,[dirvec[1],-dirvec[0]]])
+
+    inside = np.flatnonzero(np.logical_and(positions[2]<=Emax,positions[2]>=Emin))
+    propos = np.dot(ProjectMatrix,np.array([positions[0][inside],positions[1][inside]])-q1.reshape(2,1))
+    if extend==False: # Only take points between the given q points
+        insideQ = np.logical_and(propos[0]>0,propos[0]<dirLength)
+        propos = propos[:,insideQ]
+        inside = inside[insideQ]
+    insideWidth = np.logical_and(propos[1]<width/2.0,propos[1]>-width/2.0)
+    return propos,inside,insideWidth
+
+def _cut1DHistogram(propos,I,Norm,Monitor,lenbins,width):
+    """Intensity, monitor count, normalization and normalization counts of projected points binned along a 1D cut, see cut1D."""
+    bins = [lenbins,[-width/2.0,width/2.0]]
+    normcounts = np.histogramdd(propos.T,bins=bins,weights=np.ones((propos.shape[1])).flatten())[0]
+    intensity = np.histogramdd(propos.T,bins=bins,weights=I.flatten())[0]
+    MonitorCount=  np.histogramdd(propos.T,bins=bins,weights=Monitor.flatten())[0]
+    Normalization= np.histogramdd(propos.T,bins=bins,weights=Norm.flatten())[0]
+    return [intensity,MonitorCount,Normalization,normcounts]
+
+def _cut1DResult(data,q1,q2,width,Emin,Emax,lenbins):
+    """Return value of cut1D for histograms data binned with the edges lenbins along the cut (empty if lenbins is empty)."""
+    q1 = np.array(q1,dtype=float)
+    dirvec = np.array(q2,dtype=float)-q1
+    dirvec/=np.linalg.norm(dirvec)
+    orthopos = np.outer([-width/2.0,width/2.0],[dirvec[1],-dirvec[0]])
+    if len(lenbins)==0:
+        return [np.array(np.array([])),np.array([]),np.array([]),np.array([])],[np.array([]),orthopos,[Emin,Emax]]
+    binpositions = np.outer(lenbins,dirvec)+q1
+    EmeanVec = np.ones((len(binpositions),1))*(Emin+Emax)*0.5
+    binpositionsTotal = np.concatenate((binpositions,EmeanVec),axis=1)
+    return data,[binpositionsTotal,orthopos,np.array([Emin,Emax])]
 
 
 def cut1DE(positions,I,Norm,Monitor,E1,E2,q,width,minPixel):#,plotCoverage=False):
@@ -1560,21 +2567,13 @@ def cut1DE(positions,I,Norm,Monitor,E1,E2,q,width,minPixel):#,plotCoverage=False
         - Bin list (1 array): Bin edge positions in energy
         
     """
-    if len(q.shape)==1:
-        q.shape = (2,1)
-    distToQ = np.linalg.norm(positions[:2]-q,axis=0)
-
-    inside = distToQ<width
-    
-   
-    
-    insideEnergy = np.logical_and(positions[2]<=E2,positions[2]>=E1)
+    Norm,Monitor = broadcastToIntensity(I,Norm,Monitor)
+    insideEnergy,inside,allInside = _cut1DEMasks(positions,E1,E2,q,width)
     if(np.sum(insideEnergy)==0):
         raise AttributeError('No points are within the provided energy limits.')
     elif(np.sum(inside)==0):
         raise AttributeError('No points are inside selected q range.')
 
-    allInside = np.logical_and(inside,insideEnergy)
     Energies = positions[2][allInside]
     
     
@@ -1583,13 +2582,22 @@ def cut1DE(positions,I,Norm,Monitor,E1,E2,q,width,minPixel):#,plotCoverage=False
     if len(bins)==0:
         return [np.array(np.array([])),np.array([]),np.array([]),np.array([])],[[E1,E2]]
     
-    normcounts = np.histogram(Energies,bins=bins,weights=np.ones_like(Energies).flatten())[0]
-    intensity = np.histogram(Energies,bins=bins,weights=I[allInside].flatten())[0]
-    MonitorCount=  np.histogram(Energies,bins=bins,weights=np.array(Monitor[allInside].flatten(),dtype=np.int64))[0] # Need to change to int64 to avoid overflow
-    Normalization= np.histogram(Energies,bins=bins,weights=Norm[allInside].flatten())[0]
-    
+    return _cut1DEHistogram(Energies,I[allInside],Norm[allInside],Monitor[allInside],bins),[bins]
 
-    return [intensity,MonitorCount,Normalization,normcounts],[bins]
+def _cut1DEMasks(positions,E1,E2,q,width):
+    """Masks of points within the energy limits, within width of q in the plane and within both, see cut1DE."""
+    distToQ = np.linalg.norm(np.array(positions[:2])-np.asarray(q).reshape(2,1),axis=0)
+    inside = distToQ<width
+    insideEnergy = np.logical_and(positions[2]<=E2,positions[2]>=E1)
+    return insideEnergy,inside,np.logical_and(inside,insideEnergy)
+
+def _cut1DEHistogram(Energies,I,Norm,Monitor,bins):
+    """Intensity, monitor count, normalization and normalization counts of points binned in energy, see cut1DE."""
+    normcounts = np.histogram(Energies,bins=bins,weights=np.ones_like(Energies).flatten())[0]
+    intensity = np.histogram(Energies,bins=bins,weights=_tools.accumulationWeights(I.flatten()))[0]
+    MonitorCount=  np.histogram(Energies,bins=bins,weights=np.array(Monitor.flatten(),dtype=np.int64))[0] # Need to change to int64 to avoid overflow
+    Normalization= np.histogram(Energies,bins=bins,weights=_tools.accumulationWeights(Norm.flatten()))[0]
+    return [intensity,MonitorCount,Normalization,normcounts]
 
 
 
@@ -1626,6 +2634,10 @@ def plotCut1D(positions,I,Norm,Monitor,q1,q2,width,minPixel,Emin,Emax,ax=None,pl
     q2 = np.array(q2)
     
     D,P = cut1D(positions,I,Norm,Monitor,q1,q2,width,minPixel,Emin,Emax,plotCoverage,extend=extend)
+    return _plotCut1D(D,P,ax,**kwargs)
+
+def _plotCut1D(D,P,ax=None,**kwargs):
+    """Plot the data D and bins P of a 1D cut, see plotCut1D."""
     INT = np.divide(D[0]*D[3],D[1]*D[2])
     INT_err = np.divide(np.sqrt(D[0])*D[3],D[1]*D[2])
     
@@ -1690,25 +2702,28 @@ def cutPowder(positions,I,Norm,Monitor,EBinEdges,qMinBin=0.01):
         - qbins (n arrays): n arrays holding the bin edges along the lenght of q
 
     """
+    Norm,Monitor = broadcastToIntensity(I,Norm,Monitor)
     qx,qy,energy = positions
     q = np.linalg.norm([qx,qy],axis=0)
-    intensity = []
-    monitorCount = []
-    Normalization = []
-    NormCount = []
+    data = [[],[],[],[]] # intensity, monitorCount, Normalization and NormCount
     qbins = []
     
     for i in range(len(EBinEdges)-1):
         e_inside = np.logical_and(energy>EBinEdges[i],energy<=EBinEdges[i+1])
         q_inside = q[e_inside]
         qbins.append(np.array(_tools.binEdges(q_inside,tolerance=qMinBin)))
-            
-        intensity.append(np.histogram(q_inside,bins=qbins[-1],weights=I[e_inside].flatten())[0].astype(I.dtype))
-        monitorCount.append(np.histogram(q_inside,bins=qbins[-1],weights=Monitor[e_inside].flatten())[0].astype(Monitor.dtype))
-        Normalization.append(np.histogram(q_inside,bins=qbins[-1],weights=Norm[e_inside].flatten())[0].astype(Norm.dtype))
-        NormCount.append(np.histogram(q_inside,bins=qbins[-1],weights=np.ones_like(I[e_inside]).flatten())[0].astype(I.dtype))
+        for values,histogram in zip(data,_cutPowderHistogram(q_inside,I[e_inside],Norm[e_inside],Monitor[e_inside],qbins[-1])):
+            values.append(histogram)
     
-    return [intensity,monitorCount,Normalization,NormCount],qbins
+    return data,qbins
+
+def _cutPowderHistogram(q,I,Norm,Monitor,qbins):
+    """Intensity, monitor count, normalization and normalization counts of points of one energy bin binned in the length of q, see cutPowder."""
+    intensity = np.histogram(q,bins=qbins,weights=_tools.accumulationWeights(I.flatten()))[0].astype(I.dtype)
+    monitorCount = np.histogram(q,bins=qbins,weights=_tools.accumulationWeights(Monitor.flatten()))[0].astype(Monitor.dtype)
+    Normalization = np.histogram(q,bins=qbins,weights=_tools.accumulationWeights(Norm.flatten()))[0].astype(Norm.dtype)
+    NormCount = np.histogram(q,bins=qbins,weights=np.ones_like(I).flatten())[0].astype(I.dtype)
+    return [intensity,monitorCount,Normalization,NormCount]
 
 
 @_tools.KwargChecker(function=plt.pcolormesh)
@@ -1748,7 +2763,13 @@ def plotCutPowder(positions, I,Norm,Monitor,EBinEdges,qMinBin=0.01,ax=None,**kwa
 
     """
     
-    [intensity,monitorCount,Normalization,NormCount],qbins = cutPowder(positions,I,Norm,Monitor,EBinEdges,qMinBin)
+    data,qbins = cutPowder(positions,I,Norm,Monitor,EBinEdges,qMinBin)
+    return _plotCutPowder(EBinEdges,data,qbins,ax,**kwargs)
+
+def _plotCutPowder(EBinEdges,data,qbins,ax=None,**kwargs):
+    """Plot the data and q bins of a powder cut, see plotCutPowder."""
+    EBinEdges = np.asarray(EBinEdges)
+    [intensity,monitorCount,Normalization,NormCount] = data
     Int = [np.divide(intensity[i]*NormCount[i],monitorCount[i]*Normalization[i]) for i in range(len(EBinEdges)-1)]
     
     eMean = 0.5*(EBinEdges[:-1]+EBinEdges[1:])
@@ -1759,6 +2780,8 @@ def plotCutPowder(positions, I,Norm,Monitor,EBinEdges,qMinBin=0.01,ax=None,**kwa
     pmeshs = []
     
     for i in range(len(EBinEdges)-1):
+        if len(qbins[i])<2: # No points within energy bin, e.g. all masked
+            continue
         pmeshs.append(ax.pcolormesh(qbins[i],[EBinEdges[i],EBinEdges[i+1]],Int[i].reshape((len(qbins[i])-1,1)).T,**kwargs))
     
     
@@ -1821,6 +2844,11 @@ def cutQE(positions,I,Norm,Monitor,q1,q2,width,minPix,EnergyBins,extend=True):
         - binDistance (n arrays): n isntances of arrays holding the distance in q to q1.
 
     """
+    cuts = [cut1D(positions,I,Norm,Monitor,q1,q2,width,minPix,EnergyBins[i],EnergyBins[i+1],plotCoverage=False,extend=extend) for i in np.arange(len(EnergyBins)-1)]
+    return _cutQEResult(cuts,q1)
+
+def _cutQEResult(cuts,q1):
+    """Return value of cutQE for the 1D cuts of each energy bin, leaving out energy bins without points."""
     intensityArray = []
     monitorArray = []
     normalizationArray = []
@@ -1829,8 +2857,7 @@ def cutQE(positions,I,Norm,Monitor,q1,q2,width,minPix,EnergyBins,extend=True):
     returnpositions = []
     binDistance = []
     
-    for i in np.arange(len(EnergyBins)-1):
-        [intensity,MonitorCount,Normalization,normcounts],position = cut1D(positions,I,Norm,Monitor,q1,q2,width,minPix,EnergyBins[i],EnergyBins[i+1],plotCoverage=False,extend=extend)
+    for [intensity,MonitorCount,Normalization,normcounts],position in cuts:
         if len(intensity)==0:
             continue
         returnpositions.append(position)
@@ -1873,7 +2900,11 @@ def plotCutQE(positions,I,Norm,Monitor,q1,q2,width,minPix,EnergyBins,ax = None,*
         - binDistance (n arrays): n isntances of arrays holding the distance in q to q1.
     """
 
-    [intensityArray,monitorArray,normalizationArray,normcountArray],returnpositions,centerPos,binDistance = cutQE(positions,I,Norm,Monitor,q1,q2,width,minPix,EnergyBins)
+    return _plotCutQE(q1,q2,cutQE(positions,I,Norm,Monitor,q1,q2,width,minPix,EnergyBins),ax,**kwargs)
+
+def _plotCutQE(q1,q2,cut,ax=None,**kwargs):
+    """Plot the return value cut of cutQE, see plotCutQE."""
+    [intensityArray,monitorArray,normalizationArray,normcountArray],returnpositions,centerPos,binDistance = cut
     
     if ax is None:
         plt.figure()
@@ -1977,7 +3008,7 @@ def createRLUAxes(Dataset,figure=None): # pragma: no cover
     return ax
 
 #@_tools.KwargChecker(function=plt.pcolormesh)
-def plotQPlane(I,Monitor,Norm,pos,EMin,EMax,binning='xy',xBinTolerance=0.05,yBinTolerance=0.05,enlargen=False,log=False,ax=None,**kwargs):
+def plotQPlane(I,Monitor,Norm,pos,EMin,EMax,binning='xy',xBinTolerance=0.05,yBinTolerance=0.05,enlargen=False,log=False,ax=None,xRange=None,**kwargs):
     """Plotting tool to show binned intensities in the Q plane between provided energies.
     
     Args:
@@ -2007,6 +3038,8 @@ def plotQPlane(I,Monitor,Norm,pos,EMin,EMax,binning='xy',xBinTolerance=0.05,yBin
         - log (bool): Plot intensities as the logarithm (defautl False).
         
         - ax (matplotlib axes): Axes in which the data is plotted (default None). If None, the function creates a new axes object.
+
+        - xRange (2 floats): Lower and upper x of the bins if enlargen is false (default None, i.e. the range of x of all points).
         
         - other: Other key word arguments are passed to the pcolormesh plotting algorithm.
         
@@ -2019,6 +3052,7 @@ def plotQPlane(I,Monitor,Norm,pos,EMin,EMax,binning='xy',xBinTolerance=0.05,yBin
         
         
     """
+    Norm,Monitor = broadcastToIntensity(I,Norm,Monitor)
     qx,qy,energy=pos
 
 
@@ -2071,15 +3105,15 @@ def plotQPlane(I,Monitor,Norm,pos,EMin,EMax,binning='xy',xBinTolerance=0.05,yBin
             if enlargen:
                 xbins = _tools.binEdges(x_inside,tolerance=xBinTolerance)
             else:
-                xbins = np.arange(np.min(x),np.max(x),xBinTolerance)
+                xbins = np.arange(np.min(x),np.max(x),xBinTolerance) if xRange is None else np.arange(xRange[0],xRange[1],xBinTolerance)
                 
             if len(xbins)==0:
                 continue
             bins.append(np.array([xbins,np.array([yBins[j],yBins[j+1]])]))
             
-            intensity.append(np.histogram(x_inside,bins=bins[-1][0],weights=I[ey_inside].flatten())[0].astype(I.dtype))
-            monitorCount.append(np.histogram(x_inside,bins=bins[-1][0],weights=Monitor[ey_inside].flatten())[0].astype(Monitor.dtype))
-            Normalization.append(np.histogram(x_inside,bins=bins[-1][0],weights=Norm[ey_inside].flatten())[0].astype(Norm.dtype))
+            intensity.append(np.histogram(x_inside,bins=bins[-1][0],weights=_tools.accumulationWeights(I[ey_inside].flatten()))[0].astype(I.dtype))
+            monitorCount.append(np.histogram(x_inside,bins=bins[-1][0],weights=_tools.accumulationWeights(Monitor[ey_inside].flatten()))[0].astype(Monitor.dtype))
+            Normalization.append(np.histogram(x_inside,bins=bins[-1][0],weights=_tools.accumulationWeights(Norm[ey_inside].flatten()))[0].astype(Norm.dtype))
             NormCount.append(np.histogram(x_inside,bins=bins[-1][0],weights=np.ones_like(I[ey_inside]).flatten())[0].astype(I.dtype))
 
     warnings.simplefilter('ignore')
@@ -2227,8 +3261,13 @@ def plotA3A4(files,ax=None,planes=[],binningDecimals=3,log=False,returnPatches=F
     #def getData(files,numFiles):
     Ishape = files[0].I.shape
     IAll = np.array([files[i].I for i in range(numFiles)]) # into shape sum(A3),104,64 for CAMEA ## np.array([files[i].I[:,0,0,:,:].reshape((A3All[i].size,Ishape[3],Ishape[4])) for i in range(numFiles)])
-    NormAll = np.array([files[i].Norm for i in range(numFiles)]) ## np.array([files[i].Norm[:,0,0,:,:].reshape((A3All[i].size,Ishape[3],Ishape[4])) for i in range(numFiles)])
-    MonitorAll = np.array([files[i].Monitor for i in range(numFiles)]) ## np.array([files[i].Monitor[:,0,0,:,:].reshape((A3All[i].size,Ishape[3],Ishape[4])) for i in range(numFiles)])
+    NormAll,MonitorAll = broadcastToIntensity(IAll,[files[i].Norm for i in range(numFiles)],[files[i].Monitor for i in range(numFiles)])
+    NormAll = np.array(NormAll) ## np.array([files[i].Norm[:,0,0,:,:].reshape((A3All[i].size,Ishape[3],Ishape[4])) for i in range(numFiles)])
+    MonitorAll = np.array(MonitorAll) ## np.array([files[i].Monitor[:,0,0,:,:].reshape((A3All[i].size,Ishape[3],Ishape[4])) for i in range(numFiles)])
+    for i in range(numFiles): # Masked points are shown without monitor, as when the monitor was set to zero on conversion
+        bitmap = files[i].maskBitmap()
+        if not bitmap is None:
+            MonitorAll[i] = np.where(np.broadcast_to(bitmap,np.shape(MonitorAll[i])),0,MonitorAll[i])
     
     if not ax is None:
         if not singleFigure and len(ax) != Ishape[2] and len(planes) == 0: # Plot all planes in provided axes
@@ -3097,6 +4136,60 @@ def convexHullPoints(A3,A4):
     bound = hullPoints.points[hullPoints.vertices].T
     return PolygonS(bound.T)
 
+def _convertAndSave(rawfile,binnings,saveLocations,force=False,saveOptions=None,factorized=False,precision=None):
+    """Convert a raw data file into the given binnings and save the converted files where location is not None. Unless forced, 
+    saved files with a conversion fingerprint matching the raw file are loaded instead of converted again. Saved files are 
+    not reused for factorized conversions as they would be loaded with fully calculated coordinates."""
+    convFiles = [None]*len(binnings)
+    for i,(b,saveloc) in enumerate(zip(binnings,saveLocations)):
+        if force or factorized or saveloc is None or not os.path.isfile(saveloc):
+            continue
+        if DataFile.readConversionFingerprint(saveloc) == rawfile.conversionFingerprint(b):
+            convFiles[i] = DataFile.DataFile(saveloc,precision=precision)
+            convFiles[i].original_file = rawfile
+
+    missing = [i for i in range(len(binnings)) if convFiles[i] is None]
+    if len(missing)>0:
+        for i,convFile in zip(missing,rawfile.convert([binnings[i] for i in missing],factorized=factorized,precision=precision)):
+            if not saveLocations[i] is None:
+                convFile.saveNXsqom(saveLocations[i],**({} if saveOptions is None else saveOptions))
+            convFiles[i] = convFile
+    return convFiles
+
+def _convertWorker(task):
+    """Convert a single file in DataSet.convertDataFile, serially or on the process pool. Returns converted files and error message (None if successful)."""
+    rawfile = task[0]
+    try:
+        convFiles = _convertAndSave(*task)
+    except Exception as e:
+        return None,'{}: {}'.format(rawfile.name,e)
+    for convFile in convFiles:
+        convFile.original_file = None # Parent process holds the raw file, no need to send it back
+    return convFiles,None
+
+def broadcastToIntensity(I,*arrays):
+    """Broadcast arrays stored in compact shapes to the shape of the intensity without copying. Converted files store the monitor 
+    with shape (steps,1,1) and the normalization with shape (1,detectors,pixels) as these depend only on step and pixel respectively.
+
+    Args:
+
+        - I (array or list of arrays): Intensity of one or more files.
+
+        - arrays (arrays or lists of arrays): Arrays to broadcast, e.g. normalization and monitor.
+
+    Returns:
+
+        - arrays (list): Read-only views of the arrays with the shape of the intensity, lists if intensity is a list or object array.
+
+    """
+    returnArrays = []
+    for array in arrays:
+        if isinstance(I,np.ndarray) and not I.dtype == object:
+            returnArrays.append(np.broadcast_to(np.asarray(array),I.shape))
+        else:
+            returnArrays.append([np.broadcast_to(a,np.shape(i)) for a,i in zip(array,I)])
+    return returnArrays
+
 def isListOfStrings(object):
     if isinstance(object, list):
         isListOfStr = True
@@ -3113,23 +4206,96 @@ def isListOfStrings(object):
     else:
         raise AttributeError('Data files provided are not a list of strings or string!')
     
-def isListOfDataFiles(inputFiles):
-    returnList = []
-    if isinstance(inputFiles,list):
-        for file in inputFiles:
-            if isinstance(file,DataFile.DataFile):
-                returnList.append(file)
-            elif isinstance(file,str):
-                # Check if file exists
-                if not os.path.isfile(file):
-                    raise AttributeError('Following file do not exist:\n{}'.format(file))
-                returnList.append(DataFile.DataFile(file))
-    elif isinstance(inputFiles,DataFile.DataFile):
-        returnList.append(inputFiles)
-    elif isinstance(inputFiles,str):
-        returnList.append(DataFile.DataFile(inputFiles))
-    else:
+def loadDataFiles(fileLocations,loadOptions=None,prefetch=0,timing=None):
+    """Load data files in order while reading the following files on threads. At most prefetch files are read ahead of the file 
+    handed to the caller, bounding the memory held by files read but not yet processed.
+
+    Args:
+
+        - fileLocations (list of strings): Locations of the data files.
+
+    Kwargs:
+
+        - loadOptions (dict): Keyword arguments passed on to DataFile (default None).
+
+        - prefetch (int): Number of files read ahead, e.g. 4. If 0, files are read one by one when requested (default 0).
+
+        - timing (dict): If given, 'files', 'io' and 'wait' are increased by the number of files, the time spent reading them 
+          (summed over all threads) and the time the caller waited for them (default None).
+
+    Returns:
+
+        - dataFiles (generator): Loaded DataFiles in the order of the locations.
+
+    """
+    if loadOptions is None:
+        loadOptions = {}
+    def read(location):
+        start = time.time()
+        datafile = DataFile.DataFile(location,**loadOptions)
+        return datafile,time.time()-start
+
+    def readAhead(location): # Read on a thread, the result or error is put in the returned queue
+        result = queue.Queue(maxsize=1)
+        def target():
+            try:
+                result.put((read(location),None))
+            except Exception as error:
+                result.put((None,error))
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+        return thread,result
+
+    def record(ioTime,waitTime):
+        if not timing is None:
+            for key,value in [('files',1),('io',ioTime),('wait',waitTime)]:
+                timing[key] = timing.get(key,0)+value
+
+    if prefetch<1:
+        for location in fileLocations:
+            datafile,ioTime = read(location)
+            record(ioTime,ioTime)
+            yield datafile
+        return
+
+    locations = iter(fileLocations)
+    pending = collections.deque()
+    try:
+        for location in itertools.islice(locations,prefetch):
+            pending.append(readAhead(location))
+        while len(pending)>0:
+            start = time.time()
+            thread,result = pending.popleft()
+            loaded,error = result.get()
+            if not error is None:
+                raise error
+            datafile,ioTime = loaded
+            record(ioTime,time.time()-start)
+            for location in itertools.islice(locations,1): # Keep prefetch files in flight
+                pending.append(readAhead(location))
+            yield datafile
+    finally:
+        for thread,_ in pending: # Files already being read are finished before returning
+            thread.join()
+
+def isListOfDataFiles(inputFiles,loadOptions=None,prefetch=0,timing=None):
+    if isinstance(inputFiles,(str,DataFile.DataFile)):
+        inputFiles = [inputFiles]
+    elif not isinstance(inputFiles,list):
         raise AttributeError('File provided is not of type string, list, or DataFile')
+    locations = [file for file in inputFiles if isinstance(file,str)]
+    for file in locations: # Check if files exist before reading any of them
+        if not os.path.isfile(file):
+            raise AttributeError('Following file do not exist:\n{}'.format(file))
+    loaded = loadDataFiles(locations,loadOptions=loadOptions,prefetch=prefetch,timing=timing)
+    returnList = []
+    for file in inputFiles:
+        if isinstance(file,DataFile.DataFile):
+            returnList.append(file)
+        elif isinstance(file,str):
+            returnList.append(next(loaded))
+    loaded.close()
     if len(returnList)>1:
         sameSample = [returnList[0].sample==file.sample for file in returnList]
         if not np.all(sameSample):
@@ -3275,6 +4441,10 @@ def binData3D(dx,dy,dz,pos,data,norm=None,mon=None,bins=None):
 
     if bins is None:
         bins = calculateBins(dx,dy,dz,pos)
+    if not mon is None:
+        mon, = broadcastToIntensity(data,mon)
+    if not norm is None:
+        norm, = broadcastToIntensity(data,norm)
     if len(pos[0].shape)>1: # Flatten positions
         pos = np.array([x.flatten() for x in pos])
     #NonNaNs = 1-np.isnan(data.flatten())
@@ -3295,6 +4465,149 @@ def binData3D(dx,dy,dz,pos,data,norm=None,mon=None,bins=None):
 
     return returndata,bins
 
+def binDataFiles3D(dx,dy,dz,files,stepsPerChunk=10,masks=None):
+    """3D binning of converted data files in chunks of scan steps. Coordinates of the files are only calculated for one chunk at 
+    a time (factorized coordinates are calculated twice, once to find the binning range and once when binning).
+
+    Args:
+
+        - dx (float): Step size in x (required).
+
+        - dy (float): Step size in y (required).
+
+        - dz (float): Step size in z (required).
+
+        - files (list of DataFiles): Converted data files to be binned (required).
+
+    Kwargs:
+
+        - stepsPerChunk (int): Number of scan steps binned at a time (default 10).
+
+        - masks (list of Masks): Masks applied together with the masks of the files. Masked points are not binned (default None).
+
+    Returns:
+
+        - Datalist: Rebinned intensity, Monitor, Normalization and Normalization count.
+
+        - bins: 3 arrays containing edge positions in x, y, and z directions.
+
+    """
+    keys = ['qx','qy','energy']
+    ranges = [[np.inf,-np.inf] for _ in keys]
+    for chunk in iterateDataFiles(files,stepsPerChunk=stepsPerChunk,masks=masks):
+        for i,key in enumerate(keys):
+            ranges[i] = [min(ranges[i][0],np.min(chunk[key])),max(ranges[i][1],np.max(chunk[key]))]
+    bins = calculateBins(dx,dy,dz,ranges)
+
+    returnData = None
+    for chunk in iterateDataFiles(files,stepsPerChunk=stepsPerChunk,masks=masks):
+        data,_ = binData3D(dx,dy,dz,[chunk[key] for key in keys],chunk['I'],norm=chunk['Norm'],mon=chunk['Monitor'],bins=bins)
+        if returnData is None:
+            dtypes = [part.dtype for part in data]
+            returnData = [_tools.accumulationWeights(part) for part in data] # Chunks are summed in float64 and int64
+        else:
+            returnData = [total+part for total,part in zip(returnData,data)]
+    return [total.astype(dtype) for total,dtype in zip(returnData,dtypes)],bins
+
+def iterateDataFiles(files,stepsPerChunk=10,masks=None):
+    """Iterate through the unmasked points of converted data files in chunks of scan steps, file by file in the order of the 
+    points of the DataSet, see DataFile.iterateFlat.
+
+    Args:
+
+        - files (list of DataFiles): Converted data files.
+
+    Kwargs:
+
+        - stepsPerChunk (int): Number of scan steps in each chunk (default 10).
+
+        - masks (list of Masks): Masks applied together with the masks of the files (default None).
+
+    Returns:
+
+        - chunks (generator): Dictionaries of flattened I, Monitor, Norm, qx, qy, energy, h, k and l of the unmasked points of 
+          each chunk. Chunks without unmasked points are skipped.
+
+    """
+    for datafile in files:
+        bitmap = datafile.maskBitmap(masks)
+        if not bitmap is None:
+            bitmap = np.broadcast_to(bitmap,datafile.I.shape)
+        for i,chunk in enumerate(datafile.iterateFlat(stepsPerChunk=stepsPerChunk)):
+            if not bitmap is None:
+                keep = np.logical_not(bitmap[i*stepsPerChunk:(i+1)*stepsPerChunk].flatten())
+                chunk = dict([(key,value[keep]) for key,value in chunk.items()])
+            if len(chunk['I'])>0:
+                yield chunk
+
+_bytesPerPoint = 128 # Flattened fields of a chunk and temporaries of cuts and binning
+
+def memoryStepsPerChunk(files,memoryBudget):
+    """Number of scan steps per chunk for which the points of a chunk of any of the files fit in the memory budget.
+
+    Args:
+
+        - files (list of DataFiles): Converted data files.
+
+        - memoryBudget (int): Memory in bytes.
+
+    Returns:
+
+        - stepsPerChunk (int): Number of scan steps, at least 1.
+
+    """
+    pointsPerStep = np.max([1]+[int(np.prod(datafile.I.shape[1:])) for datafile in files])
+    return int(max(1,memoryBudget//(_bytesPerPoint*pointsPerStep)))
+
+def _lineSelection(q1,q2,width,Emin,Emax,extend=True):
+    """Select points possibly contributing to 1D cuts from q1 to q2, see cut1D. The selection is slightly wider than the cut, 
+    so no point of the cut is lost to rounding, while the cut itself removes the rest as it would in memory."""
+    q1 = np.array(q1,dtype=float)
+    dirvec = np.array(q2,dtype=float)-q1
+    dirLength = np.linalg.norm(dirvec)
+    dirvec/=dirLength
+    slack = 1e-6*(1.0+width+dirLength)
+    def select(qx,qy,energy):
+        along = (qx-q1[0])*dirvec[0]+(qy-q1[1])*dirvec[1]
+        ortho = (qx-q1[0])*dirvec[1]-(qy-q1[1])*dirvec[0]
+        keep = np.logical_and(np.logical_and(energy>=Emin,energy<=Emax),np.abs(ortho)<=0.5*width+slack)
+        if extend==False:
+            keep = np.logical_and(keep,np.logical_and(along>=-slack,along<=dirLength+slack))
+        return keep
+    def cells(lower,upper): # Grid cells possibly holding selected points, see SpatialIndex
+        center,half = 0.5*(lower+upper),0.5*(upper-lower)
+        along = (center[0]-q1[0])*dirvec[0]+(center[1]-q1[1])*dirvec[1]
+        ortho = (center[0]-q1[0])*dirvec[1]-(center[1]-q1[1])*dirvec[0]
+        keep = np.logical_and(np.logical_and(upper[2]>=Emin,lower[2]<=Emax),
+                              np.abs(ortho)<=0.5*width+slack+half[0]*np.abs(dirvec[1])+half[1]*np.abs(dirvec[0]))
+        if extend==False:
+            reach = slack+half[0]*np.abs(dirvec[0])+half[1]*np.abs(dirvec[1])
+            keep = np.logical_and(keep,np.logical_and(along>=-reach,along<=dirLength+reach))
+        return keep
+    select.cells = cells
+    return select
+
+def _energySelection(Emin,Emax):
+    """Select points with energies between Emin and Emax, see cutPowder and plotQPlane."""
+    def select(qx,qy,energy):
+        return np.logical_and(energy>=Emin,energy<=Emax)
+    def cells(lower,upper):
+        return np.logical_and(upper[2]>=Emin,lower[2]<=Emax)
+    select.cells = cells
+    return select
+
+def _pointSelection(q,width):
+    """Select points possibly within width of the point q in the plane, see cut1DE."""
+    q = np.array(q,dtype=float).reshape(-1)
+    slack = 1e-6*(1.0+width)
+    def select(qx,qy,energy):
+        return np.linalg.norm([qx-q[0],qy-q[1]],axis=0)<=width+slack
+    def cells(lower,upper): # Distance from q to the cell in the plane
+        distance = [np.maximum(0.0,np.maximum(lower[i]-q[i],q[i]-upper[i])) for i in range(2)]
+        return np.linalg.norm(distance,axis=0)<=width+slack
+    select.cells = cells
+    return select
+
 def calculateBins(dx,dy,dz,pos):
     diffx = np.abs(np.max(pos[0])-np.min(pos[0]))
     diffy = np.abs(np.max(pos[1])-np.min(pos[1]))
@@ -3315,18 +4628,6 @@ def calculateBins(dx,dy,dz,pos):
     bins=[XX,YY,ZZ]
     return bins
 
-def getNX_class(x,y,attribute):
-    try:
-        variableType = y.attrs['NX_class']
-    except:
-        variableType = ''
-    if variableType==attribute:
-        return x
-
-def getInstrument(file):
-    location = file.visititems(lambda x,y: getNX_class(x,y,b'NXinstrument'))
-    return file.get(location)
-
 def fmt(x, pos):
     a, b = '{:.2e}'.format(x).split('e')
     b = int(b)
@@ -3505,6 +4806,42 @@ def test_DataSet_SaveLoad():
     os.remove(temp)
     assert(D1==D2) 
 
+def test_DataSet_SaveLoad_Converted():
+    dataFiles = ['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf']
+    D1 = DataSet(convertedFiles=[DataFile.DataFile(file).convert(binning=8) for file in dataFiles])
+    D1.addMask(Mask.DetectorMask(3))
+    factorized = DataSet(convertedFiles=[DataFile.DataFile(file).convert(binning=8,factorized=True) for file in dataFiles])
+
+    temp = 'temporary.bin'
+    try:
+        D1.save(temp)
+        D2 = load(temp)
+        assert(D1==D2)
+        assert(isinstance(D2.convertedFiles[0].I,np.memmap))
+        if D2.convertedFiles[0].I.shape == D2.convertedFiles[1].I.shape: # Stacked as a view of the memory map
+            assert(np.shares_memory(D2.I,D2.convertedFiles[1].I) and not D2.I.flags['WRITEABLE'])
+        for key in ['I','qx','qy','energy','h','k','l','Norm','Monitor','a3','Ei']:
+            assert(np.allclose(getattr(D1,key),getattr(D2,key),equal_nan=True))
+        assert(isinstance(D2.masks[0],Mask.DetectorMask) and np.all(D2.masks[0].detectors == [3]))
+        assert(D2.sample.name == D1.sample.name)
+        assert(D2.convertedFiles[0].instrumentCalibrationEf is D2.convertedFiles[1].instrumentCalibrationEf) # Shared table
+
+        cut1 = D1.cut1D(np.array([0,0]),np.array([0.5,0.5]),0.1,0.01,0.5,1.5)
+        cut2 = D2.cut1D(np.array([0,0]),np.array([0.5,0.5]),0.1,0.01,0.5,1.5)
+        for x,y in zip(cut1[0],cut2[0]):
+            assert(np.allclose(x,y,equal_nan=True))
+
+        factorized.save(temp) # Coordinates are calculated in chunks while saving, D2 keeps mapping the replaced container
+        D3 = load(temp,mmap=False)
+        assert(not D3.convertedFiles[0].isFactorized())
+        assert(not isinstance(D3.convertedFiles[0].qx,np.memmap))
+        assert(np.allclose(D3.qx,D1.qx))
+        assert(np.allclose(D2.qx,D1.qx))
+        del D2
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
 def test_DataSet_str():
     D1 = DataSet(dataFiles='Data/camea2018n000038.hdf')#,normalizationfiles = 'TestData/VanNormalization.hdf')
     string = str(D1)
@@ -3541,6 +4878,532 @@ def test_DataSet_Convert_Data():
     
 
 
+def test_DataSet_Convert_Data_MultipleBinnings():
+    import tempfile, shutil
+    dataFiles = 'Data/camea2018n000017.hdf'
+    saveLocation = tempfile.mkdtemp()
+    try:
+        dataset = DataSet(dataFiles=dataFiles)
+        convertedFiles = dataset.convertDataFile(binning=[1,3],saveLocation=saveLocation,saveFile=True)
+        assert(len(convertedFiles)==2)
+        assert(dataset.convertedFiles[0] is convertedFiles[0][0])
+        for binning,files in zip([1,3],convertedFiles):
+            assert(files[0].binning == binning)
+            assert(files[0].I.shape == (3,104,8*binning))
+            saved = DataFile.DataFile(os.path.join(saveLocation,'camea2018n000017_binning{}.nxs'.format(binning)))
+            assert(saved.binning == binning)
+            assert(np.all(saved.I == files[0].I))
+    finally:
+        shutil.rmtree(saveLocation)
+
+def test_DataSet_Convert_Data_Parallel():
+    import tempfile, shutil
+    dataFiles = ['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf']
+    saveLocation = tempfile.mkdtemp()
+    try:
+        serial = DataSet(dataFiles=dataFiles)
+        serial.convertDataFile(binning=8,saveFile=False)
+
+        parallel = DataSet(dataFiles=dataFiles)
+        parallel.convertDataFile(binning=8,saveLocation=saveLocation,saveFile=True,workers=2)
+        assert(len(parallel.convertedFiles)==2)
+        for serialFile,parallelFile,rawFile in zip(serial.convertedFiles,parallel.convertedFiles,parallel.dataFiles):
+            assert(parallelFile.name == serialFile.name)
+            assert(parallelFile.original_file is rawFile)
+            assert(np.all(parallelFile.I == serialFile.I))
+            assert(np.all(np.isclose(parallelFile.qx,serialFile.qx,equal_nan=True)))
+            saved = DataFile.DataFile(os.path.join(saveLocation,parallelFile.name))
+            assert(np.all(saved.I == serialFile.I))
+
+        for workers in [1,2]:
+            failing = DataSet(dataFiles=dataFiles)
+            try:
+                failing.convertDataFile(binning=100,saveFile=False,workers=workers) # Binning not present in files
+                assert False
+            except AttributeError as e:
+                assert('2 of 2' in str(e)) # Serial conversion continues after the first failure as well
+                assert('camea2018n000137.hdf' in str(e))
+            assert(len(failing.convertedFiles)==0)
+    finally:
+        shutil.rmtree(saveLocation)
+
+def test_DataSet_Convert_Data_SkipCurrent():
+    import tempfile, shutil
+    dataFiles = 'Data/camea2018n000136.hdf'
+    saveLocation = tempfile.mkdtemp()
+    try:
+        ds = DataSet(dataFiles=dataFiles)
+        ds.convertDataFile(binning=8,saveLocation=saveLocation,saveFile=True)
+        savedFile = os.path.join(saveLocation,'camea2018n000136.nxs')
+        fingerprint = DataFile.readConversionFingerprint(savedFile)
+        assert(fingerprint == ds.dataFiles[0].conversionFingerprint(8))
+        assert(ds.convertedFiles[0].fingerprint == fingerprint)
+        mtime = os.stat(savedFile).st_mtime
+
+        reused = DataSet(dataFiles=dataFiles)
+        reused.convertDataFile(binning=8,saveLocation=saveLocation,saveFile=True) # Up to date, file is loaded
+        assert(os.stat(savedFile).st_mtime == mtime)
+        assert(not os.path.exists(savedFile+'_old'))
+        assert(reused.convertedFiles[0].original_file is reused.dataFiles[0])
+        assert(np.all(reused.convertedFiles[0].I == ds.convertedFiles[0].I))
+        assert(np.all(np.isclose(reused.I,ds.I,equal_nan=True)))
+
+        reused.convertDataFile(binning=8,saveLocation=saveLocation,saveFile=True,factorized=True) # Factorized files are converted
+        assert(os.path.exists(savedFile+'_old'))
+        os.remove(savedFile+'_old')
+
+        reused.convertDataFile(binning=[8,1],saveLocation=saveLocation,saveFile=True) # Other binnings are not current
+        assert(DataFile.readConversionFingerprint(os.path.join(saveLocation,'camea2018n000136_binning1.nxs')) == reused.dataFiles[0].conversionFingerprint(1))
+
+        reused.dataFiles[0].A3Off = 1.0 # Changed offset needs new conversion
+        assert(not reused.dataFiles[0].conversionFingerprint(8) == fingerprint)
+        reused.convertDataFile(binning=8,saveLocation=saveLocation,saveFile=True)
+        assert(os.path.exists(savedFile+'_old'))
+        os.remove(savedFile+'_old')
+
+        reused.convertDataFile(binning=8,saveLocation=saveLocation,saveFile=True,force=True)
+        assert(os.path.exists(savedFile+'_old'))
+    finally:
+        shutil.rmtree(saveLocation)
+
+def test_DataSet_broadcastToIntensity():
+    I = np.random.rand(2,5,3,4)
+    Norm = np.random.rand(2,1,3,4)
+    Monitor = np.random.rand(2,5,1,4)
+    NormB,MonitorB = broadcastToIntensity(I,Norm,Monitor)
+    assert(NormB.shape == I.shape and MonitorB.shape == I.shape)
+    assert(np.all(NormB[:,3] == Norm[:,0]) and np.all(MonitorB[:,:,2] == Monitor[:,:,0]))
+    assert(np.shares_memory(NormB,Norm)) # No copy
+
+    IList = [I[0],I[1,:2]] # Files with different number of steps
+    NormB,MonitorB = broadcastToIntensity(IList,Norm,[Monitor[0],Monitor[1,:2]])
+    assert(NormB[1].shape == (2,3,4) and MonitorB[1].shape == (2,3,4))
+
+    full, = broadcastToIntensity(I,I) # Full size arrays are returned unchanged
+    assert(np.all(full == I))
+
+    ds = DataSet(dataFiles=['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf'])
+    ds.convertDataFile(binning=8,saveFile=False)
+    df = ds.convertedFiles[0]
+    assert(df.Norm.shape == (1,)+df.I.shape[1:] and df.Monitor.shape == (df.I.shape[0],1,1))
+    assert(ds.Norm.shape == ds.I.shape and ds.Monitor.shape == ds.I.shape) # Views in the shape of the intensity
+    assert(ds.Norm.strides[1] == 0 and ds.Monitor.strides[2] == 0 and not ds.Norm.flags['WRITEABLE']) # Not copied along steps and detectors
+    Data,bins = ds.binData3D(0.1,0.1,0.5)
+    ds.Norm,ds.Monitor = [np.array(x) for x in broadcastToIntensity(ds.I,ds.Norm,ds.Monitor)] # Full size arrays as stored previously
+    DataFull,binsFull = ds.binData3D(0.1,0.1,0.5)
+    for compact,full in zip(Data,DataFull):
+        assert(np.all(np.isclose(compact,full,equal_nan=True)))
+
+def test_DataSet_factorizedCoordinates():
+    files = ['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf']
+    ds = DataSet(dataFiles=files)
+    ds.convertDataFile(binning=8,saveFile=False)
+    dsFactorized = DataSet(dataFiles=files)
+    dsFactorized.convertDataFile(binning=8,saveFile=False,factorized=True)
+    assert(not 'qx' in dsFactorized.__dict__)
+
+    Data,bins = ds.binData3D(0.1,0.1,0.5)
+    DataFactorized,binsFactorized = dsFactorized.binData3D(0.1,0.1,0.5)
+    assert(np.all([datafile.isFactorized() for datafile in dsFactorized.convertedFiles])) # Binned in chunks
+    for full,factorized in zip(Data+bins,DataFactorized+binsFactorized):
+        assert(np.all(np.isclose(full,factorized,equal_nan=True)))
+
+    assert(np.all(np.isclose(dsFactorized.energy,ds.energy))) # Calculated on first access
+    assert('energy' in dsFactorized.__dict__)
+
+def test_DataSet_loadOptions():
+    fileName = 'Data/camea2018n000017.nxs'
+    DataFile.assertFile(fileName)
+    ds = DataSet(convertedFiles=fileName,loadOptions={'steps':slice(0,2),'detectors':range(13)}) # File holds 3 steps
+    assert(ds.I.shape[1:3] == (2,13))
+    assert(ds.qx.shape == ds.I.shape)
+    assert(np.all(ds.I[0] == DataFile.DataFile(fileName).I[:2,:13]))
+
+def test_DataSet_precision():
+    files = ['Data/camea2018n000136.hdf']
+    ds64 = DataSet(dataFiles=files,precision='float64')
+    ds64.convertDataFile(binning=8,saveFile=False)
+    ds32 = DataSet(dataFiles=files,precision='float32')
+    ds32.convertDataFile(binning=8,saveFile=False)
+    for key in ['qx','qy','energy','h','k','l','Norm']:
+        assert(getattr(ds64,key).dtype == np.float64 and getattr(ds32,key).dtype == np.float32)
+        assert(np.all(np.isclose(getattr(ds32,key),getattr(ds64,key),rtol=1e-5,atol=1e-5,equal_nan=True)))
+    assert(ds32.I.dtype == ds64.I.dtype)
+
+    Data64,bins64 = ds64.binData3D(0.1,0.1,0.5)
+    Data32,bins32 = ds32.binData3D(0.1,0.1,0.5)
+    assert(Data32[2].dtype == np.float32)
+    assert(np.isclose(np.sum(Data32[0]),np.sum(Data64[0]),rtol=1e-3)) # Few points may change bin at the edges
+    assert(np.isclose(np.nansum(Data32[2]),np.nansum(Data64[2]),rtol=1e-3))
+
+    q = np.array([1.23,-1.25]).reshape(2,1)
+    cuts = []
+    for ds in [ds64,ds32]:
+        I,qx,qy,energy,Norm,Monitor = ds.I.flatten(),ds.qx.flatten(),ds.qy.flatten(),ds.energy.flatten(),ds.Norm.flatten(),ds.Monitor.flatten()
+        cuts.append(cut1DE(positions=[qx,qy,energy],I=I,Norm=Norm,Monitor=Monitor,E1=2.0,E2=3.0,q=q,width=0.1,minPixel=0.01)[0])
+    assert(np.sum(cuts[0][3])>0) # Not an empty cut
+    for cut64,cut32 in zip(*cuts):
+        assert(np.all(np.isclose(cut32,cut64,rtol=1e-4)))
+
+    try:
+        DataSet(precision='float16')
+        assert False
+    except AttributeError:
+        assert True
+
+def test_DataSet_masks():
+    files = ['Data/camea2018n000136.hdf']
+    ds = DataSet(dataFiles=files)
+    ds.convertDataFile(binning=8,saveFile=False)
+    df = ds.convertedFiles[0]
+    eBins = np.linspace(0.5,2.5,5)
+    Unmasked,_ = ds.cutPowder(eBins)
+
+    assert(np.all(df.maskBitmap() == (np.arange(df.I.shape[2])<8))) # Lowest final energy is masked by default
+    ds.addMask(Mask.DetectorMask(range(13)))
+    ds.addMask(Mask.QEMask(energy=[1.0,1.2]))
+    keep = np.logical_not(np.logical_or(np.logical_or(np.arange(df.I.shape[1]).reshape(1,-1,1)<13,np.logical_and(df.energy>=1.0,df.energy<=1.2)),
+                                        df.maskBitmap()))
+    keep = np.broadcast_to(keep,df.I.shape)
+    I,qx,qy,energy,Norm,Monitor = ds._pointSet()
+    assert(len(I) == np.sum(keep) and np.all(I == df.I[keep]))
+
+    Data,qbins = ds.cutPowder(eBins)
+    Norm,Monitor = broadcastToIntensity(df.I,df.Norm,df.Monitor)
+    Reference,referenceBins = cutPowder([df.qx[keep],df.qy[keep],df.energy[keep]],df.I[keep],Norm[keep],Monitor[keep],eBins)
+    for data,reference in zip(Data+[qbins],Reference+[referenceBins]):
+        for d,r in zip(data,reference):
+            assert(np.all(np.isclose(d,r,equal_nan=True)))
+    assert(np.sum([np.sum(x) for x in Data[3]]) < np.sum([np.sum(x) for x in Unmasked[3]])) # Masked points are not counted
+
+    dsFactorized = DataSet(dataFiles=files)
+    dsFactorized.convertDataFile(binning=8,saveFile=False,factorized=True)
+    dsFactorized.convertedFiles[0].addMask(Mask.DetectorMask(range(13))) # Masks of files and DataSet are combined
+    dsFactorized.addMask(Mask.QEMask(energy=[1.0,1.2]))
+    Binned,bins = ds.binData3D(0.1,0.1,0.5)
+    BinnedFactorized,binsFactorized = dsFactorized.binData3D(0.1,0.1,0.5)
+    assert(dsFactorized.convertedFiles[0].isFactorized())
+    for masked,factorized in zip(Binned+bins,BinnedFactorized+binsFactorized):
+        assert(np.all(np.isclose(masked,factorized,equal_nan=True)))
+    assert(np.sum(Binned[3]) <= np.sum(keep)) # Masked points are not counted
+
+    try:
+        ds.addMask('detector 3')
+        assert False
+    except AttributeError:
+        assert True
+
+def test_DataSet_outOfCore():
+    files = ['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf']
+    converted = [DataFile.DataFile(file).convert(binning=8) for file in files]
+    inMemory = DataSet(convertedFiles=converted)
+    outOfCore = DataSet(convertedFiles=converted,memoryBudget=10**6)
+    for ds in [inMemory,outOfCore]:
+        ds.addMask(Mask.DetectorMask(3))
+    assert(not 'I' in outOfCore.__dict__ and not 'qx' in outOfCore.__dict__ and 'a3' in outOfCore.__dict__)
+    assert(np.all(outOfCore.I[0] == inMemory.I[0]) and not 'I' in outOfCore.__dict__) # Stacked on access only
+    assert(memoryStepsPerChunk(converted,10**6) < converted[0].I.shape[0])
+
+    def compare(first,second): # Same bins, histograms of chunks are summed in float64
+        if isinstance(first,(list,tuple)):
+            assert(len(first) == len(second))
+            for f,s in zip(first,second):
+                compare(f,s)
+        else:
+            first,second = np.asarray(first),np.asarray(second)
+            assert(first.shape == second.shape)
+            assert(np.allclose(first,second,equal_nan=True))
+
+    gather = outOfCore._pointSet
+    def noGathering(*args,**kwargs):
+        raise AssertionError('Cuts out of core do not gather the selected points')
+    outOfCore._pointSet = noGathering
+
+    q1,q2 = np.array([0.5,-0.5]),np.array([1.5,-1.5]) # Through the measured part of the plane
+    for extend in [True,False]:
+        cut = inMemory.cut1D(q1,q2,0.1,0.01,2.0,3.0,extend=extend)
+        assert(np.sum(cut[0][3])>0) # Not an empty cut
+        compare(cut,outOfCore.cut1D(q1,q2,0.1,0.01,2.0,3.0,extend=extend))
+    compare(inMemory.cut1D(q1,q2,0.1,0.01,0.5,1.0),outOfCore.cut1D(q1,q2,0.1,0.01,0.5,1.0)) # No points within energies
+    compare(inMemory.cutQE(q1,q2,0.1,0.01,np.linspace(2.0,3.0,5)),outOfCore.cutQE(q1,q2,0.1,0.01,np.linspace(2.0,3.0,5)))
+    compare(inMemory.cutPowder(np.linspace(2.0,3.0,5)),outOfCore.cutPowder(np.linspace(2.0,3.0,5)))
+    compare(inMemory.cut1DE(2.0,3.0,np.array([1.0,-1.0]),format='qxqy',width=0.1,minPixel=0.05),
+            outOfCore.cut1DE(2.0,3.0,np.array([1.0,-1.0]),format='qxqy',width=0.1,minPixel=0.05))
+    compare(inMemory.cut1D(q1,q2,0.1,0.01,2.0,3.0,dataFiles=converted[1:]),outOfCore.cut1D(q1,q2,0.1,0.01,2.0,3.0,dataFiles=converted[1:]))
+
+    energy = inMemory.pointTable()['energy'] # Wide cuts holding most points of the DataSet
+    EBinEdges = np.linspace(np.min(energy)-0.01,np.max(energy)+0.01,8)
+    wide = inMemory.cut1D(q1,q2,2.0,0.01,EBinEdges[0],EBinEdges[-1],extend=True)
+    assert(np.sum(wide[0][3]) > 0.5*len(energy))
+    compare(wide,outOfCore.cut1D(q1,q2,2.0,0.01,EBinEdges[0],EBinEdges[-1],extend=True))
+    compare(inMemory.cutQE(q1,q2,2.0,0.01,EBinEdges),outOfCore.cutQE(q1,q2,2.0,0.01,EBinEdges))
+    powder = inMemory.cutPowder(EBinEdges)
+    assert(np.sum([np.sum(count) for count in powder[0][3]]) == len(energy))
+    compare(powder,outOfCore.cutPowder(EBinEdges))
+    compare(inMemory.cut1DE(EBinEdges[0],EBinEdges[-1],np.array([1.0,-1.0]),format='qxqy',width=1.0,minPixel=0.05),
+            outOfCore.cut1DE(EBinEdges[0],EBinEdges[-1],np.array([1.0,-1.0]),format='qxqy',width=1.0,minPixel=0.05))
+
+    compare(inMemory.plotCutQE(q1,q2,2.0,0.01,EBinEdges)[1:],outOfCore.plotCutQE(q1,q2,2.0,0.01,EBinEdges)[1:])
+    compare(inMemory.plotCutPowder(EBinEdges)[1:],outOfCore.plotCutPowder(EBinEdges)[1:])
+    plt.close('all')
+    outOfCore._pointSet = gather
+
+    for binning in ['xy','polar']: # Bins of plotQPlane out of core span the same x as in memory
+        assert(np.allclose(inMemory._xRange(binning),outOfCore._xRange(binning)))
+    inside = inMemory._pointSet()[3]
+    inside = np.logical_and(inside>=2.0,inside<=3.0)
+    for point,chunked in zip(inMemory._pointSet(),outOfCore._pointSet(select=_energySelection(2.0,3.0))): # Points kept by plotQPlane
+        compare(point[inside],chunked)
+
+    Binned,bins = inMemory.binData3D(0.1,0.1,0.5)
+    BinnedOutOfCore,binsOutOfCore = outOfCore.binData3D(0.1,0.1,0.5) # Chunks are summed in float64
+    for data,chunked in zip(Binned+bins,BinnedOutOfCore+binsOutOfCore):
+        assert(np.all(np.isclose(data,chunked,equal_nan=True)))
+
+def test_DataSet_pointTable():
+    files = ['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf']
+    converted = [DataFile.DataFile(file).convert(binning=8) for file in files]
+    ds = DataSet(convertedFiles=converted)
+    table = ds.pointTable()
+    assert(ds.pointTable() is table) # Built once
+    def points(datafile,masks=None): # Points not masked by default masks of the file and the given masks
+        return np.sum(np.logical_not(np.broadcast_to(datafile.maskBitmap(masks),datafile.I.shape)))
+    assert(len(table) == np.sum([points(datafile) for datafile in converted]))
+    I,qx,qy,energy,Norm,Monitor = ds._pointSet()
+    assert(I is table['I'] and energy is table['energy']) # Cuts use the columns without copying
+    assert(not table['qx'].flags['WRITEABLE'])
+
+    for point in [0,len(table)//2,len(table)-1]:
+        datafile = converted[table['file'][point]]
+        index = table['step'][point],table['detector'][point],table['pixel'][point]
+        assert(table['I'][point] == datafile.I[index] and table['h'][point] == datafile.h[index])
+        Norm,Monitor = broadcastToIntensity(datafile.I,datafile.Norm,datafile.Monitor)
+        assert(np.array_equal(table['Norm'][point],Norm[index],equal_nan=True) and table['Monitor'][point] == Monitor[index])
+
+    ds.addMask(Mask.DetectorMask(3)) # Tables are rebuilt when masks change
+    masked = ds.pointTable()
+    assert(not masked is table and not np.any(masked['detector'] == 3))
+    assert(len(masked) == np.sum([points(datafile,ds.masks) for datafile in converted]) < len(table))
+
+    factorized = DataSet(convertedFiles=[DataFile.DataFile(file).convert(binning=8,factorized=True) for file in files])
+    factorizedTable = factorized.pointTable()
+    assert(factorized.convertedFiles[0].isFactorized())
+    for key in ['qx','qy','energy','h','k','l']:
+        assert(np.allclose(factorizedTable[key],table[key]))
+
+def test_DataSet_subsetCuts():
+    files = ['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf']
+    converted = [DataFile.DataFile(file).convert(binning=8) for file in files]
+    ds = DataSet(convertedFiles=converted)
+    ds.addMask(Mask.DetectorMask(3))
+    table = ds.pointTable()
+
+    I,qx,qy,energy,Norm,Monitor = ds._pointSet(dataFiles=converted[1])
+    assert(np.shares_memory(I,table['I'])) # A single file of the DataSet is a view of its table
+    reference = DataSet(convertedFiles=[converted[1]])
+    reference.addMask(ds.masks[0])
+    for point,referencePoint in zip([I,qx,qy,energy,Norm,Monitor],reference._pointSet()):
+        assert(np.array_equal(point,referencePoint,equal_nan=True))
+
+    swapped = ds._pointSet(dataFiles=[converted[1],converted[0]]) # Files are gathered in the given order
+    assert(np.array_equal(swapped[0],np.concatenate([table.fileColumns(1)['I'],table.fileColumns(0)['I']])))
+
+    other = DataFile.DataFile(files[0]).convert(binning=8) # Not part of the DataSet, cached on the file
+    first = ds._pointSet(dataFiles=[other])
+    cached = other._pointTable
+    assert(cached is filePointTable(other,masks=ds.masks))
+    second = ds._pointSet(dataFiles=[other])
+    assert(other._pointTable is cached) # Cache hit, the table is not rebuilt
+    assert(np.shares_memory(first[0],cached['I']) and np.shares_memory(second[0],cached['I']))
+    assert(np.array_equal(first[1],table.fileColumns(0)['qx']))
+
+    import tempfile, shutil
+    folder = tempfile.mkdtemp()
+    try: # Locations not part of the DataSet are loaded once
+        location = os.path.join(folder,'other.nxs')
+        other.saveNXsqom(location)
+        first = ds._pointSet(dataFiles=location)
+        loadedFile = ds._matchDataFiles(location)[0]
+        assert(ds._matchDataFiles([location])[0] is loadedFile)
+        assert(np.shares_memory(ds._pointSet(dataFiles=location)[0],first[0])) # Point table cached on the file is reused
+        os.utime(location,(0,0)) # Changed files are loaded again
+        assert(not ds._matchDataFiles(location)[0] is loadedFile)
+    finally:
+        shutil.rmtree(folder)
+
+    q1,q2 = np.array([0.5,-0.5]),np.array([1.5,-1.5])
+    cut = ds.cut1D(q1,q2,0.1,0.01,2.0,3.0,dataFiles=[other,converted[1]])
+    assert(np.sum(cut[0][3])>0) # Not an empty cut
+    referenceCut = DataSet(convertedFiles=[other,converted[1]])
+    referenceCut.addMask(ds.masks[0])
+    for data,referenceData in zip(cut[0],referenceCut.cut1D(q1,q2,0.1,0.01,2.0,3.0)[0]):
+        assert(np.array_equal(data,referenceData,equal_nan=True))
+
+def test_DataSet_append():
+    files = ['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf']
+    converted = [DataFile.DataFile(file).convert(binning=8) for file in files]
+    reference = DataSet(convertedFiles=converted)
+    ds = DataSet(convertedFiles=converted[:1])
+    ds.addMask(Mask.DetectorMask(3))
+    reference.addMask(ds.masks[0])
+    table = ds.pointTable()
+
+    ds.append(converted[1])
+    assert(len(ds.convertedFiles) == 2 and ds.pointTable() is table) # Extended in place
+    referenceTable = reference.pointTable()
+    assert(len(table) == len(referenceTable) and table.offsets == referenceTable.offsets)
+    for key in PointTable.fields+PointTable.indices:
+        assert(np.array_equal(table[key],referenceTable[key],equal_nan=True))
+    for key in ['a3','a4','Ei']:
+        assert(np.array_equal(getattr(ds,key),getattr(reference,key)))
+    assert(ds.scanParameters == reference.scanParameters)
+    assert(np.array_equal(ds.I[1],reference.I[1])) # Stacked again on access
+
+    q1,q2 = np.array([0.0,0.0]),np.array([0.5,0.5])
+    for data,referenceData in zip(ds.cut1D(q1,q2,0.1,0.01,0.5,1.5)[0],reference.cut1D(q1,q2,0.1,0.01,0.5,1.5)[0]):
+        assert(np.array_equal(data,referenceData,equal_nan=True))
+
+    raw = DataSet(dataFiles=files[0])
+    raw.append(files[1])
+    assert(len(raw.dataFiles) == 2 and np.array_equal(raw.I[1],DataSet(dataFiles=files).I[1]))
+    raw.append(converted) # Converted files replace the raw data of the DataSet
+    assert(len(raw.convertedFiles) == 2 and np.array_equal(raw.Ei,reference.Ei))
+
+    empty = DataSet()
+    empty.append(converted[0])
+    unmasked = np.sum(np.logical_not(np.broadcast_to(converted[0].maskBitmap(),converted[0].I.shape)))
+    assert(empty.sample == converted[0].sample and len(empty.pointTable()) == unmasked)
+
+def test_DataSet_view():
+    files = ['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf']
+    converted = [DataFile.DataFile(file).convert(binning=8) for file in files]
+    ds = DataSet(convertedFiles=converted)
+    table = ds.pointTable()
+    q1,q2 = np.array([0.0,0.0]),np.array([0.5,0.5])
+
+    second = ds.view(files=[1])
+    assert(second.convertedFiles == [converted[1]] and isinstance(second,DataSet))
+    I,qx,qy,energy,Norm,Monitor = second._pointSet()
+    assert(np.shares_memory(I,table['I']) and np.shares_memory(qx,table['qx'])) # No points are copied
+    reference = DataSet(convertedFiles=[converted[1]])
+    for data,referenceData in zip(second.cut1D(q1,q2,0.1,0.01,0.5,1.5)[0],reference.cut1D(q1,q2,0.1,0.01,0.5,1.5)[0]):
+        assert(np.array_equal(data,referenceData,equal_nan=True))
+    assert(np.array_equal(second.Ei,ds.Ei[1:]))
+    assert(ds.view(condition=lambda datafile: datafile.name == converted[1].name).convertedFiles == [converted[1]])
+
+    steps = ds.view(steps=slice(1,3))
+    stepTable = steps.pointTable()
+    for fileIndex in range(2): # Steps of several files are ranges of rows of the parent table, no points are copied
+        assert(np.shares_memory(stepTable.fileColumns(fileIndex)['I'],table['I']))
+        assert(np.shares_memory(stepTable.fileColumns(fileIndex)['qx'],table['qx']))
+    select = _energySelection(2.0,3.0)
+    rows = stepTable.selectRows(select)
+    assert(0 < len(rows) < len(stepTable))
+    I,qx,qy,energy,Norm,Monitor = steps._pointSet(select=select) # Only selected points are gathered
+    assert(len(I) == len(rows) and np.all(np.logical_and(energy>=2.0,energy<=3.0)))
+    assert(np.array_equal(qx,stepTable['qx'][rows]) and np.array_equal(stepTable.take('step',rows),stepTable['step'][rows]))
+    assert(np.all(np.logical_and(stepTable['step']>=1,stepTable['step']<3)))
+    assert(len(stepTable) == np.sum([np.sum(np.logical_not(np.broadcast_to(datafile.maskBitmap(),datafile.I.shape))[1:3]) for datafile in converted]))
+    masked = [DataFile.DataFile(file).convert(binning=8) for file in files] # Same points through step masks
+    for datafile in masked:
+        datafile.addMask(Mask.StepMask([step for step in range(datafile.I.shape[0]) if not step in [1,2]]))
+    reference = DataSet(convertedFiles=masked)
+    for key in ['I','qx','energy','Norm','Monitor']:
+        assert(np.array_equal(stepTable[key],reference.pointTable()[key],equal_nan=True))
+    for data,referenceData in zip(steps.cutPowder(np.linspace(0.5,2.5,5))[0],reference.cutPowder(np.linspace(0.5,2.5,5))[0]):
+        for d,r in zip(data,referenceData):
+            assert(np.array_equal(d,r,equal_nan=True))
+    Binned,_ = steps.binData3D(0.1,0.1,0.5)
+    assert(0 < np.sum(Binned[3]) <= len(stepTable))
+
+    try:
+        steps.addMask(Mask.DetectorMask(3))
+        assert False
+    except AttributeError:
+        assert True
+    try:
+        ds.view(files=['Data/camea2018n000017.nxs'])
+        assert False
+    except AttributeError:
+        assert True
+
+def test_DataSet_spatialIndex():
+    files = ['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf']
+    converted = [DataFile.DataFile(file).convert(binning=8) for file in files]
+    scan = DataSet(convertedFiles=converted)
+    indexed = DataSet(convertedFiles=converted)
+    for ds in [scan,indexed]:
+        ds.addMask(Mask.DetectorMask(3))
+    index = indexed.spatialIndex(pointsPerCell=32)
+    assert(indexed.spatialIndex() is index and len(index.order) <= len(indexed.pointTable()))
+
+    q1,q2 = np.array([0.5,-0.5]),np.array([1.5,-1.5]) # Through the measured part of the plane
+    select = _lineSelection(q1,q2,0.1,2.0,3.0,extend=False)
+    rows = index.query(select.cells)
+    table = indexed.pointTable()
+    keep = select(table['qx'],table['qy'],table['energy'])
+    assert(np.sum(keep)>0 and np.all(np.diff(rows)>0) and np.all(np.isin(np.nonzero(keep)[0],rows))) # Sorted superset of the selected points
+    assert(len(rows) < len(table))
+
+    def compare(first,second): # Results are identical, not only close
+        if isinstance(first,(list,tuple)):
+            assert(len(first) == len(second))
+            for f,s in zip(first,second):
+                compare(f,s)
+        else:
+            assert(np.array_equal(np.asarray(first),np.asarray(second),equal_nan=True))
+
+    for extend in [True,False]:
+        cut = scan.cut1D(q1,q2,0.1,0.01,2.0,3.0,extend=extend)
+        assert(np.sum(cut[0][3])>0) # Not an empty cut
+        compare(cut,indexed.cut1D(q1,q2,0.1,0.01,2.0,3.0,extend=extend))
+    cut = scan.cutQE(q1,q2,0.1,0.01,np.linspace(2.0,3.0,5))
+    assert(np.sum([np.sum(data[3]) for data in cut[0]])>0) # Not an empty cut
+    compare(cut,indexed.cutQE(q1,q2,0.1,0.01,np.linspace(2.0,3.0,5)))
+    compare(scan.cutPowder(np.linspace(2.0,3.0,5)),indexed.cutPowder(np.linspace(2.0,3.0,5)))
+    compare(scan.cut1DE(2.0,3.0,np.array([1.0,-1.0]),format='qxqy',width=0.1,minPixel=0.05),
+            indexed.cut1DE(2.0,3.0,np.array([1.0,-1.0]),format='qxqy',width=0.1,minPixel=0.05))
+
+    indexed.addMask(Mask.DetectorMask(4)) # Rebuilt for the new point table
+    assert(not indexed.spatialIndex() is index and indexed.spatialIndex().pointsPerCell == 32)
+
+    grown = DataSet(convertedFiles=[converted[0]])
+    index = grown.spatialIndex(pointsPerCell=32)
+    grown.append(DataFile.DataFile(files[0]).convert(binning=8)) # Same points, inserted into the grid
+    table = grown.pointTable()
+    assert(grown.spatialIndex() is index and index.size == len(table) and len(index.order) == 2*index.points)
+    rebuilt = SpatialIndex(table,pointsPerCell=32)
+    keep = select(table['qx'],table['qy'],table['energy'])
+    rows = index.query(select.cells)
+    assert(np.sum(keep[index.size//2:])>0 and np.all(np.diff(rows)>0) and np.all(np.isin(np.nonzero(keep)[0],rows)))
+    assert(np.array_equal(np.sort(index.order),np.sort(rebuilt.order)))
+    compare(DataSet(convertedFiles=grown.convertedFiles).cut1D(q1,q2,0.1,0.01,2.0,3.0),grown.cut1D(q1,q2,0.1,0.01,2.0,3.0))
+    grown.append(converted[1]) # Outside of the grid or too many points, rebuilt
+    assert(not grown.spatialIndex() is index and grown.spatialIndex().size == len(grown.pointTable()))
+
+def test_DataSet_prefetch():
+    files = ['Data/camea2018n000136.hdf','Data/camea2018n000137.hdf','Data/camea2018n000136.hdf']
+    serial = DataSet(dataFiles=files)
+    assert(serial._prefetch == 0) # Prefetching is opt-in
+    prefetched = DataSet(dataFiles=files,prefetch=1)
+    assert([df.name for df in prefetched.dataFiles] == [df.name for df in serial.dataFiles]) # Order is kept
+    for a,b in zip(prefetched.dataFiles,serial.dataFiles):
+        assert(np.all(a.I == b.I))
+    assert(prefetched.loadTiming['files'] == 3 and serial.loadTiming['files'] == 3)
+    assert(prefetched.loadTiming['io'] > 0.0 and prefetched.loadTiming['compute'] > 0.0)
+    assert(prefetched.timingReport().startswith('Loaded 3 file(s): I/O '))
+
+    timing = {}
+    loaded = list(loadDataFiles(files[:2],loadOptions={'lazy':True},prefetch=1,timing=timing))
+    assert([df.name for df in loaded] == ['camea2018n000136.hdf','camea2018n000137.hdf'])
+    assert(timing['files'] == 2)
+
+    try: # Missing files are found before any file is read
+        DataSet(dataFiles=files+['Data/FileDoesNotExist.hdf'])
+        assert False
+    except AttributeError:
+        assert True
+
 def test_DataSet_3DMesh():
     
     x = np.linspace(0,1,2)
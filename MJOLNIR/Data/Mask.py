@@ -0,0 +1,196 @@
+import sys, os
+sys.path.append('.')
+sys.path.append('..')
+sys.path.append('../..')
+import numpy as np
+from MJOLNIR import _tools
+
+
+class Mask(object):
+    """Base of masks removing points of converted data files before cuts and binning. The bitmap of a mask is True for masked
+    points and is kept in the smallest shape broadcastable to the intensity of shape (steps,detectors,pixels)."""
+
+    def bitmap(self,datafile):
+        """Bitmap of masked points of a converted data file.
+
+        Args:
+
+            - datafile (DataFile): Converted data file.
+
+        Returns:
+
+            - bitmap (bool array): True for masked points, broadcastable to the shape of the intensity.
+
+        """
+        raise NotImplementedError('Bitmap is not implemented for mask of type {}.'.format(type(self).__name__))
+
+    def __str__(self):
+        return '{}({})'.format(type(self).__name__,', '.join(['{}={}'.format(key,value) for key,value in sorted(self.__dict__.items())]))
+
+
+class DetectorMask(Mask):
+    """Mask all points of the given detectors."""
+    def __init__(self,detectors):
+        """Args:
+
+            - detectors (int or list of ints): Detectors to be masked.
+
+        """
+        self.detectors = np.asarray(detectors,dtype=int).reshape(-1)
+
+    def bitmap(self,datafile):
+        bitmap = np.zeros((1,datafile.I.shape[1],1),dtype=bool)
+        bitmap[:,self.detectors] = True
+        return bitmap
+
+
+class PixelMask(Mask):
+    """Mask binned pixels, either of all detectors or of the given detectors. For raw data files, raw pixels are masked. Pixels 
+    beyond the pixels of a data file are ignored."""
+    def __init__(self,pixels,detectors=None):
+        """Args:
+
+            - pixels (int or list of ints): Binned pixels to be masked, e.g. range(8) for the lowest final energy at binning 8.
+
+        Kwargs:
+
+            - detectors (int or list of ints): Detectors in which the pixels are masked (default None, i.e. all detectors).
+
+        """
+        self.pixels = np.asarray(pixels,dtype=int).reshape(-1)
+        self.detectors = None if detectors is None else np.asarray(detectors,dtype=int).reshape(-1)
+
+    def bitmap(self,datafile):
+        pixels = self.pixels[self.pixels<datafile.I.shape[2]]
+        if self.detectors is None:
+            bitmap = np.zeros((1,1,datafile.I.shape[2]),dtype=bool)
+            bitmap[:,:,pixels] = True
+        else:
+            bitmap = np.zeros((1,)+datafile.I.shape[1:],dtype=bool)
+            bitmap[:,self.detectors.reshape(-1,1),pixels.reshape(1,-1)] = True
+        return bitmap
+
+
+class StepMask(Mask):
+    """Mask all points of the given scan steps."""
+    def __init__(self,steps):
+        """Args:
+
+            - steps (int or list of ints): Scan steps to be masked.
+
+        """
+        self.steps = np.asarray(steps,dtype=int).reshape(-1)
+
+    def bitmap(self,datafile):
+        bitmap = np.zeros((datafile.I.shape[0],1,1),dtype=bool)
+        bitmap[self.steps] = True
+        return bitmap
+
+
+class QEMask(Mask):
+    """Mask a box in qx, qy and energy, e.g. around a spurion. Limits not given are unbounded."""
+    def __init__(self,qx=None,qy=None,energy=None):
+        """Kwargs:
+
+            - qx (2 floats): Lower and upper limit of qx in 1/AA (default None).
+
+            - qy (2 floats): Lower and upper limit of qy in 1/AA (default None).
+
+            - energy (2 floats): Lower and upper limit of energy transfer in meV (default None).
+
+        Raises:
+
+            - AttributeError
+
+        """
+        if qx is None and qy is None and energy is None:
+            raise AttributeError('At least one of qx, qy and energy limits is to be given.')
+        self.limits = dict([(key,value) for key,value in zip(['qx','qy','energy'],[qx,qy,energy]) if not value is None])
+
+    def _inside(self,coordinates):
+        inside = True
+        for key,(lower,upper) in self.limits.items():
+            inside = np.logical_and(inside,np.logical_and(coordinates[key]>=lower,coordinates[key]<=upper))
+        return inside
+
+    def bitmap(self,datafile):
+        if datafile.isFactorized(): # Coordinates are calculated for a chunk of steps at a time
+            bitmap = np.zeros(datafile.I.shape,dtype=bool)
+            for start,stop,coordinates in datafile._coordinates.iterate():
+                bitmap[start:stop] = self._inside(coordinates)
+            return bitmap
+        return np.broadcast_to(self._inside(dict([(key,getattr(datafile,key)) for key in self.limits.keys()])),datafile.I.shape)
+
+
+class NaNNormalizationMask(Mask):
+    """Mask all points where the normalization is not a number, i.e. pixels without a fitted normalization."""
+    def __init__(self):
+        pass
+
+    def bitmap(self,datafile):
+        return np.isnan(np.asarray(datafile.Norm))
+
+
+def combineMasks(datafile,masks):
+    """Combined bitmap of masks of a converted data file.
+
+    Args:
+
+        - datafile (DataFile): Converted data file.
+
+        - masks (list of Masks): Masks to be combined.
+
+    Returns:
+
+        - bitmap (bool array): True for points masked by any of the masks in the smallest shape broadcastable to the intensity,
+          or None if no masks are given.
+
+    """
+    bitmap = None
+    for mask in masks:
+        if bitmap is None:
+            bitmap = mask.bitmap(datafile)
+        else:
+            bitmap = np.logical_or(bitmap,mask.bitmap(datafile))
+    return bitmap
+
+
+def test_Mask():
+    from MJOLNIR.Data import DataFile
+    df = DataFile.DataFile('Data/camea2018n000136.hdf').convert(binning=8)
+    steps,detectors,pixels = df.I.shape
+    assert(combineMasks(df,[]) is None)
+
+    detector = DetectorMask([3,4]).bitmap(df)
+    assert(detector.shape == (1,detectors,1) and np.sum(detector) == 2)
+    pixel = PixelMask(range(8)).bitmap(df)
+    assert(pixel.shape == (1,1,pixels) and np.sum(pixel) == 8)
+    assert(np.sum(PixelMask(0,detectors=[1,2]).bitmap(df)) == 2)
+    assert(np.sum(PixelMask(range(2*pixels)).bitmap(df)) == pixels) # Pixels beyond the file are ignored
+    step = StepMask(0).bitmap(df)
+    assert(step.shape == (steps,1,1) and step[0,0,0])
+
+    combined = combineMasks(df,[DetectorMask(3),PixelMask(0),StepMask(0)])
+    assert(combined.shape == (steps,detectors,pixels))
+    assert(np.sum(combined) == detectors*pixels+(steps-1)*(pixels+detectors-1))
+
+    region = QEMask(energy=[1.0,2.0]).bitmap(df)
+    assert(np.all(region == np.logical_and(df.energy>=1.0,df.energy<=2.0)))
+    factorized = DataFile.DataFile('Data/camea2018n000136.hdf').convert(binning=8,factorized=True)
+    assert(np.all(QEMask(energy=[1.0,2.0]).bitmap(factorized) == region))
+    assert(factorized.isFactorized())
+
+    assert(np.all(NaNNormalizationMask().bitmap(df) == np.isnan(df.Norm)))
+
+    raw = DataFile.DataFile('Data/camea2018n000136.hdf') # Default masks replace counts and monitor set to zero
+    assert(isinstance(raw.masks[0],PixelMask) and np.all(raw.maskBitmap()[0,0] == (np.arange(raw.I.shape[2])<200)))
+    assert(np.sum(raw.I[:,:,:200])>0) # Raw counts are kept
+    assert(np.all(df.maskBitmap()[0,0] == (np.arange(pixels)<8)) and np.all(df.Monitor>0))
+    raw.masks = []
+    assert(np.sum(raw.convert(binning=8).I) > np.sum(df.I)) # Masked raw counts are not integrated
+
+    try:
+        QEMask()
+        assert False
+    except AttributeError:
+        assert True
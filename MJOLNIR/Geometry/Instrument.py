@@ -5,6 +5,7 @@ sys.path.append('../..')
 import numpy as np
 from MJOLNIR.Geometry import GeometryConcept,Analyser,Detector,Wedge
 from MJOLNIR import _tools
+from MJOLNIR.Data import DataFile,Mask
 import warnings
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
@@ -332,7 +333,7 @@ class Instrument(GeometryConcept.GeometryConcept):
 
             - plot (boolean): Set to True if pictures of all fit are to be stored in savelocation
 
-            - mask (boolean): If True the lower 100 pixels are set to 0
+            - mask (bool or list of Masks): Masks applied to the raw Vanadium counts, which are set to 0 where masked. If True, the lowest 100 pixels of each detector, where a spurion is present, are masked by a PixelMask (default True).
 
         .. warning::
             At the moment, the active detector area is defined by NumberOfSigmas (currently 3) times the Guassian width of Vanadium peaks.
@@ -343,11 +344,11 @@ class Instrument(GeometryConcept.GeometryConcept):
         VanFile = hdf.File(Vanadiumdatafile,'r')
         if not A4datafile == False:
             A4File = hdf.File(A4datafile,'r')
-            A4FileInstrument = getInstrument(A4File)
+            A4FileInstrument = _tools.getInstrument(A4File)
             A4FileInstrumentType = A4FileInstrument.name.split('/')[-1]
 
 
-        VanFileInstrument = getInstrument(VanFile)
+        VanFileInstrument = _tools.getInstrument(VanFile)
         
 
         VanFileInstrumentType = VanFileInstrument.name.split('/')[-1]
@@ -363,10 +364,15 @@ class Instrument(GeometryConcept.GeometryConcept):
             if savelocation[-1]!='/':
                 savelocation+='/'
             
-            Data = np.array(VanFileInstrument.get('detector/counts')).transpose(2,0,1).astype(float)
-            
-            if True: #Mask pixels where spurion is present
-                Data[:,:,:100]=0
+            vanadium = DataFile.DataFile(Vanadiumdatafile,lazy=True)
+            if mask is True: # Mask pixels where spurion is present
+                mask = [Mask.PixelMask(range(100))]
+            bitmap = Mask.combineMasks(vanadium,[] if mask is False or mask is None else list(mask))
+            Data = vanadium.I.astype(float)
+            vanadium.close()
+            if not bitmap is None:
+                Data[np.broadcast_to(bitmap,Data.shape)] = 0
+            Data = Data.transpose(1,0,2) # Detectors, steps and pixels
 
             Ei = np.array(VanFileInstrument.get('monochromator/energy')).astype(float)
             analysers = 8
@@ -618,13 +624,9 @@ class Instrument(GeometryConcept.GeometryConcept):
                     ## Find detector analyser combi corresponding to energy
                     SoftwarePixel = np.array([np.argmin(np.abs(x-EiFile)) for x in PixelEnergy])
 
-                    MeanA4Instr = np.zeros((A4.shape[0],EPrDetector*detpixels))
-                    MeanIntensity = np.zeros((len(A4FileValue),A4.shape[0],EPrDetector*detpixels))
-                    for i in range(A4.shape[0]): # For each detector
-                        for j in range(EPrDetector):
-                            for k in range(detpixels):
-                                MeanIntensity[:,i,j*detpixels+k] = np.sum(A4FileIntensity[:,i,PixelEdge[i,j,k,0]:PixelEdge[i,j,k,1]],axis=1)
-                                MeanA4Instr[i,j*detpixels+k] = np.mean(A4[i,PixelEdge[i,j,k,0]:PixelEdge[i,j,k,1]])
+                    PixelEdge = PixelEdge.reshape(A4.shape[0],EPrDetector*detpixels,2)
+                    MeanIntensity = _tools.integratePixelRanges(A4FileIntensity,PixelEdge).astype(float)
+                    MeanA4Instr = _tools.integratePixelRanges(A4,PixelEdge)/(PixelEdge[:,:,1]-PixelEdge[:,:,0])
                                 
                     x = A4FileValue
                     A4FitValue = np.zeros((A4.shape[0]))
@@ -785,17 +787,6 @@ def parseXML(Instr,fileName):
     
    
 
-def getNX_class(x,y,attribute):
-    try:
-        variableType = y.attrs['NX_class']
-    except:
-        variableType = ''
-    if variableType==attribute:
-        return x
-
-def getInstrument(file):
-    location = file.visititems(lambda x,y: getNX_class(x,y,b'NXinstrument'))
-    return file.get(location)
 
 
 
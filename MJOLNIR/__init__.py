@@ -6,5 +6,7 @@ Further documentation?
 """
 #import Geometry, Statistic, Data
 
+__version__ = '0.7.0'
+
 import sys
 sys.path.append('.')
\ No newline at end of file
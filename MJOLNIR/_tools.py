@@ -230,4 +230,224 @@ def binEdges(values,tolerance):
         bin_edges.append((unique_values[current] + unique_values[current+add]) / 2)
         current+=add+1
     bin_edges.append(unique_values[-1] + tolerance / 2)
-    return np.array(bin_edges)
\ No newline at end of file
+    return np.array(bin_edges)
+
+_NXClassPathCache = {} # Class to path maps of NeXus files, shared between all files with the same layout
+_NXOpenFileCache = {} # Class to path maps of open files by HDF5 file number, which is not reused after a file is closed
+_NXOpenFileCacheSize = 64
+
+def getNXClass(group):
+    """Return the NeXus class of an HDF5 group or dataset as a string ('' if not set)."""
+    NXClass = group.attrs.get('NX_class','')
+    if isinstance(NXClass,bytes):
+        NXClass = NXClass.decode()
+    return str(NXClass)
+
+def _isGroup(item):
+    return hasattr(item,'items')
+
+def NXLayoutFingerprint(file):
+    """Calculate a fingerprint of the layout of a NeXus file from the groups at the two upper most levels.
+    
+    Args:
+        
+        - file (hdf file): Open HDF5 file.
+        
+    Returns:
+        
+        - fingerprint (tuple)
+    
+    """
+    fingerprint = []
+    for name,item in file.items():
+        if not _isGroup(item):
+            continue
+        fingerprint.append((item.name,getNXClass(item)))
+        for subName,subItem in item.items():
+            if _isGroup(subItem):
+                fingerprint.append((subItem.name,getNXClass(subItem)))
+    return tuple(sorted(fingerprint))
+
+def calculateNXClassPaths(file):
+    """Walk all groups of a NeXus file (breadth first) and map NeXus classes to group paths.
+    
+    Args:
+        
+        - file (hdf file): Open HDF5 file.
+        
+    Returns:
+        
+        - paths (dict): Dictionary with NeXus class as key and list of paths, sorted by depth, as value.
+    
+    """
+    paths = {}
+    queue = [file]
+    while len(queue)>0:
+        group = queue.pop(0)
+        for name,item in group.items():
+            if _isGroup(item): # Only groups carry NeXus classes of interest, skip datasets
+                paths.setdefault(getNXClass(item),[]).append(item.name)
+                queue.append(item)
+    return paths
+
+def getNXClassPaths(file,recalculate=False):
+    """Return the NeXus class to path map of a file. The map is cached for each open file, and calculated once per layout 
+    and cached using the layout fingerprint, so the fingerprint is only calculated on the first lookup in an open file. 
+    Paths are validated when used, see getNXGroup.
+    
+    Args:
+        
+        - file (hdf file): Open HDF5 file.
+
+    Kwargs:
+
+        - recalculate (bool): If true, the map is calculated from the file and replaces the cached maps (default False).
+        
+    Returns:
+        
+        - paths (dict): Dictionary with NeXus class as key and list of paths as value.
+    
+    """
+    fileNumber = file.id.fileno
+    paths = None if recalculate else _NXOpenFileCache.get(fileNumber)
+    if paths is None:
+        fingerprint = NXLayoutFingerprint(file)
+        paths = None if recalculate else _NXClassPathCache.get(fingerprint)
+        if paths is None:
+            paths = calculateNXClassPaths(file)
+            _NXClassPathCache[fingerprint] = paths
+        if len(_NXOpenFileCache)>=_NXOpenFileCacheSize and not fileNumber in _NXOpenFileCache: # Forget files opened long ago
+            del _NXOpenFileCache[next(iter(_NXOpenFileCache))]
+        _NXOpenFileCache[fileNumber] = paths
+    return paths
+
+def getNXGroup(file,NXClass):
+    """Find the first group of a given NeXus class in a file.
+    
+    Args:
+        
+        - file (hdf file): Open HDF5 file.
+        
+        - NXClass (string): NeXus class, e.g. 'NXinstrument'.
+        
+    Returns:
+        
+        - group (hdf group): First group with the NeXus class or None if not found.
+    
+    """
+    for recalculate in [False,True]: # Cached path is validated and the map recalculated if it does not match the file
+        locations = getNXClassPaths(file,recalculate=recalculate).get(NXClass)
+        if locations is None or len(locations)==0:
+            return None
+        group = file.get(locations[0])
+        if not group is None and getNXClass(group) == NXClass:
+            return group
+    return None
+
+def getInstrument(file):
+    """Return the NXinstrument group of a NeXus file."""
+    return getNXGroup(file,'NXinstrument')
+
+def integratePixelRanges(data,edges,method='reduceat'):
+    """Sum data over ranges of pixels along the last axis, i.e. data[...,i,start:stop].sum(axis=-1) for each detector i and
+    each of its pixel ranges.
+    
+    Args:
+        
+        - data (array): Data of shape (...,detectors,pixels).
+        
+        - edges (array): Integer pixel ranges [start,stop) of shape (detectors,ranges,2), following the slicing convention of Python.
+        
+    Kwargs:
+        
+        - method (string): 'reduceat' for integrating all ranges at once with np.add.reduceat on the flattened pixels, 'cumsum' for 
+          differences of the cumulative sum along the pixel axis or 'loop' for summing each range separately (default 'reduceat').
+        
+    Returns:
+        
+        - integrated (array): Summed data of shape (...,detectors,ranges).
+    
+    Raises:
+        
+        - AttributeError
+    
+    """
+    data = np.asarray(data)
+    edges = np.asarray(edges).astype(int)
+    detectors,pixels = data.shape[-2:]
+    if edges.ndim!=3 or edges.shape[0]!=detectors or edges.shape[2]!=2:
+        raise AttributeError('Edges of shape {} do not match data of shape {}. Expected shape ({},ranges,2).'.format(edges.shape,data.shape,detectors))
+    dtype = np.zeros(1,dtype=data.dtype).sum().dtype # Same as summation of data
+    ranges = edges.shape[1]
+    
+    if method == 'loop':
+        integrated = np.zeros(data.shape[:-1]+(ranges,),dtype=dtype)
+        for i in range(detectors):
+            for j in range(ranges):
+                integrated[...,i,j] = np.sum(data[...,i,edges[i,j,0]:edges[i,j,1]],axis=-1)
+        return integrated
+    
+    start,stop = [np.clip(np.where(x<0,x+pixels,x),0,pixels) for x in [edges[:,:,0],edges[:,:,1]]]
+    stop = np.maximum(start,stop) # Reversed ranges are empty
+    if method == 'reduceat':
+        flat = np.ascontiguousarray(data).reshape(data.shape[:-2]+(detectors*pixels,))
+        offset = (np.arange(detectors)*pixels).reshape(-1,1)
+        indices = np.stack([start+offset,stop+offset],axis=-1).reshape(-1)
+        if np.any(indices>=flat.shape[-1]): # All indices need to be inside of the array
+            flat = np.concatenate([flat,np.zeros(flat.shape[:-1]+(1,),dtype=flat.dtype)],axis=-1)
+        # Sums from each start to the following stop. For empty ranges reduceat returns the value at start
+        integrated = np.add.reduceat(flat,indices,axis=-1,dtype=dtype)[...,::2].reshape(data.shape[:-2]+(detectors,ranges))
+        integrated[...,start==stop] = 0
+        return integrated
+    elif method == 'cumsum':
+        cumulative = np.zeros(data.shape[:-1]+(pixels+1,),dtype=dtype)
+        np.cumsum(data,axis=-1,dtype=dtype,out=cumulative[...,1:])
+        detectorIndex = np.arange(detectors).reshape(-1,1)
+        return cumulative[...,detectorIndex,stop]-cumulative[...,detectorIndex,start]
+    else:
+        raise AttributeError('Integration method "{}" not understood. Use "reduceat", "cumsum" or "loop".'.format(method))
+
+_computePrecision = {'dtype':None} # Global floating point type of coordinates and normalization, None keeps the types as loaded or calculated
+
+def setComputePrecision(precision):
+    """Set the global floating point type of coordinates and normalization used in conversion, DataSet and cuts unless 
+    overwritten by the precision of a DataFile or DataSet.
+
+    Args:
+
+        - precision (string or None): 'float32', 'float64' or None for keeping the types as loaded from file or calculated.
+
+    Raises:
+
+        - AttributeError
+
+    """
+    _computePrecision['dtype'] = computeDtype(precision) if not precision is None else None
+
+def computeDtype(precision=None):
+    """Floating point type of coordinates and normalization: the given precision if not None, else the global compute precision.
+    Returns None if neither is set."""
+    if precision is None:
+        return _computePrecision['dtype']
+    dtype = np.dtype(precision)
+    if not dtype in [np.dtype('float32'),np.dtype('float64')]:
+        raise AttributeError('Compute precision "{}" not understood. Use "float32", "float64" or None.'.format(precision))
+    return dtype
+
+def castPrecision(array,precision=None):
+    """Cast a floating point array to the compute precision, see computeDtype. Integer arrays like counts and monitor, None and 
+    arrays without a compute precision set are returned unchanged."""
+    dtype = computeDtype(precision)
+    if array is None or dtype is None:
+        return array
+    array = np.asarray(array)
+    if not np.issubdtype(array.dtype,np.floating):
+        return array
+    return array.astype(dtype,copy=False)
+
+def accumulationWeights(weights):
+    """Weights for histograms accumulating in float64, or int64 for integer weights, independent of the compute precision."""
+    weights = np.asarray(weights)
+    if np.issubdtype(weights.dtype,np.integer):
+        return weights.astype(np.int64,copy=False)
+    return weights.astype(np.float64,copy=False)
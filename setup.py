@@ -1,5 +1,6 @@
 from setuptools import setup
 import os
+import re
 import sys
 
 _here = os.path.abspath(os.path.dirname(__file__))
@@ -11,12 +12,15 @@ else:
     with open(os.path.join(_here, 'README.md'), encoding='utf-8') as f:
         long_description = f.read()
 
+with open(os.path.join(_here, 'MJOLNIR', '__init__.py')) as f: # Version is defined once, in the package
+    version = re.search(r"^__version__ = ['\"]([^'\"]+)['\"]", f.read(), re.M).group(1)
+
 
 
 setup(
     name='MJOLNIR',
 
-    version='0.7.0',
+    version=version,
     description=('Neutron Scattering software suite.'),
     long_description=long_description,
     author='Jakob Lass',